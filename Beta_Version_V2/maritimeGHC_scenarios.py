@@ -6,480 +6,275 @@ Created: 2024-2025
 """
 
 import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus
+from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus, LpAffineExpression
 import traceback
-import matplotlib.cm as cm
-
-scenario_files = {
-    # base scenario
-     'base': {
-         'init_capacity_fleet' : "init_capacity_fleet.csv", 
-         'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-         'fleet_age' : "init_age.csv", 
-         'demand_shipping': "demand_shippingSSP2.csv", 
-         'investment_cost' : "investment_cost.csv", 
-         'op_cost' : "op_cost.csv",
-         'emissions_factor' : "emissions_factor.csv",
-         'prod_capacity' : "prod_capacity.csv", 
-         'lifetime' : "lifetime.csv",
-         'cap' : "cap.csv",
-         'CII_desired' : "CII_desired.csv",
-         'fuel_cost': "fuel_cost_base.csv",
-         'ets_price': "ets_price_mod.csv",
-         'co2_cap': "co2_cap_real.csv",
-         'fuel_avail': "fuel_avail_no.csv",
-         'fuel_consumption': "fuel_cons_base.csv"
-
-     }, 
-     'bau_fuel_meoh': {
-         'init_capacity_fleet' : "init_capacity_fleet.csv", 
-         'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-         'fleet_age' : "init_age.csv", 
-         'demand_shipping': "demand_shippingSSP2.csv", 
-         'investment_cost' : "investment_cost.csv", 
-         'op_cost' : "op_cost_comb.csv",
-         'emissions_factor' : "emissions_factor.csv",
-         'prod_capacity' : "prod_capacity.csv", 
-         'lifetime' : "lifetime.csv",
-         'cap' : "cap.csv",
-         'CII_desired' : "CII_desired.csv",
-         'fuel_cost': "fuel_cost_base.csv",
-         'ets_price': "ets_price_mod.csv",
-         'co2_cap': "co2_cap_real.csv",
-         'fuel_avail': "fuel_avail_no.csv",
-         'fuel_consumption': "fuel_cons_meoh.csv"
-
-     }, 
-      'bau_fuel_h2': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_h2.csv"
-
-      },
-      'bau_ssp5': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP5.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-
-      },
-      'bau_ssp1': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP1.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      },
-      'tech_ccs': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_co2_capture.csv",
-          'emissions_factor' : "emissions_factor_cc.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      },
-      'tech_hull': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_hull.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_hull.csv"
-      },
-      'tech_eng_opt': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_engin_opt.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_engine_opt.csv"
-      },
-      'tech_port_call': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_port_call.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_port_call.csv"
-      },
-      'tech_route_opt': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_route_opt.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_route_opt.csv"
-      },
-      'tech_propul': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_propul.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_propul.csv"
-      },
-      'techcomb': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost_comb.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_comb.csv"
-      }, 
-      'fuel_cost_high': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_high.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      },
-      'fuel_cost_low': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_low.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      }, 
-      'co2_cap_pess': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_pess.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      }, 
-      'co2_cap_opt': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_opt.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-
-      }, 
-      'co2_cap_no': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_no.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-
-      },
-      'ets_price_no': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_no.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      }, 
-      'ets_price_strict': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_strict.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_base.csv"
-      }, 
-      'fuel_cons_fast': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_fast.csv"
-
-      }, 
-      'fuel_cons_slow': {
-          'init_capacity_fleet' : "init_capacity_fleet.csv", 
-          'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
-          'fleet_age' : "init_age.csv", 
-          'demand_shipping': "demand_shippingSSP2.csv", 
-          'investment_cost' : "investment_cost.csv", 
-          'op_cost' : "op_cost.csv",
-          'emissions_factor' : "emissions_factor.csv",
-          'prod_capacity' : "prod_capacity.csv", 
-          'lifetime' : "lifetime.csv",
-          'cap' : "cap.csv",
-          'CII_desired' : "CII_desired.csv",
-          'fuel_cost': "fuel_cost_base.csv",
-          'ets_price': "ets_price_mod.csv",
-          'co2_cap': "co2_cap_real.csv",
-          'fuel_avail': "fuel_avail_no.csv",
-          'fuel_consumption': "fuel_cons_slow.csv"
-
-      }
-      
-  }
+from maritime_matrix import (build_matrix_model, solve_matrix_model, solve_fast, retirement_schedule,
+                             fuel_cost_table, cii_bound_table, PersistentMaritimeModel, MatrixModel,
+                             ModelHandles)
+from maritime_rolling import solve_rolling
+from maritime_decomposition import solve_lagrangian
+from maritime_solvers import SolverConfig, solve_pulp, solve_stats_table
+from maritime_sensitivity import (constraint_families, matrix_sensitivities, pulp_sensitivities,
+                                  sensitivity_table, sweep)
+from maritime_mps import write_mps, solve_mps_cbc
+from maritime_plots import create_plots, create_combined_figure, render_plots
+from maritime_profiling import profiler
+from maritime_io import (csv_cache, data_source, params_hash, ResultCache, ResultStore,
+                         ResultDataset, LazyScenarioResults, SparseParameter,
+                         export_results_to_excel, results_to_long, stack_results)
+
+# Input files of the base scenario
+base_files = {
+    'init_capacity_fleet' : "init_capacity_fleet.csv", 
+    'minim_capacity_fleet' : "minim_capacity_fleet.csv", 
+    'fleet_age' : "init_age.csv", 
+    'demand_shipping': "demand_shippingSSP2.csv", 
+    'investment_cost' : "investment_cost.csv", 
+    'op_cost' : "op_cost.csv",
+    'emissions_factor' : "emissions_factor.csv",
+    'prod_capacity' : "prod_capacity.csv", 
+    'lifetime' : "lifetime.csv",
+    'cap' : "cap.csv",
+    'CII_desired' : "CII_desired.csv",
+    'fuel_cost': "fuel_cost_base.csv",
+    'ets_price': "ets_price_mod.csv",
+    'co2_cap': "co2_cap_real.csv",
+    'fuel_avail': "fuel_avail_no.csv",
+    'fuel_consumption': "fuel_cons_base.csv"
+}
+
+# Each scenario is the base scenario plus the input files it overrides
+scenario_overrides = {
+    'base': {},
+    'bau_fuel_meoh': {'op_cost': "op_cost_comb.csv", 'fuel_consumption': "fuel_cons_meoh.csv"},
+    'bau_fuel_h2': {'fuel_consumption': "fuel_cons_h2.csv"},
+    'bau_ssp5': {'demand_shipping': "demand_shippingSSP5.csv"},
+    'bau_ssp1': {'demand_shipping': "demand_shippingSSP1.csv"},
+    'tech_ccs': {'op_cost': "op_cost_co2_capture.csv", 'emissions_factor': "emissions_factor_cc.csv"},
+    'tech_hull': {'op_cost': "op_cost_hull.csv", 'fuel_consumption': "fuel_hull.csv"},
+    'tech_eng_opt': {'op_cost': "op_cost_engin_opt.csv", 'fuel_consumption': "fuel_engine_opt.csv"},
+    'tech_port_call': {'op_cost': "op_cost_port_call.csv", 'fuel_consumption': "fuel_port_call.csv"},
+    'tech_route_opt': {'op_cost': "op_cost_route_opt.csv", 'fuel_consumption': "fuel_route_opt.csv"},
+    'tech_propul': {'op_cost': "op_cost_propul.csv", 'fuel_consumption': "fuel_propul.csv"},
+    'techcomb': {'op_cost': "op_cost_comb.csv", 'fuel_consumption': "fuel_comb.csv"},
+    'fuel_cost_high': {'fuel_cost': "fuel_cost_high.csv"},
+    'fuel_cost_low': {'fuel_cost': "fuel_cost_low.csv"},
+    'co2_cap_pess': {'co2_cap': "co2_cap_pess.csv"},
+    'co2_cap_opt': {'co2_cap': "co2_cap_opt.csv"},
+    'co2_cap_no': {'co2_cap': "co2_cap_no.csv"},
+    'ets_price_no': {'ets_price': "ets_price_no.csv"},
+    'ets_price_strict': {'ets_price': "ets_price_strict.csv"},
+    'fuel_cons_fast': {'fuel_consumption': "fuel_cons_fast.csv"},
+    'fuel_cons_slow': {'fuel_consumption': "fuel_cons_slow.csv"},
+}
+
+def compose_scenario(name, overrides=scenario_overrides, base=base_files):
+    """
+    Input files of a scenario. Scenarios compose with '+', applied left to
+    right on top of the base files, e.g. 'bau_ssp5+fuel_cost_high+ets_price_strict'
+    (a later override wins when two set the same input).
+    """
+    files = dict(base)
+    for part in name.split('+'):
+        part = part.strip()
+        if part not in overrides:
+            raise KeyError(f"Unknown scenario '{part}'")
+        files.update(overrides[part])
+    return files
+
+def scenario_grid(*groups):
+    # Composite names for every combination of one scenario per group, e.g.
+    # scenario_grid(['base', 'bau_ssp1', 'bau_ssp5'], ['fuel_cost_low', 'fuel_cost_high'])
+    return ['+'.join(combo) for combo in itertools.product(*groups)]
+
+def scenario_delta(files, reference_files):
+    # Inputs whose file differs between two scenarios
+    return [key for key, name in files.items() if reference_files.get(key) != name]
+
+# Part of the result cache key; bump when the model formulation or
+# extract_results changes so previously stored results are not reused
+model_version = 2
+
+# Index column(s) and value column read from each input file
+input_columns = {
+    'init_capacity_fleet': ("ship_type", "capacity"),
+    'minim_capacity_fleet': ("ship_type", "limit"),
+    'fleet_age': ("ship_type", "avr_age"),
+    'demand_shipping': (["year", "ship_type"], "demand"),
+    'investment_cost': ("ship_type", "cost"),
+    'op_cost': ("ship_type", "cost"),
+    'emissions_factor': ("fuel_type", "factor"),
+    'prod_capacity': (["year", "ship_type"], "capacity"),
+    'lifetime': ("ship_type", "years"),
+    'cap': ("ship_type", "capacity"),
+    'CII_desired': (["ship_type", "year"], "CII"),
+    'fuel_cost': (["fuel_type", "year"], "cost"),
+    'ets_price': ("year", "price"),
+    'co2_cap': ("year", "cap"),
+    'fuel_avail': (["fuel_type", "year"], "availability"),
+    'fuel_consumption': (["ship_type", "fuel_type", "year"], "consumption"),
+}
+
+# Full file lists of the predefined scenarios
+scenario_files = {name: compose_scenario(name) for name in scenario_overrides}
+
+# Inputs that are mostly zeros, kept as SparseParameter (nonzero entries only)
+sparse_inputs = ("fuel_consumption",)
+
+def scenario_inputs(name, scenario_files=scenario_files):
+    # Files of a predefined scenario, or of a '+' composition of scenarios
+    if name in scenario_files:
+        return scenario_files[name]
+    return compose_scenario(name)
+
+def objective_expression(params, new_ship, stock_ship, fuel_demand, excess_emissions):
+    """
+    Total cost objective, assembled per variable family so its size is linear
+    in the number of variables. The n_fuels / n_ships factors keep the weights
+    the terms had when the objective summed over years x ship types x fuel types.
+    """
+    years = params["years"]
+    n_ships = len(params["ship_types"])
+    n_fuels = len(params["fuel_types"])
+    fuel_cost = fuel_cost_table(params, years, params["fuel_types"])
+    return LpAffineExpression(
+        [(new_ship[y, s], params["investment_cost"].get(s, 0) * n_fuels)
+         for y in years for s in params["ship_types"]]
+        + [(stock_ship[y, s], params["op_cost"].get(s, 0) * n_fuels)
+           for y in years for s in params["ship_types"]]
+        + [(fuel_demand[y, f], fuel_cost[i, j] * n_ships)
+           for i, y in enumerate(years) for j, f in enumerate(params["fuel_types"])]
+        + [(excess_emissions[y], params["ets_price"].get(y, 0)) for y in years]
+    )
 
 class MaritimeScenarioAnalysis:
-    def __init__(self, working_directory):
-        self.working_directory = working_directory
-        os.chdir(working_directory)
+    def __init__(self, source, builder="pulp", result_cache=None, solver=None, years=None,
+                 retirement="legacy", output_directory=None):
+        # source: where the input files are read from: a directory, a zip
+        # archive of the files, a {file name: contents} dict or a DataSource
+        # (see maritime_io.data_source). Nothing depends on the cwd, so
+        # analyses of different sources can run side by side in one process
+        # output_directory: where result_cache (and main's outputs) go; by
+        # default the directory of the source (next to a zip archive)
+        # builder: "pulp" builds the model term by term with pulp objects,
+        # "matrix" builds the sparse array form (see maritime_matrix.py),
+        # "persistent" builds it once and only patches coefficients for later
+        # scenarios (only the inputs that changed are recomputed)
+        # result_cache: directory (or ResultCache) of stored extract_results
+        # frames, used by solveAndExtract to skip already solved scenarios
+        # solver: SolverConfig (or just a backend name, "cbc" or "highs")
+        # years: planning horizon (default 2020-2050); input data outside the
+        # range of the files count as 0, like any other missing entry
+        # retirement: "legacy" keeps the original formulation; "cohort" retires
+        # ships by build year and the initial fleet by age (see
+        # maritime_matrix.retirement_schedule)
+        self.source = data_source(source)
+        self.output_directory = os.path.abspath(output_directory or self.source.directory)
+        self.builder = builder
+        if isinstance(solver, str):
+            solver = SolverConfig(backend=solver)
+        self.solver = (solver or SolverConfig()).resolve(builder)
+        self.years = range(2020, 2051) if years is None else years
+        self.retirement = retirement
+        # Parsed input files are shared between scenarios (see maritime_io.CsvCache)
+        self.csv_cache = csv_cache
+        self.persistent_model = None
+        if isinstance(result_cache, str):
+            result_cache = ResultCache(os.path.join(self.output_directory, result_cache))
+        self.result_cache = result_cache
         
+    @profiler.timed("getParameters")
     def getParameters(self, scenario='base', scenario_files = scenario_files):
         
-        # Scenario-specific parameters
-        
-      
-        
-        # Load scenario-specific files
-        files = scenario_files[scenario]
+        # Scenario-specific parameters ('+' compositions are allowed, see compose_scenario)
+        files = scenario_inputs(scenario, scenario_files)
         params = {
-            "years": range(2020, 2051),
+            "years": self.years,
             "ship_types": ["C", "T", "B", "G", "O"],
    #         "engine_types": ["ME-C", "ME-GI", "ME-LGI"],
-            "init_capacity_fleet": (
-                pd.read_csv(files['init_capacity_fleet'], index_col="ship_type")["capacity"].to_dict()
-            ),
-            "minim_capacity_fleet": (
-                pd.read_csv(files['minim_capacity_fleet'], index_col="ship_type")["limit"].to_dict()
-            ),
-            "fleet_age": (
-                pd.read_csv(files['fleet_age'], index_col="ship_type")["avr_age"].to_dict()
-            ),
-            "demand_shipping": (
-                pd.read_csv(files['demand_shipping'])
-                .set_index(["year", "ship_type"])["demand"]
-                .to_dict()
-            ),
-            "investment_cost": (
-                pd.read_csv(files['investment_cost'], index_col="ship_type")["cost"].to_dict()
-            ),
-            "op_cost": (
-                pd.read_csv(files['op_cost'], index_col="ship_type")["cost"].to_dict()
-            ),
-            "emissions_factor": (
-                pd.read_csv(files['emissions_factor'], index_col="fuel_type")["factor"].to_dict()
-            ),
-            "prod_capacity": (
-                pd.read_csv(files['prod_capacity'])
-                .set_index(["year", "ship_type"])["capacity"]
-                .to_dict()
-            ),
-            "lifetime": (
-                pd.read_csv(files['lifetime'], index_col="ship_type")["years"].to_dict()
-            ),
-            "cap": pd.read_csv(files['cap'], index_col="ship_type")["capacity"].to_dict(),
-            "CII_desired":
-                pd.read_csv(files['CII_desired'])
-                .set_index(["ship_type", "year"])["CII"]
-                .to_dict(),
-            "fuel_cost": pd.read_csv(files['fuel_cost'])
-            .set_index(["fuel_type", "year"])["cost"]
-            .to_dict(),
-            "ets_price": pd.read_csv(files['ets_price'], index_col="year")["price"].to_dict(),
-            "co2_cap": pd.read_csv(files['co2_cap'], index_col="year")["cap"].to_dict(),
-            "fuel_avail": (
-                pd.read_csv(files['fuel_avail'])
-                .set_index(["fuel_type", "year"])["availability"]
-                .to_dict()
-            ),
-            "fuel_consumption": (
-                pd.read_csv(files['fuel_consumption'])
-                .set_index(["ship_type", "fuel_type", "year"])["consumption"]
-                .to_dict()
-            )
         }
-        
-        params["fuel_types"] = list( pd.read_csv(files['fuel_cost'])["fuel_type"].unique())
+        params.update(self._read_inputs(files, list(input_columns)))
+        params["fuel_types"] = self._fuel_types(files)
+        params["retirement"] = self.retirement
         return params
-    
-        
 
-    def createAndSolveModel(self, params):
+    @profiler.timed("getParameters")
+    def getParametersDelta(self, params, scenario, reference_scenario='base',
+                           scenario_files = scenario_files):
+        """
+        Parameters of `scenario` derived from `params`, the parameters of
+        `reference_scenario`: only the inputs whose file differs are re-read.
+        Returns the new parameters and the list of changed inputs.
+        """
+        files = scenario_inputs(scenario, scenario_files)
+        changed = scenario_delta(files, scenario_inputs(reference_scenario, scenario_files))
+        new_params = dict(params)
+        new_params.update(self._read_inputs(files, changed))
+        if 'fuel_cost' in changed:
+            new_params["fuel_types"] = self._fuel_types(files)
+        return new_params, changed
+
+    def _read_inputs(self, files, keys):
+        # Parameter dicts of the given inputs, read through the shared CSV cache
+        inputs = {}
+        for key in keys:
+            if key not in input_columns:
+                continue
+            index, column = input_columns[key]
+            inputs[key] = self.csv_cache.to_dict(files[key], index, column, self.source)
+            if key in sparse_inputs:
+                inputs[key] = SparseParameter(inputs[key])
+        return inputs
+
+    def _fuel_types(self, files):
+        return list(self.csv_cache.frame(files['fuel_cost'], self.source)["fuel_type"].unique())
+
+    def createAndSolveModel(self, params, changed=None, return_handles=False):
+        # changed: inputs that differ from the previous call (persistent builder only)
+        # return_handles: also return the ModelHandles of the decision variables
+        if (self.builder in ("matrix", "persistent") or self.solver.mode == "fast"
+                or self.solver.window is not None or self.solver.decomposition):
+            if self.solver.decomposition:
+                model = self.createAndSolveDecomposedModel(params)
+            elif self.solver.window is not None:
+                model = self.createAndSolveRollingModel(params)
+            elif self.solver.mode == "fast":
+                model = self.createAndSolveFastModel(params)
+            elif self.builder == "matrix":
+                model = self.createAndSolveMatrixModel(params)
+            else:
+                model = self.createAndSolvePersistentModel(params, changed)
+            if self.solver.duals:
+                with profiler.stage("duals"):
+                    model.sensitivities = matrix_sensitivities(model, self.solver.highs_options())
+            return (model, model.handles()) if return_handles else model
+
+        with profiler.stage("build"):
+            model, handles, constraints = self.build_pulp_model(params)
+        with profiler.stage("solve"):
+            solve_pulp(model, self.solver)
+        if self.solver.duals:
+            with profiler.stage("duals"):
+                model.sensitivities = pulp_sensitivities(model, handles, constraints, self.solver)
+
+        if LpStatus[model.status] == "Optimal":
+            print(f"Total Cost : {model.objective.value()}")
+        else:
+            print("No optimal solution found.")
+        if return_handles:
+            return model, handles
+        return model
+
+    def build_pulp_model(self, params):
+        # The pulp model of createAndSolveModel, unsolved: returns the model, the
+        # ModelHandles of its variables and its constraints by family
         model = LpProblem(name="MaritimeGCHgr", sense=LpMinimize)
 
         # Decision Variables
@@ -507,69 +302,96 @@ class MaritimeScenarioAnalysis:
         }
 
         # Objective Function
-        model += lpSum(
-            new_ship[y, s] * params["investment_cost"].get(s, 0)
-            + stock_ship[y, s] * params["op_cost"].get(s, 0)
-            + fuel_demand[y, f] * params["fuel_cost"].get(f, y)
-            for y in params["years"]
-            for s in params["ship_types"]
-            for f in params["fuel_types"]
-        ) + lpSum(
-            excess_emissions[y] * params["ets_price"].get(y, 0)
-            for y in params["years"]
-        )
+        model += objective_expression(params, new_ship, stock_ship, fuel_demand, excess_emissions)
             
         ##### Constraints
+        # Named {family}_{year}[_{index}] and kept by family (for the duals, see
+        # maritime_sensitivity), with the families of the matrix builder
+        constraints = {family: {} for family in constraint_families}
+
+        def add_constraint(family, key, constraint):
+            name = "_".join(str(k) for k in (family, *(key if isinstance(key, tuple) else (key,))))
+            model.addConstraint(constraint, name)
+            constraints[family][key] = constraint
 
     # Fleet Capacity Constraint ### Here the demand is in million GtNM (I tried to change the units, but the problem gets infeasible..)
         for y in params["years"]:
             for s in params["ship_types"]:
-                model += (
+                add_constraint("fleet_capacity", (y, s),
                     stock_ship[y, s] * params["cap"].get(s, 0) >= params["demand_shipping"].get((y, s), 0)
                 )
         
         for y in params["years"]:
             for s in params["ship_types"]:
-                model += new_ship[y, s] <= params["prod_capacity"].get((y, s), 0)
-
-        for y in params["years"]:
-            for s in params["ship_types"]:
-                if y == 2020:
-                    model += stock_ship[y, s] == params["init_capacity_fleet"].get(s, 0)
+                add_constraint("production", (y, s),
+                               new_ship[y, s] <= params["prod_capacity"].get((y, s), 0))
+
+        # Retirements from precomputed (retire year, build year) index arrays,
+        # one term per (year, ship type), see maritime_matrix.retirement_schedule
+        years, ship_types = list(params["years"]), list(params["ship_types"])
+        t, j, build, multiplicity, initial = retirement_schedule(params, years, ship_types)
+        retired_new = {(years[a], ship_types[b]): m * new_ship[years[c], ship_types[b]]
+                       for a, b, c, m in zip(t, j, build, multiplicity)}
+        for i, y in enumerate(years):
+            for k, s in enumerate(ship_types):
+                if i == 0:
+                    add_constraint("stock_update", (y, s),
+                                   stock_ship[y, s] == params["init_capacity_fleet"].get(s, 0))
                 else:
-                    retired_ships = lpSum(
-                        new_ship[max(2020, y - params["lifetime"].get(s, 1) + 1 - params["fleet_age"].get(s, 0)), s]
-                        for y_prev in range(max(2020, y - params["lifetime"].get(s, 1) + 1), y)
-                    )
-                    model += stock_ship[y, s] == stock_ship[y-1, s] + new_ship[y, s] - retired_ships
+                    retired_ships = retired_new.get((y, s), 0) + initial[i, k]
+                    add_constraint("stock_update", (y, s),
+                                   stock_ship[y, s] == stock_ship[y-1, s] + new_ship[y, s] - retired_ships)
 
+        # Only the nonzero consumptions, grouped by (year, fuel)
+        consumption = SparseParameter.of(params["fuel_consumption"]).group(2, 1)
         for y in params["years"]:
             for f in params["fuel_types"]:
                 fuel_demand_value = lpSum(
                     stock_ship[y, s]
-                    * params["fuel_consumption"].get((s, f, y), 0)
+                    * value
                     * 1e-2
-                    for s in params["ship_types"]
+                    for s, value in consumption.get((y, f), [])
+                    if (y, s) in stock_ship
        #             for eng in params["engine_types"]
                 )
-                model += fuel_demand[y, f] == fuel_demand_value  
+                add_constraint("fuel_demand", (y, f), fuel_demand[y, f] == fuel_demand_value)
        #         model += fuel_demand[y, f] <= params["fuel_avail"].get((f, y), 0)
 
         for y in params["years"]:
-            model += co2_emissions[y] == lpSum(
+            add_constraint("emissions", y, co2_emissions[y] == lpSum(
                 fuel_demand[y, f] * params["emissions_factor"].get(f, 0) * 1e-3
                 for f in params["fuel_types"]
-            )
-
-        for y in params["years"]:
-            model += co2_emissions[y] <= params["co2_cap"].get(y, 0) + excess_emissions[y]
+            ))
 
         for y in params["years"]:
-            for s in params["ship_types"]:
-                model += co2_emissions[y] <= params["cap"].get(s, 1) * params["CII_desired"].get(s, y)
-
-        # Solve the model
-        model.solve()
+            add_constraint("ets_cap", y,
+                           co2_emissions[y] <= params["co2_cap"].get(y, 0) + excess_emissions[y])
+
+        # CII bound (none in the years without a CII target)
+        cii_bound = cii_bound_table(params, params["years"], params["ship_types"])
+        for i, y in enumerate(params["years"]):
+            for j, s in enumerate(params["ship_types"]):
+                if np.isfinite(cii_bound[i, j]):
+                    add_constraint("cii", (y, s), co2_emissions[y] <= cii_bound[i, j])
+
+        handles = ModelHandles(new_ship, stock_ship, fuel_demand, co2_emissions, excess_emissions)
+        return model, handles, constraints
+
+    def createAndSolveMatrixModel(self, params):
+        # Same model as createAndSolveModel, built as NumPy arrays and one sparse
+        # constraint matrix, and passed to the solver as a matrix (CBC reads it
+        # from an MPS file, see maritime_mps)
+        with profiler.stage("build"):
+            model = build_matrix_model(params)
+        if self.solver.backend == "cbc":
+            with profiler.stage("solve"):
+                solve_mps_cbc(model, self.solver, self.solver.model_file)
+        else:
+            if self.solver.model_file is not None:
+                with profiler.stage("write_mps"):
+                    write_mps(model, self.solver.model_file)
+            with profiler.stage("solve"):
+                solve_matrix_model(model, self.solver.msg, self.solver.highs_options())
 
         if LpStatus[model.status] == "Optimal":
             print(f"Total Cost : {model.objective.value()}")
@@ -577,240 +399,375 @@ class MaritimeScenarioAnalysis:
             print("No optimal solution found.")
         return model
 
-    def extract_results(self, model, params):
-        variables = model.variables()
-        years = list(params['years'])
-        results = {
-            'Year': years,
-            'CO2_Emissions': [0 for _ in years],
-            'Total_Cost': [model.objective.value() for _ in years],
-            'Investment_Cost': [0 for _ in years],
-            'Operational_Cost': [0 for _ in years],
-            'Fuel_Cost': [0 for _ in years],
-            'excess_emissions': [0 for _ in years],
-            'ets_penalty': [0 for _ in years], 
-            'Total_Cost_Per_Year': [0 for _ in years]
-        }
-        
-        for s in params['ship_types']:
-            results[f'New_Ships_{s}'] = [0 for _ in years]
-            results[f'Stock_Ships_{s}'] = [0 for _ in years]
-        
-        for f in params['fuel_types']:
-            results[f'Fuel_Demand_{f}'] = [0 for _ in years]
-
-        for v in variables:
-            name_parts = v.name.split('_')
-            if name_parts[0] == 'co2':
-                year = int(name_parts[2])
-                year_index = years.index(year)
-                results['CO2_Emissions'][year_index] = v.varValue
-            elif name_parts[0] == 'new' or name_parts[0] == 'stock':
-                year = int(name_parts[2])
-                year_index = years.index(year)
-                ship_type = name_parts[3]
-                if name_parts[0] == 'new':
-                    results[f'New_Ships_{ship_type}'][year_index] = v.varValue
-                    results['Investment_Cost'][year_index] += v.varValue * params['investment_cost'].get(ship_type, 0)
-                else:
-                    results[f'Stock_Ships_{ship_type}'][year_index] = v.varValue
-                    results['Operational_Cost'][year_index] += v.varValue * params['op_cost'].get(ship_type, 0)
-            elif name_parts[0] == 'fuel':
-                year = int(name_parts[2])
-                year_index = years.index(year)
-                fuel_type = name_parts[3]
-                results[f'Fuel_Demand_{fuel_type}'][year_index] = v.varValue
-                results['Fuel_Cost'][year_index] += v.varValue * 100 * params['fuel_cost'].get((fuel_type, year), 0)
-            elif name_parts[0] == 'excess':
-                year = int(name_parts[2])
-                year_index = years.index(year)
-                results['excess_emissions'][year_index] = v.varValue
-
-        for i, year in enumerate(years):
-            results['ets_penalty'][i] = results['excess_emissions'][i] * params['ets_price'].get(year, 0)
-            
-        for i, year in enumerate(years):
-            results['Total_Cost_Per_Year'][i] = results['ets_penalty'][i] + results['Investment_Cost'][i] + results['Fuel_Cost'][i] + results['Operational_Cost'][i]
-
-        return pd.DataFrame(results)
-
-def detect_scenario_differences(scenario_results, base_scen):
-    """
-    Detect which variables differ significantly between scenarios.
-    """
-    differences = {
-        'costs': False,
-        'emissions': False,
-        'fleet': False,
-        'fuel_mix': False,
-        'ets_penalty': False,
-        'excess_emissions': False
-    }
-    
-    base_data = scenario_results[base_scen]
-    scenarios = list(scenario_results.keys())
-    
-    threshold = 0.05  # 1% difference threshold
-    
-    for scenario in scenarios:
-        if scenario == base_scen:
-            continue
-            
-        data = scenario_results[scenario]
-        
-        # Check cost differences
-        cost_metrics = ['Total_Cost', 'Total_Cost_Per_Year', 'Investment_Cost', 'Operational_Cost', 'Fuel_Cost']
-        for metric in cost_metrics:
-            rel_diff = abs(data[metric] - base_data[metric]).mean() / (base_data[metric].mean() + 1e-10)
-            if rel_diff > threshold:
-                differences['costs'] = True
-                
-        # Check emissions differences
-        emissions_diff = abs(data['CO2_Emissions'] - base_data['CO2_Emissions']).mean() / (base_data['CO2_Emissions'].mean() + 1e-10)
-        if emissions_diff > threshold:
-            differences['emissions'] = True
-            
-        ets_diff = abs(data['ets_penalty'] - base_data['ets_penalty']).mean() / (base_data['ets_penalty'].mean() + 1e-10)
-        if ets_diff > threshold:
-            differences['ets_penalty'] = True           
-            
-        excess_emissions = abs(data['excess_emissions'] - base_data['excess_emissions']).mean() / (base_data['excess_emissions'].mean() + 1e-10)
-        if excess_emissions > threshold:
-            differences['excess_emissions'] = True               
-            
-        # Check fleet differences
-        fleet_columns = [col for col in data.columns if 'Stock_Ships_' in col]
-        for col in fleet_columns:
-            fleet_diff = abs(data[col] - base_data[col]).mean() / (base_data[col].mean() + 1e-10)
-            if fleet_diff > threshold:
-                differences['fleet'] = True
-                break
-                
-        # Check fuel mix differences
-        fuel_columns = [col for col in data.columns if 'Fuel_Demand_' in col]
-        for col in fuel_columns:
-            fuel_diff = abs(data[col] - base_data[col]).mean() / (base_data[col].mean() + 1e-10)
-            if fuel_diff > threshold:
-                differences['fuel_mix'] = True
-                break
-                
-            
-    
-    return differences
-
-def create_plots(df, params, scenario):
-    years = np.array(df['Year'])
-
-    # Set general plot style
-    plt.rcParams['font.weight'] = 'bold'
-    plt.rcParams['axes.labelweight'] = 'bold'
-    plt.rcParams['axes.titleweight'] = 'bold'
-
-
-
-    # Costs Plots
-    cost_components = ['Investment_Cost', 'Operational_Cost', 'Fuel_Cost', 'ets_penalty', 'Total_Cost_Per_Year']
-    cost_components.append('Total_Cost')
-
-    for component in cost_components:
-       plt.figure(figsize=(12, 6))
-       plt.plot(years, np.array(df[component]), marker='o')
-       plt.title(f'{component} over Years', fontweight='bold')
-       plt.xlabel('Year', fontweight='bold')
-       plt.ylabel('Costs [million Euros]', fontweight='bold')
-       plt.grid(True, linestyle='--', alpha=0.7)
-       plt.tight_layout()
-       plt.savefig(f'{component.lower().replace(" ", "_")}_over_years_{scenario}.png', dpi = 350)
-       plt.close()
-
+    def createAndSolveFastModel(self, params):
+        # LP relaxation plus fleet rounding (SolverConfig(mode="fast")), for
+        # screening runs; the gap to the relaxation bound is in the solve stats
+        with profiler.stage("build"):
+            model = build_matrix_model(params)
+        with profiler.stage("solve"):
+            solve_fast(model, self.solver.msg, self.solver.highs_options())
 
+        if LpStatus[model.status] == "Optimal":
+            print(f"Total Cost : {model.objective.value()} (fast mode, gap {model.solve_stats.gap:.2%})")
+        else:
+            print("No optimal solution found.")
+        return model
 
-       # CO2 Emissions over Years
-       plt.figure(figsize=(12, 6))
-
-       # Plot total CO2 emissions
-       plt.plot(years, np.array(df['CO2_Emissions']), label='Total CO2 Emissions', color='blue')
+    def createAndSolveRollingModel(self, params):
+        # Rolling-horizon solve (SolverConfig(window=..., overlap=...)), see maritime_rolling.py
+        with profiler.stage("build"):
+            model = build_matrix_model(params)
+        with profiler.stage("solve"):
+            solve_rolling(model, self.solver.window, self.solver.overlap, self.solver.msg,
+                          self.solver.highs_options(), fast=self.solver.mode == "fast",
+                          compare=self.solver.compare)
 
-       # Plot CO2 cap
-       plt.plot(years, np.array([params['co2_cap'].get(y, 0) for y in years]), label='CO2 Cap', color='red', linestyle='--')
+        if LpStatus[model.status] == "Optimal":
+            gap = model.solve_stats.gap
+            print(f"Total Cost : {model.objective.value()} (rolling horizon"
+                  + (f", gap {gap:.2%} to the monolithic solve)" if gap is not None else ")"))
+        else:
+            print("No optimal solution found.")
+        return model
 
-       # Fill the area representing excess emissions
-       plt.fill_between(years, 
-                 [params['co2_cap'].get(y, 0) for y in years],
-                 df['CO2_Emissions'],
-                 where=(df['CO2_Emissions'] > [params['co2_cap'].get(y, 0) for y in years]),
-                 color='red', alpha=0.3, label='Excess Emissions')
+    def createAndSolveDecomposedModel(self, params):
+        # Per-ship-type Lagrangian decomposition (SolverConfig(decomposition="lagrangian")),
+        # see maritime_decomposition.py
+        with profiler.stage("build"):
+            model = build_matrix_model(params)
+        with profiler.stage("solve"):
+            solve_lagrangian(model, self.solver.highs_options(), fast=self.solver.mode == "fast",
+                             workers=self.solver.subproblem_workers)
 
-       plt.title('CO2 Emissions and Cap [million tonnes]', fontweight='bold')
-       plt.xlabel('Year', fontweight='bold')
-       plt.ylabel('CO2 Emissions', fontweight='bold')
-       plt.legend()
-       plt.grid(True, linestyle='--', alpha=0.7)
-       plt.tight_layout()
-       plt.savefig(f"co2_emissions_over_years_{scenario}.png", dpi = 350)
-       plt.close()
+        if LpStatus[model.status] == "Optimal":
+            print(f"Total Cost : {model.objective.value()} (decomposition, "
+                  f"gap {model.solve_stats.gap:.2%} to the Lagrangian bound)")
+        else:
+            print("No optimal solution found.")
+        return model
 
-    
-        
+    def createAndSolvePersistentModel(self, params, changed=None):
+        # Build the model on the first call; afterwards only the coefficients
+        # and right-hand sides that differ from the previous scenario are patched
+        with profiler.stage("build"):
+            if self.persistent_model is None:
+                self.persistent_model = PersistentMaritimeModel(params, self.solver.msg,
+                                                                self.solver.highs_options())
+            else:
+                self.persistent_model.update(params, changed)
+        with profiler.stage("solve"):
+            model = self.persistent_model.solve()
 
-    
-    # Fuel Demand
-    plt.figure(figsize=(12, 6))
-    bottom = np.zeros(len(years))
-    for f in params['fuel_types']:
-        plt.bar(years, np.array(df[f'Fuel_Demand_{f}']), bottom=bottom, label=f)
-        bottom += np.array(df[f'Fuel_Demand_{f}'])  # Update bottom to stack next fuel type on top
-
-    # Add title and labels
-    plt.title('Fuel Demand [tonnes]', fontweight='bold')
-    plt.xlabel('Year', fontweight='bold')
-    plt.ylabel('Fuel Demand', fontweight='bold')
-    plt.legend()
-    plt.grid(True, linestyle='--', alpha=0.7)
-    plt.tight_layout()
-    plt.savefig(f"fuel_demand_{scenario}.png", dpi = 350)
-    plt.close()
-
-    
-    # New Ships
-    plt.figure(figsize=(12, 6))
-    # Initialize the bottom position for stacking
-    bottom = np.zeros(len(years))
-    for s in params['ship_types']:
-        plt.bar(years, np.array(df[f'New_Ships_{s}']), bottom=bottom, label=s)
-        bottom += np.array(df[f'New_Ships_{s}'])  
-    plt.title('New Ships [number]', fontweight='bold')
-    plt.xlabel('Year', fontweight='bold')
-    plt.ylabel('Number of New Ships', fontweight='bold')
-    plt.legend()
-    plt.grid(True, linestyle='--', alpha=0.7)
-    # Save and close
-    plt.tight_layout()
-    plt.savefig(f"new_ships_{scenario}.png", dpi = 350)
-    plt.close()
+        if LpStatus[model.status] == "Optimal":
+            print(f"Total Cost : {model.objective.value()}")
+        else:
+            print("No optimal solution found.")
+        return model
 
-    # Stock Ships
-    
-    plt.figure(figsize=(12, 6))
-    bottom = np.zeros(len(years))
-    for s in params['ship_types']:
-        plt.bar(years, np.array(df[f'Stock_Ships_{s}']), bottom=bottom, label=s)
-        bottom += np.array(df[f'Stock_Ships_{s}'])
-    plt.title('Stock Ships [number]', fontweight='bold')
-    plt.xlabel('Year', fontweight='bold')
-    plt.ylabel('Number of Stock Ships', fontweight='bold')
-    plt.legend()
-    plt.grid(True, linestyle='--', alpha=0.7)
-    # Save and close
-    plt.tight_layout()
-    plt.savefig(f"stock_ships_{scenario}.png", dpi = 350)
-    plt.close()
+    def sweep(self, param, values, scenario='base', params=None):
+        # Re-solve one persistent model with params[param] scaled by each
+        # value, e.g. sweep("ets_price", np.linspace(0, 3, 13)); see
+        # maritime_sensitivity.sweep for the returned points and results
+        return sweep(self, param, values, scenario, params)
+
+    def solver_settings(self):
+        # Everything besides the parameters that changes the solved results
+        return {"builder": self.builder, "model_version": model_version,
+                "solver": self.solver.settings(), "years": self.years}
+
+    def solveAndExtract(self, params, changed=None):
+        """
+        createAndSolveModel + extract_results. With a result cache, scenarios
+        whose parameters and solver settings were solved before are loaded from
+        disk instead. Returns the results frame and whether a solve was needed.
+        The SolveStats of the solve are kept in results_df.attrs["solve_stats"],
+        and with SolverConfig(duals=True) the duals and reduced costs (see
+        maritime_sensitivity) in results_df.attrs["sensitivities"].
+        """
+        key = None
+        if self.result_cache is not None:
+            key = params_hash(params, self.solver_settings())
+            results_df = self.result_cache.get(key)
+            if results_df is not None:
+                print("Loaded stored results (inputs unchanged)")
+                return results_df, False
+        model, handles = self.createAndSolveModel(params, changed, return_handles=True)
+        results_df = self.extract_results(model, params, handles)
+        results_df.attrs["solve_stats"] = model.solve_stats._asdict()
+        if getattr(model, "sensitivities", None) is not None:
+            results_df.attrs["sensitivities"] = model.sensitivities
+        if key is not None and LpStatus[model.status] == "Optimal":
+            self.result_cache.put(key, results_df)
+        return results_df, True
+
+    @profiler.timed("extract_results")
+    def extract_results(self, model, params, handles=None):
+        """
+        Yearly results of a solved model as a DataFrame. With the ModelHandles
+        of the model (see createAndSolveModel(return_handles=True); a
+        MatrixModel provides its own) the values are read by index in one pass;
+        otherwise they are recovered from the variable names.
+        """
+        if handles is None and isinstance(model, MatrixModel):
+            handles = model.handles()
+        if handles is not None:
+            values = _handle_values(model, handles, params)
+        else:
+            values = _named_values(model, params)
+        return _results_frame(model.objective.value(), params, *values)
+
+def _handle_values(model, handles, params):
+    # Solution values as arrays shaped (years, ship types) / (years, fuel types) / (years,)
+    years = list(params['years'])
+    ship_types = params['ship_types']
+    fuel_types = params['fuel_types']
+    keys = {
+        'new_ship': [(y, s) for y in years for s in ship_types],
+        'stock_ship': [(y, s) for y in years for s in ship_types],
+        'fuel_demand': [(y, f) for y in years for f in fuel_types],
+        'co2_emissions': years,
+        'excess_emissions': years,
+    }
+    shapes = {
+        'new_ship': (len(years), len(ship_types)),
+        'stock_ship': (len(years), len(ship_types)),
+        'fuel_demand': (len(years), len(fuel_types)),
+        'co2_emissions': (len(years),),
+        'excess_emissions': (len(years),),
+    }
+    values = []
+    for family, handle in zip(ModelHandles._fields, handles):
+        if isinstance(handle, np.ndarray):
+            # No solution (e.g. infeasible): zeros, as for unset pulp variables
+            x = np.zeros(model.num_cols) if model.x is None else np.asarray(model.x, dtype=float)
+            values.append(x[handle])
+        else:
+            values.append(np.array([handle[k].varValue or 0.0 for k in keys[family]],
+                                   dtype=float).reshape(shapes[family]))
+    return values
+
+def _named_values(model, params):
+    # Same arrays as _handle_values, recovered from the variable names
+    years = list(params['years'])
+    year_index = {y: i for i, y in enumerate(years)}
+    ship_index = {s: j for j, s in enumerate(params['ship_types'])}
+    fuel_index = {f: j for j, f in enumerate(params['fuel_types'])}
+    new = np.zeros((len(years), len(ship_index)))
+    stock = np.zeros((len(years), len(ship_index)))
+    fuel = np.zeros((len(years), len(fuel_index)))
+    co2 = np.zeros(len(years))
+    excess = np.zeros(len(years))
+    for v in model.variables():
+        for prefix, target, index in (('new_ship_', new, ship_index),
+                                      ('stock_ship_', stock, ship_index),
+                                      ('fuel_demand_', fuel, fuel_index),
+                                      ('co2_emissions_', co2, None),
+                                      ('excess_emissions_', excess, None)):
+            if v.name.startswith(prefix):
+                year, _, label = v.name[len(prefix):].partition('_')
+                i = year_index[int(year)]
+                if index is None:
+                    target[i] = v.varValue or 0.0
+                else:
+                    target[i, index[label]] = v.varValue or 0.0
+                break
+    return new, stock, fuel, co2, excess
+
+def _results_frame(objective_value, params, new, stock, fuel, co2, excess):
+    # Yearly cost components with the coefficients of objective_expression, so
+    # they add up to Total_Cost over the years
+    years = list(params['years'])
+    ship_types = params['ship_types']
+    fuel_types = params['fuel_types']
+    investment_cost = np.array([params['investment_cost'].get(s, 0) for s in ship_types], dtype=float)
+    op_cost = np.array([params['op_cost'].get(s, 0) for s in ship_types], dtype=float)
+    fuel_cost = fuel_cost_table(params, years, fuel_types)
+    ets_price = np.array([params['ets_price'].get(y, 0) for y in years], dtype=float)
+
+    investment = new @ investment_cost * len(fuel_types)
+    operational = stock @ op_cost * len(fuel_types)
+    fuel_total = (fuel * fuel_cost).sum(axis=1) * len(ship_types)
+    ets_penalty = excess * ets_price
+    results = {
+        'Year': years,
+        'CO2_Emissions': co2,
+        'Total_Cost': np.full(len(years), objective_value, dtype=float),
+        'Investment_Cost': investment,
+        'Operational_Cost': operational,
+        'Fuel_Cost': fuel_total,
+        'excess_emissions': excess,
+        'ets_penalty': ets_penalty,
+        'Total_Cost_Per_Year': ets_penalty + investment + fuel_total + operational,
+    }
+    for j, s in enumerate(ship_types):
+        results[f'New_Ships_{s}'] = new[:, j]
+        results[f'Stock_Ships_{s}'] = stock[:, j]
+    for j, f in enumerate(fuel_types):
+        results[f'Fuel_Demand_{f}'] = fuel[:, j]
+
+    return pd.DataFrame(results)
+
+# One analysis per (data source, output directory, builder, result cache, solver, years) in each worker
+# process, so a persistent model is reused by all scenarios that process
+# solves. The files and parameters of the last solved scenario are kept to
+# load the next one as a delta.
+_worker_state = {}
+
+def _run_scenario(source, scenario, files, builder, result_cache=None, solver=None,
+                  years=None, output_directory=None):
+    # Worker for run_scenarios: load, build, solve and extract one scenario.
+    # The stage records of the scenario (see maritime_profiling) go back with
+    # the results.
+    start = time.perf_counter()
+    key = (source, output_directory, builder, result_cache, solver, years)
+    if key not in _worker_state:
+        analysis = MaritimeScenarioAnalysis(source, builder=builder, result_cache=result_cache,
+                                            solver=solver, years=years,
+                                            output_directory=output_directory)
+        _worker_state[key] = {"analysis": analysis, "files": None, "params": None}
+    state = _worker_state[key]
+    analysis = state["analysis"]
+    with profiler.scenario(scenario):
+        if state["params"] is None:
+            params = analysis.getParameters(scenario, {scenario: files})
+            changed = None
+        else:
+            params, changed = analysis.getParametersDelta(
+                state["params"], scenario, '_previous', {scenario: files, '_previous': state["files"]})
+        results_df, solved = analysis.solveAndExtract(params, changed)
+    if solved:
+        state["files"], state["params"] = files, params
+    return scenario, results_df, params, time.perf_counter() - start, profiler.drain()
+
+def run_scenarios(names=None, workers=None, source=".", builder="pulp",
+                  scenario_files=scenario_files, result_cache=None, solver=None, years=None,
+                  dataset=None, resume=True, output_directory=None):
+    """
+    Solve independent scenarios in a pool of worker processes.
+
+    Returns three dicts keyed by scenario name (in the order of `names`): the
+    extract_results DataFrames, the parameter dicts and the wall time of each
+    scenario in seconds. workers=None uses one process per CPU; workers=1 runs
+    everything in the calling process. source is where the input files are
+    read from (a directory, zip archive, dict or DataSource, see
+    MaritimeScenarioAnalysis). result_cache is a directory (relative to
+    output_directory, by default the directory of the source) of stored
+    results; scenarios whose inputs did not
+    change since they were stored there are not solved again. solver is a
+    SolverConfig (or backend name) used by every scenario, years the
+    planning horizon (default 2020-2050).
+
+    With a dataset (a ResultDataset, or its directory relative to
+    output_directory) each scenario's results are appended to it as soon as
+    the scenario finishes, and the results are returned as a
+    LazyScenarioResults that reads them back on access. Each part is stored
+    with the params_hash of the scenario's inputs and solver settings. With
+    resume=True the scenarios already in the dataset (e.g. from a run that
+    crashed) are not run again (their wall time is 0), unless their inputs,
+    solver, builder or years changed since; resume=False clears the dataset
+    first.
+    """
+    names = list(scenario_files) if names is None else list(names)
+    source = data_source(source)
+    output_directory = os.path.abspath(output_directory or source.directory)
+    results, params, wall_times = {}, {}, {}
+    if isinstance(dataset, str):
+        dataset = ResultDataset(os.path.join(output_directory, dataset))
+    if dataset is not None and not resume:
+        dataset.clear()
+    done = []
+    if dataset is not None:
+        analysis = MaritimeScenarioAnalysis(source, builder=builder, solver=solver, years=years,
+                                            output_directory=output_directory)
+        settings = analysis.solver_settings()
+        # A stored part is reused only while its inputs and settings are unchanged
+        stored = [name for name in names if name in dataset]
+        with profiler.paused():
+            keys = {name: params_hash(analysis.getParameters(name, scenario_files), settings)
+                    for name in stored}
+        done = [name for name in stored if dataset.part_key(name) == keys[name]]
+        if len(done) < len(stored):
+            print(f"{len(stored) - len(done)} scenarios in {dataset.directory} are out of date, "
+                  f"solved again")
+    if done:
+        print(f"{len(done)} scenarios already in {dataset.directory}, not run again")
+        for name in done:
+            with profiler.scenario(name):
+                params[name] = analysis.getParameters(name, scenario_files)
+            wall_times[name] = 0.0
+
+    def collect(scenario, results_df, scenario_params, wall_time, records):
+        profiler.extend(records)
+        if dataset is None:
+            results[scenario] = results_df
+        else:
+            dataset.append(scenario, results_to_long({scenario: results_df}), results_df.attrs,
+                           key=params_hash(scenario_params, settings))
+        params[scenario] = scenario_params
+        wall_times[scenario] = wall_time
+        print(f"{scenario} scenario finished in {wall_time:.2f} s")
+
+    todo = [name for name in names if name not in done]
+    start = time.perf_counter()
+    if workers == 1:
+        for name in todo:
+            collect(*_run_scenario(source, name, scenario_inputs(name, scenario_files),
+                                   builder, result_cache, solver, years, output_directory))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_scenario, source, name,
+                                   scenario_inputs(name, scenario_files), builder, result_cache,
+                                   solver, years, output_directory)
+                       for name in todo]
+            for future in as_completed(futures):
+                collect(*future.result())
+    print(f"{len(todo)} scenarios solved in {time.perf_counter() - start:.2f} s "
+          f"(sum of scenario times {sum(wall_times.values()):.2f} s)")
+
+    results = (LazyScenarioResults(dataset, names) if dataset is not None
+               else {n: results[n] for n in names})
+    return results, {n: params[n] for n in names}, {n: wall_times[n] for n in names}
+
+# Metrics compared by detect_scenario_differences, by category (a string
+# selects every metric whose name contains it)
+difference_metrics = {
+    'costs': ['Total_Cost', 'Total_Cost_Per_Year', 'Investment_Cost', 'Operational_Cost', 'Fuel_Cost'],
+    'emissions': ['CO2_Emissions'],
+    'fleet': 'Stock_Ships_',
+    'fuel_mix': 'Fuel_Demand_',
+    'ets_penalty': ['ets_penalty'],
+    'excess_emissions': ['excess_emissions'],
+}
+
+def detect_scenario_differences(scenario_results, base_scen, threshold=0.05):
+    """
+    Detect which variables differ significantly between scenarios: a category
+    differs when, for some scenario and metric, the mean absolute difference
+    to the base scenario exceeds `threshold` times the base mean. All
+    scenarios are compared at once on the stacked scenario x year x metric
+    array (see maritime_io.stack_results).
+    """
+    stacked = stack_results(scenario_results)
+    values = stacked.values
+    base = values[stacked.scenarios.index(base_scen)]
+    others = [i for i, s in enumerate(stacked.scenarios) if s != base_scen]
+
+    # Relative deviation of every scenario and metric from the base scenario
+    rel_diff = np.abs(values[others] - base).mean(axis=1) / (base.mean(axis=0) + 1e-10)
+    exceeds = (rel_diff > threshold).any(axis=0)
+
+    differences = {}
+    for category, metrics in difference_metrics.items():
+        if isinstance(metrics, str):
+            metrics = [m for m in stacked.metrics if metrics in m]
+        differences[category] = bool(exceeds[stacked.metric_index(metrics)].any())
+    return differences
 
-    print("Plots saved as PNG files in the working directory")
-    
-def create_scenario_comparison_plots(scenario_results, scenario_differences, base_scen):
+def create_scenario_comparison_plots(scenario_results, scenario_differences, base_scen,
+                                     directory='.'):
     """
-    Create comparison plots for different scenarios based on detected differences.
+    Create comparison plots for different scenarios based on detected differences,
+    saved in `directory`.
     """
     years = scenario_results[base_scen]['Year']
     scenarios = list(scenario_results.keys())
@@ -872,13 +829,15 @@ def create_scenario_comparison_plots(scenario_results, scenario_differences, bas
             # fig.delaxes(axes[row, col])
     
     plt.tight_layout()
-    plt.savefig('scenario_comparison_dynamic.png', dpi=350, bbox_inches='tight')
+    plt.savefig(os.path.join(directory, 'scenario_comparison_dynamic.png'), dpi=350, bbox_inches='tight')
     print("Figure created")
     plt.close()
     
-def create_scenario_comparison_plots_new(scenario_results, scenario_differences, scenarios, base_scen):
+def create_scenario_comparison_plots_new(scenario_results, scenario_differences, scenarios, base_scen,
+                                         directory='.'):
     """
-    Create comparison plots for different scenarios based on detected differences.
+    Create comparison plots for different scenarios based on detected differences,
+    saved in `directory`.
     """
     years = scenario_results[base_scen]['Year']
     scenarios = list(scenario_results.keys())
@@ -903,15 +862,20 @@ def create_scenario_comparison_plots_new(scenario_results, scenario_differences,
     print(f"Parameters to plot: {parameters_to_plot}")
     
     # Set plot style
-    plt.style.use('seaborn-darkgrid') 
+    plt.style.use('seaborn-v0_8-darkgrid' if 'seaborn-v0_8-darkgrid' in plt.style.available
+                  else 'seaborn-darkgrid')
     n_scenarios = len(scenarios)
-    cmap = cm.get_cmap('viridis')
+    cmap = matplotlib.colormaps['viridis']
     
     if n_scenarios > 1:
         colors = {scenario: cmap(i/(n_scenarios-1)) for i, scenario in enumerate(scenarios)}
     else:
         colors = {scenarios[0]: cmap(0)}
     
+    # Every scenario is read once, into scenario x year x metric arrays
+    fuel_columns = [col for col in scenario_results[base_scen].columns if 'Fuel_Demand_' in col]
+    stacked = stack_results(scenario_results, metrics=parameters_to_plot + fuel_columns)
+    
     # Create main subplots for other parameters
     num_plots = len(parameters_to_plot)
     num_cols = 2
@@ -926,9 +890,10 @@ def create_scenario_comparison_plots_new(scenario_results, scenario_differences,
         col = plot_idx % num_cols
         
         if 'Fuel_Demand_' not in param:
-            for scenario in scenarios:
+            k = stacked.metrics.index(param)
+            for i, scenario in enumerate(scenarios):
                 axes[row, col].plot(
-                    years, scenario_results[scenario][param],
+                    years, stacked.values[i, :, k],
                     label=f'{scenario.capitalize()} Scenario',
                     color=colors.get(scenario, 'black'), 
                     linewidth=3
@@ -949,39 +914,30 @@ def create_scenario_comparison_plots_new(scenario_results, scenario_differences,
     
     # Save main parameters figure
     plt.tight_layout()
-    plt.savefig('scenario_comparison_dynamic.png', dpi=350, bbox_inches='tight')
+    plt.savefig(os.path.join(directory, 'scenario_comparison_dynamic.png'), dpi=350, bbox_inches='tight')
     plt.close()
 
     # Create fuel mix comparison if fuel demand columns exist
-    fuel_columns = [col for col in scenario_results[base_scen].columns if 'Fuel_Demand_' in col]
     if fuel_columns:
         # Identify fuel columns and years
         fuel_labels = [col.replace('Fuel_Demand_', '') for col in fuel_columns]
-        years = scenario_results[base_scen]['Year'].unique()
 
-        # Prepare data for plotting
-        fuel_mix_data = {}
-        for scenario in scenarios:
-            fuel_mix_data[scenario] = {}
-            for year in years:
-                year_data = []
-                for col in fuel_columns:
-                    fuel_demand = scenario_results[scenario].loc[scenario_results[scenario]['Year'] == year, col].values[0]
-                    year_data.append(fuel_demand)
-                fuel_mix_data[scenario][year] = year_data
+        # Fuel mix of every scenario at once: scenario x year x fuel
+        years = stacked.years
+        fuel_mix_data = stacked.values[:, :, stacked.metric_index(fuel_columns)]
 
         # Create figure with subplots for each scenario
         fig, axes = plt.subplots(1, len(scenarios), figsize=(20, 6), sharey=True)
         
         # Color palette
-        colors = plt.cm.get_cmap('Set3')(np.linspace(0, 1, len(fuel_labels)))
+        colors = matplotlib.colormaps['Set3'](np.linspace(0, 1, len(fuel_labels)))
         
         # Plot for each scenario
         for idx, scenario in enumerate(scenarios):
             ax = axes[idx] if len(scenarios) > 1 else axes
             
             # Prepare data for stacked area plot
-            scenario_data = np.array([fuel_mix_data[scenario][year] for year in years])
+            scenario_data = fuel_mix_data[idx]
             
             # Create stacked area plot
             ax.stackplot(years, scenario_data.T, labels=fuel_labels, colors=colors, alpha=0.7)
@@ -1000,154 +956,89 @@ def create_scenario_comparison_plots_new(scenario_results, scenario_differences,
         fig.legend(handles, labels, loc='center left', bbox_to_anchor=(1.05, 0.5))
 
         plt.tight_layout()
-        plt.savefig('fuel_mix_comparison.png', dpi=350, bbox_inches='tight')
+        plt.savefig(os.path.join(directory, 'fuel_mix_comparison.png'), dpi=350, bbox_inches='tight')
         plt.close()
 
     print("Figures created")
     
-def create_combined_figure(df, params, scenario):
-    
-    df = df[df['Year'] >= 2025].reset_index(drop=True)
-    years = np.array(df['Year'])
-    
-    fig, axes = plt.subplots(4, 2, figsize=(20,20))  # Create a 4x2 grid of subplots
-
-    # Set general plot style
-    plt.rcParams['font.size'] = 16
-    plt.rcParams['font.weight'] = 'bold'
-    plt.rcParams['axes.labelweight'] = 'bold'
-    plt.rcParams['axes.titleweight'] = 'bold'
-
-    # Stock Ships
-    bottom = np.zeros(len(years))
-    for s in params['ship_types']:
-        axes[0, 0].bar(years, np.array(df[f'Stock_Ships_{s}']), bottom=bottom, label=s)
-        bottom += np.array(df[f'Stock_Ships_{s}'] ) 
-    axes[0, 0].set_title('Stock Ships [number]', fontweight='bold')
-    axes[0, 0].set_xlabel('Year', fontweight='bold')
-    axes[0, 0].set_ylabel('Number of Stock Ships', fontweight='bold')
-    axes[0, 0].legend(loc='upper left')
-    axes[0, 0].grid(True, linestyle='--', alpha=0.7)
-
-    # New Ships
-    bottom = np.zeros(len(years))
-    for s in params['ship_types']:
-        axes[0, 1].bar(years, np.array(df[f'New_Ships_{s}']), bottom=bottom, label=s)
-        bottom += np.array(df[f'New_Ships_{s}'])  
-    axes[0, 1].set_title('New Ships [number]', fontweight='bold')
-    axes[0, 1].set_xlabel('Year', fontweight='bold')
-    axes[0, 1].set_ylabel('Number of New Ships', fontweight='bold')
-    axes[0, 1].legend()
-    axes[0, 1].grid(True, linestyle='--', alpha=0.7)
-
-    # Investment Costs
-    axes[1, 0].plot(years, np.array(df['Investment_Cost']), marker='o')
-    axes[1, 0].set_title('Investment Costs [million Euros]', fontweight='bold')
-    axes[1, 0].set_xlabel('Year', fontweight='bold')
-    axes[1, 0].set_ylabel('Costs [million Euros]', fontweight='bold')
-    axes[1, 0].grid(True, linestyle='--', alpha=0.7)
-
-    # Operational Costs
-    axes[1, 1].plot(years, np.array(df['Operational_Cost']), marker='o')
-    axes[1, 1].set_title('Operational Costs [million Euros]', fontweight='bold')
-    axes[1, 1].set_xlabel('Year', fontweight='bold')
-    axes[1, 1].set_ylabel('Costs [million Euros]', fontweight='bold')
-    axes[1, 1].grid(True, linestyle='--', alpha=0.7)
-
-    # Fuel Demand
-    
-    fuel_colors = {
-     'Oil': '#4A4A4A',    # Light red
-     'RefPO': '#707070',  # Light blue
-     'LPG': '#989898',    # Light green
-     'LNG': '#BAC4BA',    # Light orange
-     'H2': '#7FB069', # Light purple
-     'NH3': '#5C8C4D',  # Light blue
-     'MeOH': '#2E5522' # Light cyan
-     }
- 
-    
-    bottom = np.zeros(len(years))
-    for f in params['fuel_types']:
-        axes[2, 0].bar(years, np.array(df[f'Fuel_Demand_{f}']), bottom=bottom, label=f, color=fuel_colors.get(f, None))
-        bottom += np.array(df[f'Fuel_Demand_{f}'])
-    axes[2, 0].set_title('Fuel Demand [tonnes]', fontweight='bold')
-    axes[2, 0].set_xlabel('Year', fontweight='bold')
-    axes[2, 0].set_ylabel('Fuel Demand', fontweight='bold')
-    axes[2, 0].legend()
-    axes[2, 0].grid(True, linestyle='--', alpha=0.7)
-
-    # Fuel Costs
-    axes[2, 1].plot(years, np.array(df['Fuel_Cost']), marker='o')
-    axes[2, 1].set_title('Fuel Costs [million Euros]', fontweight='bold')
-    axes[2, 1].set_xlabel('Year', fontweight='bold')
-    axes[2, 1].set_ylabel('Costs [million Euros]', fontweight='bold')
-    axes[2, 1].grid(True, linestyle='--', alpha=0.7)
-
-    # CO2 Emissions and Cap
-    axes[3, 0].plot(years, np.array(df['CO2_Emissions']), label='Total CO2 Emissions', color='blue')
-    axes[3, 0].plot(years, np.array([params['co2_cap'].get(y, 0) for y in years]), label='CO2 Cap', color='red', linestyle='--')
-    axes[3, 0].fill_between(years, 
-                            np.array([params['co2_cap'].get(y, 0) for y in years]),
-                            df['CO2_Emissions'],
-                            where=(df['CO2_Emissions'] > [params['co2_cap'].get(y, 0) for y in years]),
-                            color='red', alpha=0.3, label='Excess Emissions')
-    axes[3, 0].set_title('CO2 Emissions and Cap [million tonnes]', fontweight='bold')
-    axes[3, 0].set_xlabel('Year', fontweight='bold')
-    axes[3, 0].set_ylabel('CO2 Emissions', fontweight='bold')
-    axes[3, 0].legend()
-    axes[3, 0].grid(True, linestyle='--', alpha=0.7)
-
-    # ETS Penalty
-    axes[3, 1].plot(years, np.array(df['ets_penalty']), marker='o')
-    axes[3, 1].set_title('ETS Penalty [million Euros]', fontweight='bold')
-    axes[3, 1].set_xlabel('Year', fontweight='bold')
-    axes[3, 1].set_ylabel('Penalty Costs [million Euros]', fontweight='bold')
-    axes[3, 1].grid(True, linestyle='--', alpha=0.7)
-
-    # Adjust layout and save the figure
-    plt.tight_layout(pad=4.0)
-    plt.savefig(f"combined_figure_{scenario}.png", dpi = 400)
-    plt.close()
-
-    print("Combined figure saved as 'combined_figure.png' in the working directory")    
-        
-def main():
+def main(workers=None, result_cache="result_cache", result_store="maritime_results.arrow",
+         export_excel=False, solver=None, years=None, plots=True, plot_workers=None,
+         result_dataset="maritime_results", resume=True, profile_report="maritime_profile",
+         profile_stage=None, source=os.path.dirname(os.path.abspath(__file__)),
+         output_directory=None):
+    # source: the input files (a directory, a zip archive or a {name: contents}
+    # dict, see MaritimeScenarioAnalysis); by default the files next to this script
+    # output_directory: where every output file below goes (relative names are
+    # taken from there); by default the directory of the source
+    # plots: True plots every scenario, False none, or a list of the scenarios to plot
+    # plot_workers: processes of the plot stage (None = one per CPU)
+    # result_dataset: directory the results of each scenario are streamed to as
+    # it finishes (see run_scenarios); resume=True skips the scenarios already
+    # there, so a crashed run continues where it stopped
+    # profile_report: the wall time, CPU time and peak memory of every stage of
+    # every scenario are written to {profile_report}.json/.csv (see
+    # maritime_profiling); profile_stage runs cProfile around one stage, e.g. "solve"
+    profiler.clear()
     # Initialize scenario analysis
-    analysis = MaritimeScenarioAnalysis(r'C:\Users\your_path...\MaritimeGCH\Beta_Version')
+    analysis = MaritimeScenarioAnalysis(source, solver=solver, years=years,
+                                        output_directory=output_directory)
+    output_directory = analysis.output_directory
+    if profile_stage is not None:
+        profiler.profile(profile_stage, directory=os.path.join(output_directory, "profiles"))
+
+    # cProfile stays on only for this run (and the workers it starts)
+    try:
+        # Run scenarios (solved in parallel, see run_scenarios)
+        scenarios = list(scenario_files.keys())
+        scenario_results, scenario_params, wall_times = run_scenarios(
+            scenarios, workers=workers, source=analysis.source, builder=analysis.builder,
+            result_cache=result_cache, solver=analysis.solver, years=analysis.years,
+            dataset=result_dataset, resume=resume, output_directory=output_directory)
     
-    # Run scenarios
-    scenarios = list(scenario_files.keys())
-    scenario_results = {}
+        # Status, runtime, nodes and gap of each solve
+        solve_stats = solve_stats_table(scenario_results)
+        print(solve_stats.to_string(index=False))
+        solve_stats.to_csv(os.path.join(output_directory, 'maritime_solve_stats.csv'), index=False)
     
-    for scenario in scenarios:
-        print(f"\nRunning {scenario} scenario...")
-        params = analysis.getParameters(scenario, scenario_files)
-        model = analysis.createAndSolveModel(params)
-        results_df = analysis.extract_results(model, params)
-        scenario_results[scenario] = results_df
-        create_plots(results_df, params, scenario)
-        create_combined_figure(results_df, params, scenario)
-
-        # Save individual scenario results
-        results_df.to_excel(f'maritime_results_{scenario}.xlsx', index=False)
+        # Duals and reduced costs at the integer solution (SolverConfig(duals=True))
+        if analysis.solver.duals:
+            sensitivity_table(scenario_results).to_csv(
+                os.path.join(output_directory, 'maritime_sensitivities.csv'), index=False)
     
+        # Per-scenario plots, rendered in parallel (see maritime_plots.render_plots)
+        if plots:
+            render_plots(scenario_results, scenario_params,
+                         scenarios=scenarios if plots is True else plots, workers=plot_workers,
+                         directory=output_directory)
     
-    if len(scenarios) > 1:
-    # Create comparison plots
-        scenario_differences = detect_scenario_differences(scenario_results, base_scen = scenarios[0])
-        create_scenario_comparison_plots_new(scenario_results, scenario_differences, scenarios, base_scen = scenarios[0])
+        # All results in one file, in long format (scenario, year, metric, value),
+        # copied part by part from the streamed dataset
+        store = ResultStore(os.path.join(output_directory, result_store))
+        with profiler.stage("write_results"):
+            store.write(scenario_results)
+        if export_excel:
+            export_results_to_excel(scenario_results, directory=output_directory)
+    
+        if len(scenarios) > 1:
+        # Create comparison plots
+            with profiler.stage("comparison_plots"):
+                scenario_differences = detect_scenario_differences(scenario_results, base_scen = scenarios[0])
+                create_scenario_comparison_plots_new(scenario_results, scenario_differences, scenarios, base_scen = scenarios[0],
+                                                     directory=output_directory)
 
         
-        # Create and save the combined figure
+            # Create and save the combined figure
     
-         
-    # Save combined results
-    with pd.ExcelWriter('maritime_results_all_scenarios.xlsx') as writer:
-        for scenario in scenarios:
-            scenario_results[scenario].to_excel(writer, sheet_name=scenario, index=False)
     
-    print("\nScenario analysis completed. Results saved to Excel and plots generated.")
+        # Where the time went, per stage over all scenarios
+        if profile_report:
+            profiler.write(os.path.join(output_directory, profile_report))
+            print(profiler.summary().to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    
+        print(f"\nScenario analysis completed. Results saved to {store.path} and plots generated.")
+    finally:
+        if profile_stage is not None:
+            profiler.profile(None)
 
 if __name__ == "__main__":
     try:
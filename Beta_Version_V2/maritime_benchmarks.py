@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the MaritimeGCH scenario model.
+
+bench_objective times the objective assembly alone; bench_scaling times
+model build, solve and extraction of MaritimeScenarioAnalysis on synthetic
+fleets of N ship types, F fuel types and Y years (see synthetic_parameters).
+Every run is appended to a history file (benchmark_history.csv next to this
+file), and each timing is compared to the median of the previous runs of
+the same benchmark and size, so slowdowns show up as regressions.
+
+Run with:
+
+    python maritime_benchmarks.py            # objective assembly
+    python maritime_benchmarks.py scaling    # synthetic fleets
+
+Both exit with status 1 when a timing regressed.
+"""
+
+import io
+import os
+import sys
+import time
+import itertools
+import platform
+import datetime
+import contextlib
+import subprocess
+import numpy as np
+import pandas as pd
+from pulp import LpVariable, lpSum
+
+from maritimeGHC_scenarios import (objective_expression, MaritimeScenarioAnalysis, SolverConfig,
+                                   input_columns)
+from maritime_io import SparseParameter
+from maritime_profiling import profiler
+
+
+def _objective_inputs(n_ships, n_fuels, n_years):
+    # Variables and cost dicts with the shapes createAndSolveModel uses
+    years = range(2020, 2020 + n_years)
+    ship_types = [f"S{i}" for i in range(n_ships)]
+    fuel_types = [f"F{i}" for i in range(n_fuels)]
+    params = {
+        "years": years,
+        "ship_types": ship_types,
+        "fuel_types": fuel_types,
+        "investment_cost": {s: 50.0 + i for i, s in enumerate(ship_types)},
+        "op_cost": {s: 2.0 + 0.1 * i for i, s in enumerate(ship_types)},
+        "fuel_cost": {(f, y): 4e-4 for f in fuel_types for y in years},
+        "ets_price": {y: 80.0 for y in years},
+    }
+    new_ship = {(y, s): LpVariable(f"new_ship_{y}_{s}", lowBound=0, cat="Integer")
+                for y in years for s in ship_types}
+    stock_ship = {(y, s): LpVariable(f"stock_ship_{y}_{s}", lowBound=0, cat="Integer")
+                  for y in years for s in ship_types}
+    fuel_demand = {(y, f): LpVariable(f"fuel_demand_{y}_{f}", lowBound=0)
+                   for y in years for f in fuel_types}
+    excess_emissions = {y: LpVariable(f"excess_emissions_{y}", lowBound=0) for y in years}
+    return params, new_ship, stock_ship, fuel_demand, excess_emissions
+
+
+def _objective_product(params, new_ship, stock_ship, fuel_demand, excess_emissions):
+    # The objective as it was written before: one lpSum over years x ship types x fuel types
+    return lpSum(
+        new_ship[y, s] * params["investment_cost"].get(s, 0)
+        + stock_ship[y, s] * params["op_cost"].get(s, 0)
+        + fuel_demand[y, f] * params["fuel_cost"].get((f, y), 0)
+        for y in params["years"]
+        for s in params["ship_types"]
+        for f in params["fuel_types"]
+    ) + lpSum(
+        excess_emissions[y] * params["ets_price"].get(y, 0)
+        for y in params["years"]
+    )
+
+
+def _best_time(fn, args, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_objective(sizes=None, repeat=3, include_product=True):
+    """
+    Time objective assembly for growing (ship types, fuels, years).
+    Returns one row per size with the build time and the time per variable.
+    """
+    if sizes is None:
+        sizes = ([(s, 7, 31) for s in (5, 10, 20, 40)]
+                 + [(5, f, 31) for f in (14, 28)]
+                 + [(5, 7, y) for y in (62, 124, 248)])
+    rows = []
+    for n_ships, n_fuels, n_years in sizes:
+        args = _objective_inputs(n_ships, n_fuels, n_years)
+        n_vars = n_years * (2 * n_ships + n_fuels + 1)
+        row = {"ship_types": n_ships, "fuel_types": n_fuels, "years": n_years,
+               "variables": n_vars,
+               "by_family_s": _best_time(objective_expression, args, repeat)}
+        if include_product:
+            row["product_s"] = _best_time(_objective_product, args, repeat)
+        rows.append(row)
+    df = pd.DataFrame(rows)
+    df["by_family_us_per_var"] = 1e6 * df["by_family_s"] / df["variables"]
+    return df
+
+
+def scaling_exponent(df, column="by_family_s"):
+    # Slope of log(time) against log(variables); ~1 means linear scaling
+    return float(np.polyfit(np.log(df["variables"]), np.log(df[column]), 1)[0])
+
+
+# Inputs that are split between the clones of a ship type or fuel type (so
+# that the synthetic fleet carries the same total demand and emissions as the
+# base scenario), rounded up where they count ships
+_ship_split = {"demand_shipping": False, "init_capacity_fleet": True, "prod_capacity": True}
+_fuel_split = ("fuel_consumption", "fuel_avail")
+# Costs drawn around the template's cost, so that clones are not interchangeable
+_jittered = ("investment_cost", "op_cost", "fuel_cost")
+
+
+def synthetic_parameters(n_ships, n_fuels, n_years, base_params=None, source=".",
+                         seed=0, jitter=0.1):
+    """
+    Parameters with the schema of MaritimeScenarioAnalysis.getParameters for
+    n_ships ship types, n_fuels fuel types and the years 2020 to
+    2020 + n_years - 1, derived from `base_params` (default: the base
+    scenario read from `source`, see MaritimeScenarioAnalysis). Ship type i
+    is a clone of base ship type i % 5 and fuel type j of base fuel j % 7.
+    Demand, initial fleet, production capacity, fuel consumption and
+    availability are split between the clones, so the totals stay those of
+    the base scenario; costs are multiplied by lognormal noise of scale
+    `jitter`. Years after the last base year repeat its values. The same
+    arguments give the same parameters.
+    """
+    if base_params is None:
+        analysis = MaritimeScenarioAnalysis(source)
+        with contextlib.redirect_stdout(io.StringIO()):
+            base_params = analysis.getParameters("base")
+    rng = np.random.default_rng(seed)
+    base_ships, base_fuels = list(base_params["ship_types"]), list(base_params["fuel_types"])
+    ship_types = [f"S{i:02d}" for i in range(n_ships)]
+    fuel_types = [f"F{j:02d}" for j in range(n_fuels)]
+    years = range(2020, 2020 + n_years)
+    last_year = max(base_params["years"])
+    clones = {"ship_type": {s: ship_types[i::len(base_ships)] for i, s in enumerate(base_ships)},
+              "fuel_type": {f: fuel_types[j::len(base_fuels)] for j, f in enumerate(base_fuels)},
+              "year": {y: ([t for t in years if t >= y] if y == last_year else
+                           [y] if y in years else []) for y in base_params["years"]}}
+
+    params = {"years": years, "ship_types": ship_types, "fuel_types": fuel_types,
+              "retirement": base_params["retirement"]}
+    for key, (index, _) in input_columns.items():
+        index = [index] if isinstance(index, str) else index
+        values = {}
+        for k, value in base_params[key].items():
+            k = k if isinstance(k, tuple) else (k,)
+            targets = [clones[name].get(part, []) for name, part in zip(index, k)]
+            for target in itertools.product(*targets):
+                divisor = 1
+                if key in _ship_split:
+                    divisor *= len(clones["ship_type"][k[index.index("ship_type")]])
+                if key in _fuel_split:
+                    divisor *= len(clones["fuel_type"][k[index.index("fuel_type")]])
+                v = value / divisor
+                if _ship_split.get(key):
+                    v = int(np.ceil(v))
+                values[target if len(target) > 1 else target[0]] = v
+        if key in _jittered:
+            noise = rng.lognormal(0.0, jitter, len(values))
+            values = {k: v * n for (k, v), n in zip(values.items(), noise)}
+        params[key] = SparseParameter(values) if isinstance(base_params[key], SparseParameter) else values
+    return params
+
+
+def _stage_times(records):
+    # {stage: wall time} from profiler records
+    times = {}
+    for r in records:
+        times[r.stage] = times.get(r.stage, 0.0) + r.wall
+    return times
+
+
+def bench_scaling(sizes=None, builders=("pulp", "matrix"), solver=None, repeat=1,
+                  source=".", seed=0):
+    """
+    Time build, solve and extract_results of MaritimeScenarioAnalysis for
+    synthetic fleets of (ship types, fuels, years) (see
+    synthetic_parameters), with each builder. solver is a SolverConfig
+    (default: a 300 s time limit per solve). Returns one row per size and
+    builder with the best time of each stage over `repeat` runs, the
+    solve status, objective, branch-and-bound nodes and gap. (With the base
+    production capacities the legacy retirement formulation turns infeasible
+    beyond about 47 years; those sizes still time the build.)
+    """
+    if sizes is None:
+        sizes = ([(s, 7, 31) for s in (5, 10, 20, 50)]
+                 + [(5, f, 31) for f in (14, 28)]
+                 + [(5, 7, y) for y in (40, 45)])
+    solver = solver or SolverConfig(time_limit=300)
+    analysis = MaritimeScenarioAnalysis(source)
+    with contextlib.redirect_stdout(io.StringIO()):
+        base_params = analysis.getParameters("base")
+    rows = []
+    for n_ships, n_fuels, n_years in sizes:
+        params = synthetic_parameters(n_ships, n_fuels, n_years, base_params, seed=seed)
+        for builder in builders:
+            best = {}
+            for _ in range(repeat):
+                analysis = MaritimeScenarioAnalysis(source, builder=builder, solver=solver)
+                mark = len(profiler.records)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    model, handles = analysis.createAndSolveModel(params, return_handles=True)
+                    analysis.extract_results(model, params, handles)
+                times = _stage_times(profiler.records[mark:])
+                del profiler.records[mark:]
+                best = {k: min(v, best.get(k, np.inf)) for k, v in times.items()}
+            stats = model.solve_stats
+            rows.append({"benchmark": "scaling", "builder": builder, "ship_types": n_ships,
+                         "fuel_types": n_fuels, "years": n_years,
+                         "variables": n_years * (2 * n_ships + n_fuels + 2),
+                         "build_s": best["build"], "solve_s": best["solve"],
+                         "extract_s": best["extract_results"], "status": stats.status,
+                         "objective": stats.objective, "nodes": stats.nodes, "gap": stats.gap})
+    return pd.DataFrame(rows)
+
+
+# Columns that identify a benchmark case, and the timings compared between runs
+_case_columns = ["benchmark", "builder", "ship_types", "fuel_types", "years"]
+_timing_columns = ["by_family_s", "product_s", "build_s", "solve_s", "extract_s"]
+
+
+def _run_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": commit, "python": platform.python_version(), "machine": platform.node()}
+
+
+def check_regressions(results, history_path="benchmark_history.csv", tolerance=0.25, window=5,
+                      min_seconds=0.05):
+    """
+    Compare each timing of `results` to the median of the last `window` runs
+    of the same case in the history file. Returns one row per case and
+    timing with the baseline, the ratio and whether it is a regression:
+    slower than 1 + tolerance times the baseline and by more than
+    min_seconds (millisecond timings are mostly noise). Cases without
+    history are left out.
+    """
+    columns = _case_columns + ["timing", "value", "baseline", "ratio", "regression"]
+    if not os.path.exists(history_path):
+        return pd.DataFrame(columns=columns)
+    history = pd.read_csv(history_path)
+    timings = [c for c in _timing_columns if c in results and c in history]
+
+    def long(df):
+        df = df.reindex(columns=_case_columns + timings)
+        df["builder"] = df["builder"].fillna("").astype(str)  # none for the objective benchmark
+        return df.melt(id_vars=_case_columns, value_vars=timings, var_name="timing").dropna(
+            subset=["value"])
+
+    past = long(history.sort_values("timestamp"))
+    baseline = (past.groupby(_case_columns + ["timing"], dropna=False)["value"]
+                .apply(lambda v: v.tail(window).median()).rename("baseline").reset_index())
+    out = long(results).merge(baseline, on=_case_columns + ["timing"], how="inner")
+    out["ratio"] = out["value"] / out["baseline"]
+    out["regression"] = ((out["ratio"] > 1 + tolerance)
+                         & (out["value"] - out["baseline"] > min_seconds))
+    return out[columns]
+
+
+def record_history(results, history_path="benchmark_history.csv"):
+    # Append results to the history file, with the time, commit and machine of the run
+    info = _run_info()
+    results = results.assign(**info)
+    if os.path.exists(history_path):
+        results = pd.concat([pd.read_csv(history_path), results], ignore_index=True)
+    results.to_csv(history_path, index=False)
+    return results
+
+
+if __name__ == "__main__":
+    # the input files and the history live next to this script, whatever the
+    # current directory
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if len(sys.argv) > 1 and sys.argv[1] == "scaling":
+        results = bench_scaling(source=directory)
+        print(results.to_string(index=False))
+    else:
+        results = bench_objective().assign(benchmark="objective")
+        print(results.to_string(index=False))
+        print(f"\nScaling exponent (per family): {scaling_exponent(results):.2f}")
+        if "product_s" in results:
+            print(f"Scaling exponent (product):    {scaling_exponent(results, 'product_s'):.2f}")
+    history_path = os.path.join(directory, "benchmark_history.csv")
+    regressions = check_regressions(results, history_path)
+    record_history(results, history_path)
+    if not regressions.empty:
+        print("\nCompared to the previous runs:")
+        print(regressions.to_string(index=False))
+    if regressions["regression"].any():
+        sys.exit(1)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Lagrangian decomposition of the MaritimeGCH scenario model by ship type.
+
+Ship types only interact through the emissions: fuel_demand and
+co2_emissions are linear in stock_ship, and the ETS cap (with
+excess_emissions) and the CII bound act on the yearly total. Substituting
+fuel demand into the objective and pricing the yearly emissions balance
+
+    sum_s e[y, s] * stock_ship[y, s] - co2_emissions[y] = 0     (multiplier lam[y])
+
+leaves one fleet subproblem per ship type (fleet capacity, production and
+stock update, with stocks priced at op + fuel cost + lam * e) plus a trivial
+per-year problem in co2_emissions/excess_emissions. The subproblems are
+solved in parallel worker processes; the multipliers follow a subgradient
+(Polyak step) method. Each iteration gives a lower bound (the Lagrangian
+dual) and, when the combined fleet meets the CII bound, a feasible plan
+(fuel demand, emissions and excess emissions follow from the stocks).
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pulp import LpStatus, LpStatusOptimal, LpStatusInfeasible
+
+from maritime_matrix import MatrixModel, solve_matrix_model, solve_fast
+from maritime_solvers import SolveStats, relative_gap
+
+
+def ship_type_subproblems(mm):
+    """
+    Split the fleet part of `mm` into one MatrixModel per ship type (columns
+    new_ship and stock_ship, rows fleet_capacity, production and
+    stock_update). Returns the subproblems and their columns in `mm`.
+    """
+    subs, columns = [], []
+    for j, s in enumerate(mm.ship_types):
+        cols = np.concatenate([mm.columns["new_ship"][:, j], mm.columns["stock_ship"][:, j]])
+        rows = np.concatenate([mm.rows[f][:, j] for f in ("fleet_capacity", "production",
+                                                          "stock_update")])
+        Y = len(mm.years)
+        sub = MatrixModel(mm.years, [s], mm.fuel_types)
+        sub.names = [mm.names[k] for k in cols]
+        sub.columns = {"new_ship": np.arange(Y)[:, None], "stock_ship": np.arange(Y, 2 * Y)[:, None]}
+        sub.rows = {f: (k * Y + np.arange(Y))[:, None]
+                    for k, f in enumerate(("fleet_capacity", "production", "stock_update"))}
+        sub.A = mm.A[rows][:, cols].tocsr()
+        sub.row_lower = mm.row_lower[rows]
+        sub.row_upper = mm.row_upper[rows]
+        sub.c = mm.c[cols]
+        sub.col_lower = mm.col_lower[cols]
+        sub.col_upper = mm.col_upper[cols]
+        sub.integrality = mm.integrality[cols]
+        subs.append(sub)
+        columns.append(cols)
+    return subs, columns
+
+
+def emission_terms(mm):
+    """
+    Linear maps from stock_ship (years x ship types) to fuel_demand and
+    co2_emissions, read from the fuel demand and emissions rows, plus the
+    yearly ETS cap, CII bound and ETS price.
+    """
+    A = mm.A
+    stock = mm.columns["stock_ship"]
+    fuel = mm.columns["fuel_demand"]
+    # fuel_demand[y, f] = sum_s phi[y, f, s] * stock[y, s]
+    phi = -np.asarray(A[mm.rows["fuel_demand"].ravel()][:, stock.ravel()].todense())
+    Y, S, F = len(mm.years), len(mm.ship_types), len(mm.fuel_types)
+    phi = phi.reshape(Y, F, Y, S)[np.arange(Y), :, np.arange(Y), :]           # (Y, F, S)
+    # co2_emissions[y] = sum_f ef[y, f] * fuel_demand[y, f]
+    ef = -np.asarray(A[mm.rows["emissions"]][:, fuel.ravel()].todense()).reshape(Y, Y, F)
+    ef = ef[np.arange(Y), np.arange(Y), :]                                     # (Y, F)
+    return {
+        "fuel": phi,
+        "co2": np.einsum("yf,yfs->ys", ef, phi),
+        "fuel_cost": np.einsum("yf,yfs->ys", mm.c[fuel], phi),
+        "ets_cap": mm.row_upper[mm.rows["ets_cap"]],
+        "cii": mm.row_upper[mm.rows["cii"]].min(axis=1),
+        "ets_price": mm.c[mm.columns["excess_emissions"]],
+    }
+
+
+def _emissions_dual(lam, terms):
+    # min over 0 <= co2 <= cii of ets_price * max(0, co2 - ets_cap) - lam * co2, per year
+    # (in the years without a CII bound lam is kept <= ets_price, where the
+    # minimum is at co2 = 0 or at the cap)
+    cap, cii, price = terms["ets_cap"], terms["cii"], terms["ets_price"]
+    candidates = np.stack([np.zeros_like(cii), np.clip(cap, 0, cii),
+                           np.where(np.isfinite(cii), cii, np.maximum(cap, 0))])
+    values = price * np.maximum(0, candidates - cap) - lam * candidates
+    best = values.argmin(axis=0)
+    return values[best, np.arange(len(cii))], candidates[best, np.arange(len(cii))]
+
+
+# Subproblems of the current decomposition in each worker process
+_worker_subproblems = []
+
+
+def _init_worker(subs):
+    _worker_subproblems[:] = subs
+
+
+def _solve_subproblem(j, cost, fast, options):
+    sub = _worker_subproblems[j]
+    sub.c = cost
+    (solve_fast if fast else solve_matrix_model)(sub, False, options)
+    bound = sub.solve_stats.bound
+    if bound is None or not np.isfinite(bound):
+        bound = sub.objective_value
+    return j, sub.status, sub.x, sub.objective_value, bound, sub.solve_stats.nodes or 0
+
+
+def solve_lagrangian(mm, options=None, fast=False, workers=None, max_iter=100, tol=1e-4,
+                     patience=10):
+    """
+    Solve `mm` by Lagrangian decomposition over ship types (see module
+    docstring). Subproblems are solved in `workers` processes (None = one
+    per ship type, 1 = in this process). Stops when the gap between the best
+    plan and the best dual bound is below `tol`, when the bound improved by
+    less than `tol` (relative) over the last `patience` iterations (what is
+    left is then mostly the duality gap), or after `max_iter` iterations.
+    Fills mm.x, mm.status, mm.objective_value and mm.solve_stats (bound =
+    best Lagrangian bound); mm.lagrangian_iterations logs the bounds.
+
+    Each iteration solves every ship type's fleet MIP, so at the size of the
+    shipped scenarios (4 ship types, 31 years) this takes 0.1-1 s against
+    about 0.02 s for the full model: it is meant for instances too large to
+    solve at once.
+    """
+    start = time.perf_counter()
+    subs, sub_columns = ship_type_subproblems(mm)
+    terms = emission_terms(mm)
+    S = len(subs)
+    Y = len(mm.years)
+    base_costs = [sub.c.copy() for sub in subs]
+    # Start from the ETS price, the marginal cost of emissions above the cap
+    lam = terms["ets_price"].copy()
+    best_x, upper, lower = None, np.inf, -np.inf
+    infeasible = False
+    theta, stall = 2.0, 0
+    nodes = 0
+    log = []
+
+    pool = None
+    if workers != 1:
+        pool = ProcessPoolExecutor(max_workers=workers or S, initializer=_init_worker,
+                                   initargs=(subs,))
+    else:
+        _init_worker(subs)
+    try:
+        for iteration in range(max_iter):
+            costs = []
+            for j in range(S):
+                cost = base_costs[j].copy()
+                cost[Y:] += terms["fuel_cost"][:, j] + lam * terms["co2"][:, j]
+                costs.append(cost)
+            tasks = [(j, costs[j], fast, options) for j in range(S)]
+            if pool is None:
+                results = [_solve_subproblem(*t) for t in tasks]
+            else:
+                results = list(pool.map(_solve_subproblem, *zip(*tasks)))
+            if any(status != LpStatusOptimal for _, status, *_ in results):
+                # A ship type cannot meet its own fleet constraints
+                infeasible = True
+                break
+            stock = np.zeros((Y, S))
+            x = np.zeros(mm.num_cols)
+            dual = 0.0
+            for j, _, xs, _, bound, n in results:
+                x[sub_columns[j]] = xs
+                stock[:, j] = xs[Y:]
+                dual += bound
+                nodes += n
+            emissions_value, co2_choice = _emissions_dual(lam, terms)
+            dual += emissions_value.sum()
+            if dual > lower:
+                lower, stall = dual, 0
+            else:
+                stall += 1
+                if stall >= 5:
+                    theta, stall = theta / 2, 0
+
+            # Primal plan: emissions follow from the combined fleet
+            co2 = (terms["co2"] * stock).sum(axis=1)
+            if np.all(co2 <= terms["cii"] * (1 + 1e-9)):
+                x[mm.columns["fuel_demand"]] = np.einsum("yfs,ys->yf", terms["fuel"], stock)
+                x[mm.columns["co2_emissions"]] = co2
+                x[mm.columns["excess_emissions"]] = np.maximum(0, co2 - terms["ets_cap"])
+                value = float(mm.c @ x)
+                if value < upper:
+                    upper, best_x = value, x
+
+            gap = relative_gap(upper, lower) if np.isfinite(upper) else None
+            log.append({"iteration": iteration, "lower": float(lower), "upper": float(upper),
+                        "dual": float(dual), "gap": gap})
+            if gap is not None and gap <= tol:
+                break
+            if (iteration >= patience
+                    and lower - log[iteration - patience]["lower"] <= tol * abs(lower)):
+                break
+            subgradient = co2 - co2_choice
+            norm = float(subgradient @ subgradient)
+            if norm == 0:
+                break
+            target = upper if np.isfinite(upper) else dual + abs(dual) * 0.01
+            # Kept in [0, ets_price]: above the ETS price the dual falls with the
+            # slope of the CII bound (-inf without one), below 0 no emission is
+            # worth paying for; unless the CII bound binds or emissions can be
+            # negative, the best multipliers lie in there
+            lam = np.clip(lam + theta * (target - dual) / norm * subgradient, 0, terms["ets_price"])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    mm.lagrangian_iterations = pd.DataFrame(log)
+    if best_x is not None:
+        mm.status = LpStatusOptimal
+        mm.x = best_x
+        mm.objective_value = upper
+    elif infeasible:
+        mm.status = LpStatusInfeasible
+        mm.x = None
+        mm.objective_value = None
+    else:
+        print("Lagrangian decomposition found no plan within the CII bound, "
+              "solving the monolithic model instead")
+        (solve_fast if fast else solve_matrix_model)(mm, False, options)
+        mm.solve_stats = mm.solve_stats._replace(runtime=time.perf_counter() - start)
+        return mm
+    mm.solve_stats = SolveStats("highs", LpStatus[mm.status], time.perf_counter() - start, nodes,
+                                relative_gap(mm.objective_value, lower)
+                                if mm.objective_value is not None else None,
+                                mm.objective_value, float(lower))
+    return mm
@@ -0,0 +1,765 @@
+# -*- coding: utf-8 -*-
+"""
+Input/output helpers for the MaritimeGCH scenario analysis.
+"""
+
+import io
+import os
+import json
+import hashlib
+import zipfile
+import posixpath
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from maritime_profiling import profiler
+
+try:
+    import pyarrow as pa  # optional, needed by ResultStore and ResultDataset
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = ds = pq = None
+
+
+class DataSource:
+    """
+    Where the input files of an analysis are read from, by file name. Sources
+    are picklable (worker processes get their own copy) and compare equal
+    when they read the same data, so they can key per-process state.
+
+    Subclasses implement read(name), the bytes of a file, and stamp(name),
+    a value that changes whenever the file does (None: unknown, the file is
+    hashed again on every read). `directory` is where files named relative
+    to the source are written (results, caches, plots).
+    """
+
+    directory = None
+
+    def read(self, name):
+        raise NotImplementedError
+
+    def stamp(self, name):
+        return None
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def _key(self):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._key() == self._key()
+
+    def __hash__(self):
+        return hash((type(self).__name__, self._key()))
+
+
+class DirectorySource(DataSource):
+    # Input files in a directory on disk
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read(self, name):
+        with open(self.path(name), "rb") as fh:
+            return fh.read()
+
+    def stamp(self, name):
+        st = os.stat(self.path(name))
+        return st.st_size, st.st_mtime_ns
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    def _key(self):
+        return self.directory
+
+    def __repr__(self):
+        return f"DirectorySource({self.directory!r})"
+
+
+class ZipSource(DataSource):
+    """
+    Input files in a zip archive (such as "input example data.zip"), found by
+    file name in any folder of the archive. Outputs go next to the archive
+    unless `directory` says otherwise.
+    """
+
+    def __init__(self, path, directory=None):
+        self.path = os.path.abspath(path)
+        self.directory = os.path.dirname(self.path) if directory is None else os.path.abspath(directory)
+        self._members = None  # (archive size, mtime) and file name -> member
+
+    def _member(self, name):
+        st = os.stat(self.path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        if self._members is None or self._members[0] != stamp:
+            with zipfile.ZipFile(self.path) as archive:
+                members = {}
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        members.setdefault(info.filename, info)
+                        members.setdefault(posixpath.basename(info.filename), info)
+            self._members = (stamp, members)
+        info = self._members[1].get(name)
+        if info is None:
+            raise FileNotFoundError(f"{name} not found in {self.path}")
+        return info
+
+    def read(self, name):
+        info = self._member(name)
+        # Opened per read, so that threads never share a file position
+        with zipfile.ZipFile(self.path) as archive:
+            return archive.read(info)
+
+    def stamp(self, name):
+        info = self._member(name)
+        return self._members[0], info.filename, info.CRC
+
+    def exists(self, name):
+        try:
+            self._member(name)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _key(self):
+        return self.path, self.directory
+
+    def __getstate__(self):
+        return {**self.__dict__, "_members": None}
+
+    def __repr__(self):
+        return f"ZipSource({self.path!r})"
+
+
+class MemorySource(DataSource):
+    """
+    Input files held in memory: {file name: CSV text, bytes or DataFrame}
+    (DataFrames are written without their index). Outputs go to `directory`,
+    the current directory at creation by default.
+    """
+
+    def __init__(self, files, directory="."):
+        self.files = {name: self._encode(data) for name, data in files.items()}
+        self.directory = os.path.abspath(directory)
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(self.files):
+            digest.update(name.encode() + b"\0" + self.files[name] + b"\0")
+        self._digest = digest.hexdigest()
+
+    @staticmethod
+    def _encode(data):
+        if isinstance(data, pd.DataFrame):
+            data = data.to_csv(index=False)
+        return data.encode() if isinstance(data, str) else bytes(data)
+
+    def read(self, name):
+        try:
+            return self.files[name]
+        except KeyError:
+            raise FileNotFoundError(f"{name} not in the in-memory data source") from None
+
+    def stamp(self, name):
+        return self._digest
+
+    def exists(self, name):
+        return name in self.files
+
+    def _key(self):
+        return self._digest, self.directory
+
+    def __repr__(self):
+        return f"MemorySource({len(self.files)} files)"
+
+
+def data_source(source):
+    """
+    The DataSource of `source`: a DataSource, a directory, a .zip archive or a
+    {file name: contents} dict (see MemorySource).
+    """
+    if isinstance(source, DataSource):
+        return source
+    if isinstance(source, Mapping):
+        return MemorySource(source)
+    source = os.fspath(source)
+    if os.path.isfile(source) and zipfile.is_zipfile(source):
+        return ZipSource(source)
+    return DirectorySource(source)
+
+
+def _tmp_path(path):
+    # Private temporary name next to `path`, unique per process and thread
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class CsvCache:
+    """
+    Process-wide cache of parsed input CSV files.
+
+    Files are read through a DataSource and identified by their content hash,
+    so the same file used by several scenarios (or copied under another name,
+    or into another source) is parsed only once. The hash of a file is
+    recomputed only when its stamp (e.g. size and mtime) changes. Parsed
+    files are kept as DataFrames (columnar), and the parameter dicts derived
+    from them are cached as well; both levels are LRU-bounded by `maxsize`.
+    The cache is shared by threads.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}            # (source, name) -> (stamp, digest)
+        self._frames = OrderedDict()  # digest -> DataFrame
+        self._dicts = OrderedDict()   # (digest, index, column) -> dict
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _source(name, source):
+        # A plain path (no source) is read from its directory
+        if source is None:
+            path = os.path.abspath(name)
+            return DirectorySource(os.path.dirname(path)), os.path.basename(path)
+        return data_source(source), name
+
+    def digest(self, name, source=None):
+        # Content hash of a file, reusing the last one while its stamp is unchanged
+        source, name = self._source(name, source)
+        stamp = source.stamp(name)
+        if stamp is not None:
+            with self._lock:
+                known = self._digests.get((source, name))
+                if known is not None and known[0] == stamp:
+                    return known[1], None
+        data = source.read(name)
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if stamp is not None:
+            with self._lock:
+                self._digests[(source, name)] = (stamp, digest)
+        return digest, data
+
+    def frame(self, name, source=None):
+        # Parsed DataFrame of CSV file `name` of `source` (a path when source is
+        # None); treat it as read-only
+        source, name = self._source(name, source)
+        digest, data = self.digest(name, source)
+        with self._lock:
+            df = self._frames.get(digest)
+            if df is not None:
+                self._frames.move_to_end(digest)
+                self.hits += 1
+                return df
+            self.misses += 1
+        if data is None:
+            data = source.read(name)
+        df = pd.read_csv(io.BytesIO(data))
+        with self._lock:
+            self._frames[digest] = df
+            self._evict(self._frames)
+        return df
+
+    def to_dict(self, name, index, column, source=None):
+        """
+        Same as pd.read_csv(name).set_index(index)[column].to_dict() for file
+        `name` of `source`, served from the cache. Returns a fresh (shallow)
+        copy on every call.
+        """
+        source, name = self._source(name, source)
+        digest, _ = self.digest(name, source)
+        key = (digest, tuple(index) if isinstance(index, list) else index, column)
+        with self._lock:
+            d = self._dicts.get(key)
+            if d is not None:
+                self._dicts.move_to_end(key)
+                self.hits += 1
+                return dict(d)
+        d = self.frame(name, source).set_index(index)[column].to_dict()
+        with self._lock:
+            self._dicts[key] = d
+            self._evict(self._dicts)
+        return dict(d)
+
+    def _evict(self, entries):
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "frames": len(self._frames), "dicts": len(self._dicts),
+                "maxsize": self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._digests.clear()
+            self._frames.clear()
+            self._dicts.clear()
+            self.hits = self.misses = 0
+
+
+# Shared by every MaritimeScenarioAnalysis in the process
+csv_cache = CsvCache()
+
+
+class SparseParameter(dict):
+    """
+    Parameter dict that keeps only its nonzero entries. Lookups with
+    .get(key, 0) read as before; iterating gives the nonzero keys directly,
+    so a model builder can loop over them instead of over the full product
+    of the index sets.
+    """
+
+    def __init__(self, data=()):
+        super().__init__((k, v) for k, v in dict(data).items() if v != 0)
+
+    @classmethod
+    def of(cls, data):
+        # data as a SparseParameter, without copying when it already is one
+        return data if isinstance(data, cls) else cls(data)
+
+    def group(self, *positions):
+        """
+        Nonzero entries grouped by the key elements at `positions`: for
+        fuel_consumption keyed (s, f, y), group(2, 1) gives
+        {(y, f): [(s, value), ...]}. The remaining key elements are kept in
+        their order (a bare element when only one is left).
+        """
+        groups = {}
+        for key, value in self.items():
+            outer = tuple(key[p] for p in positions)
+            inner = tuple(k for p, k in enumerate(key) if p not in positions)
+            groups.setdefault(outer, []).append((inner[0] if len(inner) == 1 else inner, value))
+        return groups
+
+
+def _canonical(value):
+    # Deterministic, hashable form of a parameter value (dict order and
+    # NumPy/Python scalar types do not change the result)
+    if isinstance(value, dict):
+        items = [(_canonical(k), _canonical(v)) for k, v in value.items()]
+        return ("dict", tuple(sorted(items, key=repr)))
+    if isinstance(value, range):
+        return ("range", value.start, value.stop, value.step)
+    if isinstance(value, (list, tuple)):
+        return ("seq", tuple(_canonical(v) for v in value))
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return ("array", value.dtype.str, value.shape, value.tobytes())
+    return value
+
+
+def params_hash(params, settings=None):
+    """
+    Content hash of a parameter dict (as returned by getParameters) plus the
+    solver settings it is solved with.
+    """
+    payload = repr((_canonical(params), _canonical(settings or {})))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk store of extract_results frames, keyed by params_hash. A scenario
+    whose parameters and solver settings are unchanged can be loaded from here
+    instead of being solved again.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pd.read_pickle(path)
+
+    def put(self, key, results_df):
+        # Write to a temporary file first so readers never see a partial file
+        path = self._path(key)
+        tmp = _tmp_path(path)
+        results_df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+
+
+def results_to_long(scenario_results):
+    """
+    Stack {scenario: extract_results frame} into one long frame with the
+    columns scenario, year, metric, value. Metric order follows the columns of
+    the first frame, so the wide frames can be rebuilt as they were.
+    """
+    frames = []
+    metrics = []
+    for scenario, df in scenario_results.items():
+        # attrs may hold frames (solve stats, sensitivities), which melt
+        # cannot compare; they are not part of the long format
+        wide = df.copy(deep=False)
+        wide.attrs = {}
+        long_df = wide.melt(id_vars='Year', var_name='metric', value_name='value')
+        long_df.insert(0, 'scenario', scenario)
+        frames.append(long_df.rename(columns={'Year': 'year'}))
+        metrics.extend(m for m in df.columns if m != 'Year' and m not in metrics)
+    out = pd.concat(frames, ignore_index=True)
+    out['scenario'] = pd.Categorical(out['scenario'], categories=list(scenario_results))
+    out['metric'] = pd.Categorical(out['metric'], categories=metrics)
+    out['year'] = out['year'].astype('int32')
+    out['value'] = out['value'].astype('float64')
+    return out
+
+
+def long_to_results(long_df):
+    # Inverse of results_to_long: {scenario: wide frame with a Year column}
+    results = {}
+    for scenario, group in long_df.groupby('scenario', observed=True, sort=False):
+        wide = group.pivot(index='year', columns='metric', values='value')
+        metrics = [m for m in long_df['metric'].cat.categories if m in wide.columns]
+        wide = wide[metrics].reset_index().rename(columns={'year': 'Year'})
+        wide.columns.name = None
+        results[scenario] = wide
+    return results
+
+
+class StackedResults(NamedTuple):
+    # values[i, j, k] is metrics[k] of scenarios[i] in years[j]
+    values: np.ndarray
+    scenarios: list
+    years: np.ndarray
+    metrics: list
+
+    def metric_index(self, metrics):
+        return [self.metrics.index(m) for m in metrics]
+
+
+def stack_results(scenario_results, metrics=None):
+    """
+    Stack {scenario: extract_results frame} into one scenario x year x metric
+    array, so that comparisons across scenarios are single NumPy operations.
+    Years are those of the first frame; metrics default to the union of all
+    columns (first-seen order). Metrics or years a scenario lacks are 0.
+    """
+    # Frames are read one at a time, so a LazyScenarioResults is never fully in memory
+    scenarios = list(scenario_results)
+    years = None
+    blocks = []
+    for scenario in scenarios:
+        df = scenario_results[scenario].set_index('Year')
+        if years is None:
+            years = df.index.to_numpy()
+        if metrics is not None:
+            df = df.reindex(index=years, columns=metrics, fill_value=0)
+        elif not np.array_equal(df.index, years):
+            df = df.reindex(index=years, fill_value=0)
+        blocks.append((list(df.columns), df.to_numpy(dtype=float)))
+    if years is None:
+        years = np.zeros(0, dtype=int)
+    if metrics is None:
+        metrics = list(dict.fromkeys(m for columns, _ in blocks for m in columns))
+    values = np.zeros((len(scenarios), len(years), len(metrics)))
+    position = {m: k for k, m in enumerate(metrics)}
+    for i, (columns, block) in enumerate(blocks):
+        if columns == metrics:
+            values[i] = block
+        else:
+            values[i][:, [position[m] for m in columns]] = block
+    return StackedResults(values, scenarios, years, list(metrics))
+
+
+class ResultStore:
+    """
+    Columnar store of scenario results in long format (scenario, year,
+    metric, value), written once per run. A '.parquet' path writes Parquet;
+    anything else writes an uncompressed Arrow IPC file, which readers can
+    memory-map (pyarrow.memory_map, or arrow::read_feather in R).
+    """
+
+    def __init__(self, path):
+        if pa is None:
+            raise ImportError("ResultStore needs pyarrow (pip install pyarrow)")
+        self.path = os.path.abspath(path)
+
+    @property
+    def is_parquet(self):
+        return self.path.endswith('.parquet')
+
+    def write(self, scenario_results):
+        """
+        Write {scenario: frame}, or copy a ResultDataset (or its
+        LazyScenarioResults) part by part without loading it whole.
+        """
+        if isinstance(scenario_results, (ResultDataset, LazyScenarioResults)):
+            return self._write_parts(scenario_results)
+        table = pa.Table.from_pandas(results_to_long(scenario_results), preserve_index=False)
+        tmp = _tmp_path(self.path)
+        if self.is_parquet:
+            pq.write_table(table, tmp)
+        else:
+            with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, self.path)
+
+    def _write_parts(self, source):
+        # Same layout as write(): scenario and metric dictionary-encoded with one
+        # dictionary for the whole file (run order of the scenarios, first-seen
+        # order of the metrics)
+        if isinstance(source, LazyScenarioResults):
+            dataset, parts = source.dataset, list(source)
+        else:
+            dataset, parts = source, source.parts()
+        metrics = []
+        for part in parts:
+            for metric in pc.unique(dataset.part_table(part).column('metric')).to_pylist():
+                if metric not in metrics:
+                    metrics.append(metric)
+        dictionaries = {'scenario': pa.array(parts, pa.string()), 'metric': pa.array(metrics, pa.string())}
+
+        def encode(table):
+            for name, dictionary in dictionaries.items():
+                column = table.column(name).cast(pa.string())
+                indices = pc.index_in(column, value_set=dictionary).cast(pa.int32())
+                encoded = pa.chunked_array([pa.DictionaryArray.from_arrays(chunk, dictionary)
+                                            for chunk in indices.chunks])
+                table = table.set_column(table.schema.get_field_index(name), name, encoded)
+            return table.replace_schema_metadata(None)
+
+        tmp = _tmp_path(self.path)
+        writer = sink = None
+        try:
+            for part in parts:
+                table = encode(dataset.part_table(part))
+                if writer is None:
+                    if self.is_parquet:
+                        writer = pq.ParquetWriter(tmp, table.schema)
+                    else:
+                        sink = pa.OSFile(tmp, 'wb')
+                        writer = pa.ipc.new_file(sink, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+            if sink is not None:
+                sink.close()
+        if writer is not None:
+            os.replace(tmp, self.path)
+
+    def table(self, memory_map=True):
+        if self.is_parquet:
+            return pq.read_table(self.path, memory_map=memory_map)
+        source = pa.memory_map(self.path) if memory_map else pa.OSFile(self.path)
+        return pa.ipc.open_file(source).read_all()
+
+    def read(self, scenarios=None, memory_map=True):
+        # Long frame, optionally restricted to some scenarios
+        df = _categorical(self.table(memory_map).to_pandas())
+        if scenarios is not None:
+            df = df[df['scenario'].isin(list(scenarios))]
+            df['scenario'] = df['scenario'].cat.remove_unused_categories()
+        return df
+
+    def scenario_results(self, scenarios=None):
+        return long_to_results(self.read(scenarios))
+
+
+class ResultDataset:
+    """
+    Append-only directory of long-format result parts, one uncompressed Arrow
+    IPC file per append (written atomically, so an interrupted run leaves only
+    complete parts and can resume by skipping the parts it already has, as
+    long as their key still matches).
+    Parts are read lazily as one pyarrow dataset: filters and column
+    selections are applied while scanning, on memory-mapped files.
+    """
+
+    suffix = ".arrow"
+    metadata_file = "metadata.json"
+
+    def __init__(self, directory):
+        if pa is None:
+            raise ImportError("ResultDataset needs pyarrow (pip install pyarrow)")
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def read_metadata(self):
+        # Metadata of the whole dataset (see write_metadata); None when there is none
+        path = os.path.join(self.directory, self.metadata_file)
+        if not os.path.exists(path):
+            return None
+        with open(path) as fh:
+            return json.load(fh)
+
+    def write_metadata(self, metadata):
+        # JSON-serialisable description of how the parts were made (e.g. the
+        # settings of a Monte Carlo run), written atomically
+        path = os.path.join(self.directory, self.metadata_file)
+        tmp = _tmp_path(path)
+        with open(tmp, "w") as fh:
+            json.dump(metadata, fh, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def _path(self, part):
+        return os.path.join(self.directory, f"{part}{self.suffix}")
+
+    def __contains__(self, part):
+        return os.path.exists(self._path(part))
+
+    def parts(self):
+        return sorted(name[:-len(self.suffix)] for name in os.listdir(self.directory)
+                      if name.endswith(self.suffix))
+
+    def append(self, part, frame, attrs=None, key=None):
+        """
+        Write `frame` as part `part`. `attrs` (e.g. the attrs of a results
+        frame: solve stats, sensitivities) are kept in the file metadata and
+        returned by read_part. `key` (e.g. the params_hash of the inputs and
+        settings the part was computed from) is kept there too and returned
+        by part_key, so that a resumed run can tell stale parts.
+        """
+        # Categoricals are stored as plain strings so that all parts share one schema
+        frame = frame.copy()
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].astype(str)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        if attrs:
+            metadata[b'attrs'] = json.dumps(_attrs_to_json(attrs)).encode()
+        if key is not None:
+            metadata[b'key'] = key.encode()
+        table = table.replace_schema_metadata(metadata)
+        path = self._path(part)
+        tmp = _tmp_path(path)
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+
+    def part_key(self, part):
+        # Key the part was appended with; None for a missing part or one without a key
+        if part not in self:
+            return None
+        with pa.memory_map(self._path(part)) as source:
+            key = (pa.ipc.open_file(source).schema.metadata or {}).get(b'key')
+        return key.decode() if key is not None else None
+
+    def part_table(self, part):
+        # Arrow table of one part, memory-mapped
+        return pa.ipc.open_file(pa.memory_map(self._path(part))).read_all()
+
+    def read_part(self, part):
+        # Frame and attrs of one part
+        table = self.part_table(part)
+        attrs = (table.schema.metadata or {}).get(b'attrs')
+        return (_categorical(table.to_pandas()),
+                _attrs_from_json(json.loads(attrs)) if attrs else {})
+
+    def dataset(self):
+        files = [self._path(part) for part in self.parts()]
+        return ds.dataset(files, format="ipc")
+
+    def read(self, columns=None, filter=None):
+        """
+        Long frame of all parts; `filter` is a pyarrow.dataset expression,
+        e.g. ds.field('metric') == 'CO2_Emissions'.
+        """
+        if not self.parts():
+            return pd.DataFrame(columns=columns)
+        return self.dataset().to_table(columns=columns, filter=filter).to_pandas()
+
+    def clear(self):
+        for part in self.parts():
+            os.remove(self._path(part))
+        path = os.path.join(self.directory, self.metadata_file)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _categorical(long_df):
+    # scenario/metric read back as strings become categoricals again, in
+    # first-seen order (the order results_to_long wrote them in)
+    for column in ('scenario', 'metric'):
+        if column in long_df and not isinstance(long_df[column].dtype, pd.CategoricalDtype):
+            long_df[column] = pd.Categorical(long_df[column],
+                                             categories=pd.unique(long_df[column]))
+    return long_df
+
+
+def _attrs_to_json(attrs):
+    # DataFrame values (e.g. sensitivities) are stored in 'split' orientation
+    return {key: {'frame': value.to_json(orient='split', index=False)}
+            if isinstance(value, pd.DataFrame) else value
+            for key, value in attrs.items()}
+
+
+def _attrs_from_json(attrs):
+    return {key: pd.read_json(io.StringIO(value['frame']), orient='split')
+            if isinstance(value, dict) and set(value) == {'frame'} else value
+            for key, value in attrs.items()}
+
+
+class LazyScenarioResults(Mapping):
+    """
+    Read-only {scenario: extract_results frame} view of a ResultDataset with
+    one part per scenario (as written by run_scenarios). Frames are read from
+    disk when accessed, with their attrs, and not kept in memory.
+    """
+
+    def __init__(self, dataset, scenarios=None):
+        self.dataset = dataset
+        self.scenarios = list(dataset.parts() if scenarios is None else scenarios)
+
+    def __getitem__(self, scenario):
+        if scenario not in self.scenarios:
+            raise KeyError(scenario)
+        long_df, attrs = self.dataset.read_part(scenario)
+        results_df = long_to_results(long_df)[scenario]
+        results_df.attrs.update(attrs)
+        return results_df
+
+    def __iter__(self):
+        return iter(self.scenarios)
+
+    def __len__(self):
+        return len(self.scenarios)
+
+
+def export_results_to_excel(scenario_results, directory='.', per_scenario=True,
+                            combined='maritime_results_all_scenarios.xlsx'):
+    """
+    Optional Excel export of the results (from a ResultStore or a
+    {scenario: frame} dict): one workbook per scenario and/or one workbook with
+    a sheet per scenario.
+    """
+    if isinstance(scenario_results, ResultStore):
+        scenario_results = scenario_results.scenario_results()
+    if per_scenario:
+        for scenario, df in scenario_results.items():
+            with profiler.stage("excel", scenario):
+                df.to_excel(os.path.join(directory, f'maritime_results_{scenario}.xlsx'), index=False)
+    if combined:
+        with profiler.stage("excel", "all"), pd.ExcelWriter(os.path.join(directory, combined)) as writer:
+            for scenario, df in scenario_results.items():
+                df.to_excel(writer, sheet_name=scenario, index=False)
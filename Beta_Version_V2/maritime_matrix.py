@@ -0,0 +1,699 @@
+# -*- coding: utf-8 -*-
+"""
+Matrix (array) form of the MaritimeGCH scenario model.
+
+Builds the same model as MaritimeScenarioAnalysis.createAndSolveModel, but
+turns the parameter dicts into NumPy coefficient arrays and one sparse
+constraint matrix instead of one pulp object per term:
+
+    min  c'x   s.t.   row_lower <= A x <= row_upper,   col_lower <= x <= col_upper
+
+Variables keep the pulp names (new_ship_{y}_{s}, stock_ship_{y}_{s},
+fuel_demand_{y}_{f}, co2_emissions_{y}, excess_emissions_{y}), so
+extract_results works on a solved MatrixModel unchanged.
+"""
+
+import copy
+import time
+from typing import Any, NamedTuple
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, LinearConstraint, Bounds
+from pulp import (LpStatusOptimal, LpStatusNotSolved, LpStatusInfeasible,
+                  LpStatusUnbounded, LpStatusUndefined)
+
+from maritime_io import SparseParameter
+from maritime_solvers import (SolveStats, highs_stats, milp_stats, relative_gap,
+                              reset_highs_scheduler)
+
+try:
+    import highspy  # optional, needed by PersistentMaritimeModel
+except ImportError:
+    highspy = None
+
+
+class ModelHandles(NamedTuple):
+    """
+    The decision variables of a built model, by family. For a pulp model these
+    are the dicts of LpVariables keyed like the constraints ((y, s), (y, f)
+    or y); for a MatrixModel they are the column index arrays of
+    MatrixModel.columns, shaped (years, ship types), (years, fuel types) or (years,).
+    """
+    new_ship: Any
+    stock_ship: Any
+    fuel_demand: Any
+    co2_emissions: Any
+    excess_emissions: Any
+
+
+class MatrixVariable:
+    # Minimal stand-in for pulp.LpVariable after a solve (name + varValue)
+    __slots__ = ("name", "varValue")
+
+    def __init__(self, name, value):
+        self.name = name
+        self.varValue = value
+
+    def value(self):
+        return self.varValue
+
+    def __repr__(self):
+        return self.name
+
+
+class MatrixObjective:
+    # Minimal stand-in for the pulp objective expression after a solve
+    def __init__(self, model):
+        self._model = model
+
+    def value(self):
+        return self._model.objective_value
+
+
+class MatrixModel:
+    """
+    Column/row bookkeeping plus the coefficient arrays of the model.
+
+    `columns[family]` and `rows[family]` hold the column/row indices of each
+    variable/constraint family, shaped like their index sets, e.g.
+    columns["stock_ship"][i, j] is the column of stock_ship[years[i], ship_types[j]].
+    """
+
+    def __init__(self, years, ship_types, fuel_types):
+        self.years = list(years)
+        self.ship_types = list(ship_types)
+        self.fuel_types = list(fuel_types)
+        self.columns = {}
+        self.rows = {}
+        self.names = []
+        self.c = None
+        self.A = None
+        self.row_lower = None
+        self.row_upper = None
+        self.col_lower = None
+        self.col_upper = None
+        self.integrality = None
+        self.x = None
+        self.status = LpStatusNotSolved
+        self.objective_value = None
+        self.objective = MatrixObjective(self)
+        self.solve_stats = None
+
+    @property
+    def num_cols(self):
+        return len(self.names)
+
+    @property
+    def num_rows(self):
+        return 0 if self.A is None else self.A.shape[0]
+
+    def handles(self):
+        return ModelHandles(*(self.columns[family] for family in ModelHandles._fields))
+
+    def variables(self):
+        # Same contract as LpProblem.variables(): objects with .name and .varValue
+        values = self.x if self.x is not None else [None] * self.num_cols
+        return [MatrixVariable(n, None if v is None else float(v))
+                for n, v in zip(self.names, values)]
+
+    def _add_columns(self, family, labels, shape):
+        start = len(self.names)
+        self.names.extend(labels)
+        idx = np.arange(start, start + len(labels)).reshape(shape)
+        self.columns[family] = idx
+        return idx
+
+
+def _lookup(d, keys, default=0):
+    return np.array([d.get(k, default) for k in keys], dtype=float)
+
+
+def fuel_cost_table(params, years, fuel_types):
+    # years x fuel types cost per unit of fuel demand (fuel_cost is keyed by
+    # (fuel, year)); the one lookup used by the objectives and the results
+    return np.array([[params["fuel_cost"].get((f, y), 0) for f in fuel_types] for y in years],
+                    dtype=float)
+
+
+def cii_bound_table(params, years, ship_types):
+    # years x ship types bound of the CII constraint, capacity x CII target
+    # (CII_desired is keyed by (ship type, year)); infinite in the years
+    # without a target, where the constraint does not bind
+    return np.array([[params["cap"].get(s, 1) * params["CII_desired"].get((s, y), np.inf)
+                      for s in ship_types] for y in years], dtype=float)
+
+
+def initial_fleet_retirement(init_fleet, fleet_age, lifetime, n_years):
+    """
+    Ships of the initial fleet retiring in each year position (n_years x ship
+    types). Only the average age is known, so the initial ships of a type are
+    spread evenly over the ages fleet_age - h .. fleet_age + h (h as large as
+    the lifetime allows) and each age cohort retires when it reaches the
+    lifetime. Cohorts are whole numbers of ships, so stocks stay integer.
+    """
+    retired = np.zeros((n_years, len(init_fleet)))
+    for j, (n, age, life) in enumerate(zip(init_fleet, fleet_age, lifetime)):
+        age, life = int(round(age)), int(round(life))
+        if n <= 0 or n_years < 2:
+            continue
+        h = max(0, min(age, life - 1 - age))
+        ages = np.arange(age - h, age + h + 1)
+        sizes = np.diff(np.round(np.linspace(0, n, len(ages) + 1)))
+        retire = np.clip(life - ages, 1, None)       # year positions, the first one is fixed
+        keep = retire < n_years
+        np.add.at(retired[:, j], retire[keep], sizes[keep])
+    return retired
+
+
+def retirement_schedule(params, years, ship_types):
+    """
+    Retirements in the stock update of year position t >= 1 and ship type j:
+
+        retired[t, j] = multiplicity * new_ship[build, j] + initial[t, j]
+
+    Returns (t, j, build, multiplicity) index arrays, with at most one
+    new_ship term per (t, j) so the constraints stay O(years x ship types)
+    whatever the lifetime, and the (years x ship types) array `initial` of
+    initial-fleet retirements.
+
+    params["retirement"] selects the formulation:
+    "legacy" (default) - the original formulation, which retires
+        min(t, lifetime - 1) times the ships built in year
+        t - lifetime + 1 - fleet_age and never retires the initial fleet.
+        It stays the default because it keeps the min(t, lifetime - 1)
+        multiplicity of the baseline model, and "cohort" is infeasible with
+        the shipped inputs: the tanker fleet (average age 14, lifetime 17)
+        cannot be replaced within the production capacity;
+    "cohort" - ships built in year b retire in year b + lifetime, and the
+        initial fleet is retired by age cohort from fleet_age (see
+        initial_fleet_retirement).
+    """
+    Y, S = len(years), len(ship_types)
+    lifetime = _lookup(params["lifetime"], ship_types, 1)
+    fleet_age = _lookup(params["fleet_age"], ship_types, 0)
+    t, j = np.meshgrid(np.arange(1, Y), np.arange(S), indexing="ij")
+    if params.get("retirement", "legacy") == "legacy":
+        build = np.maximum(0, t - lifetime[j] + 1 - fleet_age[j]).astype(int)
+        multiplicity = np.minimum(t, lifetime[j] - 1)
+        initial = np.zeros((Y, S))
+    else:
+        build = (t - np.round(lifetime[j])).astype(int)
+        multiplicity = np.ones(t.shape)
+        initial = initial_fleet_retirement(_lookup(params["init_capacity_fleet"], ship_types),
+                                           fleet_age, lifetime, Y)
+    keep = (build >= 0) & (multiplicity != 0)
+    return t[keep], j[keep], build[keep], multiplicity[keep], initial
+
+
+# Constraint families in row order
+row_families = ("fleet_capacity", "production", "stock_update", "fuel_demand", "emissions",
+                "ets_cap", "cii")
+
+
+def _costs(params, mm, family):
+    # Objective coefficients of one column family, shaped like mm.columns[family].
+    # Each family carries the multiplicity it has in the pulp objective, which
+    # sums over years x ship_types x fuel_types
+    S, F = len(mm.ship_types), len(mm.fuel_types)
+    if family == "new_ship":
+        c = F * _lookup(params["investment_cost"], mm.ship_types)[None, :]
+    elif family == "stock_ship":
+        c = F * _lookup(params["op_cost"], mm.ship_types)[None, :]
+    elif family == "fuel_demand":
+        c = S * fuel_cost_table(params, mm.years, mm.fuel_types)
+    elif family == "excess_emissions":
+        c = _lookup(params["ets_price"], mm.years)
+    else:
+        c = 0.0
+    return np.broadcast_to(c, mm.columns[family].shape).astype(float)
+
+
+def _row_block(params, mm, family):
+    """
+    Bounds and matrix entries of one constraint family: (lower, upper) shaped
+    like mm.rows[family], and (rows, cols, values) arrays of its entries
+    (duplicate positions are summed).
+    """
+    years, ship_types, fuel_types = mm.years, mm.ship_types, mm.fuel_types
+    new_ship, stock_ship, fuel_demand, co2_emissions, excess_emissions = mm.handles()
+    r = mm.rows[family]
+    terms = []
+
+    def add_terms(r, k, v):
+        terms.append(np.broadcast_arrays(r, k, v))
+
+    if family == "fleet_capacity":
+        # Fleet Capacity Constraint
+        lo = np.array([[params["demand_shipping"].get((y, s), 0) for s in ship_types] for y in years],
+                      dtype=float)
+        up = np.inf
+        add_terms(r, stock_ship, _lookup(params["cap"], ship_types)[None, :])
+    elif family == "production":
+        # Ship Production Constraint
+        lo = -np.inf
+        up = np.array([[params["prod_capacity"].get((y, s), 0) for s in ship_types] for y in years],
+                      dtype=float)
+        add_terms(r, new_ship, 1.0)
+    elif family == "stock_update":
+        # Fleet Stock Update Constraint:
+        # stock[t] - stock[t-1] - new[t] + retired new ships = -retired initial ships
+        t, j, build, multiplicity, initial = retirement_schedule(params, years, ship_types)
+        lo = up = -initial
+        lo[0] = _lookup(params["init_capacity_fleet"], ship_types)
+        add_terms(r, stock_ship, 1.0)
+        add_terms(r[1:], stock_ship[:-1], -1.0)
+        add_terms(r[1:], new_ship[1:], -1.0)
+        add_terms(r[t, j], new_ship[build, j], multiplicity)
+    elif family == "fuel_demand":
+        # Fuel Demand Constraint, from the nonzero fuel consumptions as
+        # (year, fuel, ship type) positions and values
+        year_pos = {y: i for i, y in enumerate(years)}
+        fuel_pos = {f: k for k, f in enumerate(fuel_types)}
+        ship_pos = {s: j for j, s in enumerate(ship_types)}
+        consumption = np.array([(year_pos[y], fuel_pos[f], ship_pos[s], v)
+                                for (s, f, y), v in SparseParameter.of(params["fuel_consumption"]).items()
+                                if y in year_pos and f in fuel_pos and s in ship_pos],
+                               dtype=float).reshape(-1, 4)
+        cons_year, cons_fuel, cons_ship = consumption[:, :3].T.astype(int)
+        lo = up = 0.0
+        add_terms(r, fuel_demand, 1.0)
+        add_terms(r[cons_year, cons_fuel], stock_ship[cons_year, cons_ship], -consumption[:, 3] * 1e-2)
+    elif family == "emissions":
+        # Emissions Constraint
+        lo = up = 0.0
+        add_terms(r, co2_emissions, 1.0)
+        add_terms(r[:, None], fuel_demand,
+                  -_lookup(params["emissions_factor"], fuel_types)[None, :] * 1e-3)
+    elif family == "ets_cap":
+        # ETS Emissions Cap Constraint, plus any excess emissions
+        lo = -np.inf
+        up = _lookup(params["co2_cap"], years)
+        add_terms(r, co2_emissions, 1.0)
+        add_terms(r, excess_emissions, -1.0)
+    elif family == "cii":
+        # Carbon Intensity Indicator Constraint
+        lo = -np.inf
+        up = cii_bound_table(params, years, ship_types)
+        add_terms(r, co2_emissions[:, None], 1.0)
+    else:
+        raise ValueError(f"Unknown constraint family {family!r}")
+    rows, cols, vals = (np.concatenate([term[i].ravel() for term in terms]) for i in range(3))
+    return (np.broadcast_to(lo, r.shape).astype(float), np.broadcast_to(up, r.shape).astype(float),
+            rows, cols, vals.astype(float))
+
+
+def build_matrix_model(params):
+    """
+    Build a MatrixModel from a getParameters() dict in one shot.
+    """
+    years = list(params["years"])
+    ship_types = list(params["ship_types"])
+    fuel_types = list(params["fuel_types"])
+    Y, S, F = len(years), len(ship_types), len(fuel_types)
+
+    mm = MatrixModel(years, ship_types, fuel_types)
+
+    # Decision Variables
+    new_ship = mm._add_columns(
+        "new_ship", [f"new_ship_{y}_{s}" for y in years for s in ship_types], (Y, S))
+    stock_ship = mm._add_columns(
+        "stock_ship", [f"stock_ship_{y}_{s}" for y in years for s in ship_types], (Y, S))
+    mm._add_columns(
+        "fuel_demand", [f"fuel_demand_{y}_{f}" for y in years for f in fuel_types], (Y, F))
+    mm._add_columns(
+        "co2_emissions", [f"co2_emissions_{y}" for y in years], (Y,))
+    mm._add_columns(
+        "excess_emissions", [f"excess_emissions_{y}" for y in years], (Y,))
+
+    n = mm.num_cols
+    mm.integrality = np.zeros(n, dtype=np.uint8)
+    mm.integrality[new_ship] = 1
+    mm.integrality[stock_ship] = 1
+    mm.col_lower = np.zeros(n)
+    mm.col_upper = np.full(n, np.inf)
+
+    # Objective Function
+    mm.c = np.zeros(n)
+    for family in ModelHandles._fields:
+        mm.c[mm.columns[family]] = _costs(params, mm, family)
+
+    ##### Constraints (one block of consecutive rows per family)
+    shapes = {"fleet_capacity": (Y, S), "production": (Y, S), "stock_update": (Y, S),
+              "fuel_demand": (Y, F), "emissions": (Y,), "ets_cap": (Y,), "cii": (Y, S)}
+    m = 0
+    for family in row_families:
+        count = int(np.prod(shapes[family]))
+        mm.rows[family] = np.arange(m, m + count).reshape(shapes[family])
+        m += count
+    blocks = [_row_block(params, mm, family) for family in row_families]
+    lower, upper, rows, cols, vals = (np.concatenate([b[i].ravel() for b in blocks]) for i in range(5))
+
+    A = sp.coo_matrix((vals, (rows, cols)), shape=(m, n)
+                      ).tocsr()  # duplicate (row, col) entries are summed, as pulp merges them
+    A.eliminate_zeros()
+    mm.A = A
+    mm.row_lower = lower
+    mm.row_upper = upper
+    return mm
+
+
+# scipy.optimize.milp status -> pulp status
+_MILP_STATUS = {
+    0: LpStatusOptimal,
+    1: LpStatusNotSolved,
+    2: LpStatusInfeasible,
+    3: LpStatusUnbounded,
+    4: LpStatusUndefined,
+}
+
+
+def solve_matrix_model(mm, msg=False, options=None):
+    """
+    Solve a MatrixModel by handing the sparse matrix directly to HiGHS
+    (through highspy, or scipy.optimize.milp when highspy is missing).
+    `options` are HiGHS options (see SolverConfig.highs_options); without
+    highspy only time_limit, mip_rel_gap and presolve are applied. Fills mm.x,
+    mm.status, mm.objective_value and mm.solve_stats.
+    """
+    options = dict(options or {})
+    options.setdefault("output_flag", bool(msg))
+    start = time.perf_counter()
+    if highspy is not None:
+        if "threads" in options:
+            reset_highs_scheduler()
+        h = highspy.Highs()
+        for name, value in options.items():
+            h.setOptionValue(name, value)
+        h.passModel(_highs_lp(mm))
+        h.run()
+        _read_highs_solution(mm, h, time.perf_counter() - start)
+        return mm
+    milp_options = {"disp": options["output_flag"]}
+    if "time_limit" in options:
+        milp_options["time_limit"] = options["time_limit"]
+    if "mip_rel_gap" in options:
+        milp_options["mip_rel_gap"] = options["mip_rel_gap"]
+    if options.get("presolve") == "off":
+        milp_options["presolve"] = False
+    res = milp(
+        c=mm.c,
+        constraints=LinearConstraint(mm.A, mm.row_lower, mm.row_upper),
+        integrality=mm.integrality,
+        bounds=Bounds(mm.col_lower, mm.col_upper),
+        options=milp_options,
+    )
+    mm.status = _MILP_STATUS.get(res.status, LpStatusUndefined)
+    mm.x = res.x
+    mm.objective_value = res.fun
+    mm.solve_stats = milp_stats(res, time.perf_counter() - start, mm.status)
+    return mm
+
+
+def round_fleet(mm, x):
+    """
+    Integer fleet from a fractional solution x of the LP relaxation.
+
+    Walks the stock update rows year by year: new ships are rounded down and,
+    where the resulting stock falls short of the fleet capacity row, raised
+    until it is met (rounding down first keeps the retirements of later years,
+    which are multiples of earlier purchases, as small as possible). Stocks then follow exactly from the
+    (integer) stock update, so stock update, fleet capacity and production
+    capacity all hold. Returns the rounded copy of x, or None when a
+    production capacity makes the repair impossible.
+    """
+    x = np.array(x, dtype=float)
+    A = mm.A
+    new_ship, stock_ship = mm.columns["new_ship"], mm.columns["stock_ship"]
+    tol = 1e-6
+    for i in range(len(mm.years)):
+        for j in range(len(mm.ship_types)):
+            nc, sc = new_ship[i, j], stock_ship[i, j]
+            # Production capacity: upper bound on new ships
+            r = mm.rows["production"][i, j]
+            prod = mm.row_upper[r] / A[r, nc] if A[r, nc] > 0 else np.inf
+            new = max(0.0, np.floor(x[nc] + tol))
+            if new > np.floor(prod + tol):
+                new = np.floor(prod + tol)
+            # Fleet capacity: lower bound on the stock
+            r = mm.rows["fleet_capacity"][i, j]
+            need = np.ceil(mm.row_lower[r] / A[r, sc] - tol) if A[r, sc] > 0 else 0.0
+            need = max(need, 0.0)
+            # Stock update: a_s * stock + a_n * new + (earlier, already integer terms) = rhs
+            r = mm.rows["stock_update"][i, j]
+            start, end = A.indptr[r], A.indptr[r + 1]
+            cols, vals = A.indices[start:end], A.data[start:end]
+            a_s = vals[cols == sc].sum()
+            a_n = vals[cols == nc].sum()
+            others = (cols != sc) & (cols != nc)
+            rest = mm.row_lower[r] - vals[others] @ x[cols[others]]
+            if a_n != 0:
+                stock = (rest - a_n * new) / a_s
+                if stock < need - tol:
+                    new += np.ceil((need - stock) * a_s / -a_n - tol)
+                    if new > np.floor(prod + tol):
+                        return None
+                stock = (rest - a_n * new) / a_s
+            else:
+                stock = rest / a_s
+            if stock < need - tol:
+                return None
+            x[nc], x[sc] = new, np.round(stock)
+    return x
+
+
+def solve_fast(mm, msg=False, options=None):
+    """
+    Fast alternative to solve_matrix_model for screening runs: solve the LP
+    relaxation, round the fleet with round_fleet, then re-solve the LP of the
+    remaining (continuous) variables with the fleet fixed. The relaxation
+    objective is a lower bound, so mm.solve_stats.gap is the gap of the
+    rounded solution against it. Falls back to the exact MIP when the rounded
+    fleet is infeasible (e.g. against the CII constraint).
+    """
+    start = time.perf_counter()
+    integrality, col_lower, col_upper = mm.integrality, mm.col_lower, mm.col_upper
+    try:
+        mm.integrality = np.zeros_like(integrality)
+        solve_matrix_model(mm, msg, options)
+        if mm.status != LpStatusOptimal:
+            return mm
+        bound = mm.objective_value
+        x = round_fleet(mm, mm.x)
+        if x is not None:
+            fixed = np.concatenate([mm.columns["new_ship"].ravel(), mm.columns["stock_ship"].ravel()])
+            mm.col_lower, mm.col_upper = col_lower.copy(), col_upper.copy()
+            mm.col_lower[fixed] = mm.col_upper[fixed] = x[fixed]
+            solve_matrix_model(mm, msg, options)
+    finally:
+        mm.integrality, mm.col_lower, mm.col_upper = integrality, col_lower, col_upper
+    if x is None or mm.status != LpStatusOptimal:
+        print("Fast mode: rounded fleet is infeasible, solving the MIP instead")
+        solve_matrix_model(mm, msg, options)
+        mm.solve_stats = mm.solve_stats._replace(runtime=time.perf_counter() - start)
+        return mm
+    mm.solve_stats = SolveStats(mm.solve_stats.backend, mm.solve_stats.status,
+                                time.perf_counter() - start, 0,
+                                relative_gap(mm.objective_value, bound), mm.objective_value, bound)
+    return mm
+
+
+# Parts of the model that each input feeds: objective coefficients of column
+# families and bounds/coefficients of row families. Inputs that are read but
+# not used by the model (minim_capacity_fleet, fuel_avail) map to nothing.
+input_families = {
+    "init_capacity_fleet": {"rows": ["stock_update"]},
+    "minim_capacity_fleet": {},
+    "fleet_age": {"rows": ["stock_update"]},
+    "demand_shipping": {"rows": ["fleet_capacity"]},
+    "investment_cost": {"cols": ["new_ship"]},
+    "op_cost": {"cols": ["stock_ship"]},
+    "emissions_factor": {"rows": ["emissions"]},
+    "prod_capacity": {"rows": ["production"]},
+    "lifetime": {"rows": ["stock_update"]},
+    "cap": {"rows": ["fleet_capacity", "cii"]},
+    "CII_desired": {"rows": ["cii"]},
+    "fuel_cost": {"cols": ["fuel_demand"]},
+    "ets_price": {"cols": ["excess_emissions"]},
+    "co2_cap": {"rows": ["ets_cap"]},
+    "fuel_avail": {},
+    "fuel_consumption": {"rows": ["fuel_demand"]},
+}
+
+
+def _affected(changed):
+    # Row and column families fed by the changed inputs (None = everything)
+    if changed is None or any(key not in input_families for key in changed):
+        return list(row_families), list(ModelHandles._fields)
+    rows = {f for key in changed for f in input_families[key].get("rows", [])}
+    cols = {f for key in changed for f in input_families[key].get("cols", [])}
+    return ([f for f in row_families if f in rows],
+            [f for f in ModelHandles._fields if f in cols])
+
+
+def _highs_lp(mm):
+    # MatrixModel -> highspy.HighsLp (column-wise matrix, infinities mapped to kHighsInf)
+    inf = highspy.kHighsInf
+    A = mm.A.tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = mm.num_cols
+    lp.num_row_ = mm.num_rows
+    lp.col_cost_ = mm.c
+    lp.col_lower_ = np.clip(mm.col_lower, -inf, inf)
+    lp.col_upper_ = np.clip(mm.col_upper, -inf, inf)
+    lp.row_lower_ = np.clip(mm.row_lower, -inf, inf)
+    lp.row_upper_ = np.clip(mm.row_upper, -inf, inf)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = A.indptr
+    lp.a_matrix_.index_ = A.indices
+    lp.a_matrix_.value_ = A.data
+    lp.integrality_ = [highspy.HighsVarType.kInteger if i else highspy.HighsVarType.kContinuous
+                       for i in mm.integrality]
+    return lp
+
+
+def _highs_status(h):
+    status = h.getModelStatus()
+    if status == highspy.HighsModelStatus.kOptimal:
+        return LpStatusOptimal
+    if status == highspy.HighsModelStatus.kInfeasible:
+        return LpStatusInfeasible
+    if status in (highspy.HighsModelStatus.kUnbounded,
+                  highspy.HighsModelStatus.kUnboundedOrInfeasible):
+        return LpStatusUnbounded
+    if status == highspy.HighsModelStatus.kNotset:
+        return LpStatusNotSolved
+    if status in (highspy.HighsModelStatus.kTimeLimit, highspy.HighsModelStatus.kInterrupt) \
+            and h.getInfo().primal_solution_status == 2:
+        # Stopped early with a feasible solution: reported as optimal, like
+        # pulp does for CBC; the gap is in the solve stats
+        return LpStatusOptimal
+    return LpStatusUndefined
+
+
+def _read_highs_solution(mm, h, runtime):
+    # Copy status, solution and solve stats of a finished highspy run into mm
+    mm.status = _highs_status(h)
+    if mm.status == LpStatusOptimal:
+        mm.x = np.array(h.getSolution().col_value)
+        mm.objective_value = h.getInfo().objective_function_value
+    else:
+        mm.x = None
+        mm.objective_value = None
+    mm.solve_stats = highs_stats(h, runtime, mm.status)
+
+
+class PersistentMaritimeModel:
+    """
+    Build the model once and re-parameterise it between solves.
+
+    Scenarios share the variables and constraints and differ only in
+    coefficients and right-hand sides. update(params) recomputes only the
+    column costs and row blocks fed by the changed inputs (see
+    input_families), compares them with the loaded ones and pushes the
+    differences into the HiGHS instance. Solves are not warm-started from the
+    previous solution: as a MIP start it made HiGHS several times slower than
+    a cold solve on these models.
+    """
+
+    def __init__(self, params, msg=False, options=None):
+        # options: HiGHS options (see SolverConfig.highs_options)
+        if highspy is None:
+            raise ImportError("PersistentMaritimeModel needs highspy (pip install highspy)")
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", bool(msg))
+        if "threads" in (options or {}):
+            reset_highs_scheduler()
+        for name, value in (options or {}).items():
+            self.highs.setOptionValue(name, value)
+        self.model = None
+        self.last_update = {}
+        self._load(build_matrix_model(params))
+
+    def _load(self, mm):
+        self.highs.clearModel()
+        self.highs.passModel(_highs_lp(mm))
+        self.model = mm
+        self.last_update = {"rebuilt": True}
+
+    def update(self, params, changed=None):
+        """
+        Patch the loaded model to `params`. `changed` optionally lists the
+        inputs that differ from the loaded parameters (see
+        MaritimeScenarioAnalysis.getParametersDelta); only the rows and columns
+        fed by those inputs are recomputed and patched. Falls back to a full
+        rebuild when the index sets (years, ship types, fuel types) differ.
+        Returns the number of changed entries per kind.
+        """
+        old = self.model
+        if (list(params["years"]), list(params["ship_types"]), list(params["fuel_types"])) \
+                != (old.years, old.ship_types, old.fuel_types):
+            self._load(build_matrix_model(params))
+            return self.last_update
+
+        inf = highspy.kHighsInf
+        h = self.highs
+        new = copy.copy(old)
+        new.c, new.row_lower, new.row_upper = old.c.copy(), old.row_lower.copy(), old.row_upper.copy()
+        new.x, new.status, new.objective_value, new.solve_stats = None, LpStatusNotSolved, None, None
+        new.objective = MatrixObjective(new)
+        row_scope, col_scope = _affected(changed)
+        counts = {"rebuilt": False, "costs": 0, "row_bounds": 0, "coefficients": 0}
+
+        for family in col_scope:
+            cols = old.columns[family].ravel()
+            cost = _costs(params, old, family).ravel()
+            diff = cost != old.c[cols]
+            if diff.any():
+                h.changeColsCost(int(diff.sum()), cols[diff], cost[diff])
+                new.c[cols] = cost
+                counts["costs"] += int(diff.sum())
+
+        blocks = []
+        for family in row_scope:
+            lower, upper, rows_a, cols_a, values = _row_block(params, old, family)
+            rows = old.rows[family].ravel()
+            diff = (lower.ravel() != old.row_lower[rows]) | (upper.ravel() != old.row_upper[rows])
+            if diff.any():
+                h.changeRowsBounds(int(diff.sum()), rows[diff], np.clip(lower.ravel()[diff], -inf, inf),
+                                   np.clip(upper.ravel()[diff], -inf, inf))
+                new.row_lower[rows], new.row_upper[rows] = lower.ravel(), upper.ravel()
+                counts["row_bounds"] += int(diff.sum())
+            # Matrix entries that changed, appeared or disappeared in the block
+            # (its rows are consecutive)
+            start, stop = rows[0], rows[-1] + 1
+            block = sp.coo_matrix((values, (rows_a - start, cols_a)), shape=(stop - start, old.num_cols)
+                                  ).tocsr()
+            block.eliminate_zeros()
+            delta = (block - old.A[start:stop]).tocoo()
+            nonzero = delta.data != 0
+            rows_d, cols_d = delta.row[nonzero], delta.col[nonzero]
+            values = np.asarray(block[rows_d, cols_d]).ravel()
+            for r, k, v in zip((start + rows_d).tolist(), cols_d.tolist(), values.tolist()):
+                h.changeCoeff(r, k, v)
+            counts["coefficients"] += len(values)
+            if len(values):
+                blocks.append((start, stop, block))
+        if blocks:
+            # Swap the changed blocks into the constraint matrix
+            parts, end = [], 0
+            for start, stop, block in sorted(blocks, key=lambda b: b[0]):
+                parts += [old.A[end:start], block]
+                end = stop
+            new.A = sp.vstack(parts + [old.A[end:]], format="csr")
+
+        self.model = new
+        self.last_update = counts
+        return self.last_update
+
+    def solve(self):
+        """
+        Solve the current parameterisation; returns the MatrixModel with the
+        solution filled in (usable with extract_results).
+        """
+        mm = self.model
+        h = self.highs
+        t0 = time.perf_counter()
+        h.run()
+        _read_highs_solution(mm, h, time.perf_counter() - t0)
+        return mm
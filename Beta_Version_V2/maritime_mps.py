@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+MPS export of the array form of the MaritimeGCH model.
+
+write_mps writes a MatrixModel as a free-format MPS file (gzip-compressed
+when the path ends in .gz) straight from its arrays: the entries of each
+section are selected and sorted with NumPy, and each distinct coefficient
+is formatted once (the model has few), so writing costs well under a
+microsecond per nonzero. Columns keep the variable names of the pulp
+builder (new_ship_2020_C) and rows are named {family}_{year}[_{index}] like
+the pulp constraints (see MaritimeScenarioAnalysis.build_pulp_model).
+
+solve_mps_cbc hands that same file to the CBC executable shipped with pulp
+and reads the solution back into the MatrixModel, which lets the matrix
+builder solve with CBC (SolverConfig(backend="cbc", model_file=...)).
+"""
+
+import os
+import gzip
+import time
+import shutil
+import tempfile
+import subprocess
+
+import numpy as np
+from pulp import (PULP_CBC_CMD, LpStatusOptimal, LpStatusNotSolved, LpSolutionIntegerFeasible,
+                  PulpSolverError)
+
+from maritime_sensitivity import _matrix_keys
+from maritime_solvers import cbc_stats
+
+# Right-hand sides and bounds at or beyond this are infinite for CBC and HiGHS
+_infinity = 1e30
+
+
+def row_names(mm):
+    # Name of every row of a MatrixModel, by constraint family
+    names = np.array([f"R{i}" for i in range(mm.num_rows)], dtype=object)
+    for family, idx in mm.rows.items():
+        keys = _matrix_keys(mm, family, idx)
+        names[idx.ravel()] = ["_".join(str(k) for k in (family, *(key if isinstance(key, tuple)
+                                                                   else (key,))))
+                              for key in keys]
+    return names
+
+
+def _row_types(mm):
+    # MPS row type, right-hand side and range of every row
+    lower, upper = mm.row_lower, mm.row_upper
+    types = np.where(lower == upper, "E", np.where(np.isinf(lower), "L", "G"))
+    rhs = np.where(types == "L", upper, lower)
+    ranged = np.isfinite(lower) & np.isfinite(upper) & (lower != upper)
+    free = np.isinf(lower) & np.isinf(upper)
+    # A free row is written as <= infinity: a second N row would read as an objective
+    rhs = np.where(free, _infinity, rhs)
+    return types, rhs, np.where(ranged, upper - lower, 0.0)
+
+
+def _bounds(mm):
+    # BOUNDS section (type, column index, value): only the bounds that differ
+    # from the default [0, inf), in column order
+    lower, upper = mm.col_lower, mm.col_upper
+    integer = mm.integrality.astype(bool)
+    fixed = lower == upper
+    free = np.isinf(lower) & np.isinf(upper)
+    parts = [
+        ("FX", fixed, lower),
+        ("FR", free, lower),
+        ("MI", ~fixed & ~free & np.isneginf(lower), lower),
+        ("LO", ~fixed & np.isfinite(lower) & (lower != 0), lower),
+        ("UP", ~fixed & np.isfinite(upper), upper),
+        # Some readers give integer columns without an upper bound an upper bound of 1
+        ("PL", ~fixed & ~free & integer & np.isposinf(upper), upper),
+    ]
+    kinds = np.concatenate([np.full(mask.sum(), kind, dtype=object) for kind, mask, _ in parts])
+    columns = np.concatenate([np.flatnonzero(mask) for _, mask, _ in parts])
+    values = np.concatenate([value[mask] for _, mask, value in parts])
+    order = np.argsort(columns, kind="stable")
+    return kinds[order], columns[order], np.where(np.isfinite(values), values, 0.0)[order]
+
+
+def _format(values):
+    # Shortest round-trip text of each value, formatting every distinct value once
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([repr(v) for v in unique.tolist()], dtype=object)[inverse.ravel()]
+
+
+def _write_lines(fh, *fields):
+    # One data line per entry: a leading blank, then the fields
+    line = " " + " ".join(["{}"] * len(fields)) + "\n"
+    fh.writelines(map(line.format, *(np.asarray(f, dtype=object).tolist() for f in fields)))
+
+
+def write_mps(mm, path, name="MaritimeGCH"):
+    """
+    Write a built MatrixModel to `path` as free-format MPS; a path ending in
+    .gz is gzip-compressed. Returns the path.
+    """
+    columns = np.asarray(mm.names, dtype=object)
+    rows = row_names(mm)
+    types, rhs, ranges = _row_types(mm)
+
+    # Objective entries first in each column; every column gets one, so that
+    # columns without constraint entries still exist in the file
+    A = mm.A.tocsc()
+    counts = np.diff(A.indptr)
+    col = np.concatenate([np.arange(mm.num_cols), np.repeat(np.arange(mm.num_cols), counts)])
+    row = np.concatenate([np.full(mm.num_cols, -1), A.indices])
+    value = np.concatenate([mm.c, A.data])
+    keep = (row >= 0) | (mm.c != 0)[col] | (counts == 0)[col]
+    col, row, value = col[keep], row[keep], value[keep]
+    order = np.lexsort((row, col))  # the objective row (-1) sorts first
+    col, row, value = col[order], row[order], value[order]
+    entry_columns = columns[col]
+    entry_rows = np.where(row >= 0, rows[np.maximum(row, 0)], "obj")
+    entry_values = _format(value)
+
+    # Runs of integer columns go between INTORG/INTEND markers
+    integer = mm.integrality.astype(bool)
+    change = np.flatnonzero(np.diff(integer.astype(np.int8))) + 1
+    starts = np.concatenate([[0], change]).astype(int)
+    ends = np.concatenate([change, [mm.num_cols]]).astype(int)
+    first = np.searchsorted(col, starts)
+    last = np.searchsorted(col, ends)
+
+    opener = gzip.open(path, "wt", compresslevel=1) if path.endswith(".gz") else open(path, "w")
+    with opener as fh:
+        fh.write(f"NAME {name}\nROWS\n N obj\n")
+        _write_lines(fh, types, rows)
+        fh.write("COLUMNS\n")
+        for k, (a, b) in enumerate(zip(first, last)):
+            if integer[starts[k]]:
+                fh.write(f" MARKER{k} 'MARKER' 'INTORG'\n")
+            _write_lines(fh, entry_columns[a:b], entry_rows[a:b], entry_values[a:b])
+            if integer[starts[k]]:
+                fh.write(f" MARKER{k} 'MARKER' 'INTEND'\n")
+        fh.write("RHS\n")
+        nonzero = rhs != 0
+        _write_lines(fh, np.full(nonzero.sum(), "RHS", dtype=object), rows[nonzero],
+                     _format(rhs[nonzero]))
+        ranged = ranges != 0
+        if ranged.any():
+            fh.write("RANGES\n")
+            _write_lines(fh, np.full(ranged.sum(), "RNG", dtype=object), rows[ranged],
+                         _format(ranges[ranged]))
+        kinds, bounded, values = _bounds(mm)
+        if len(kinds):
+            fh.write("BOUNDS\n")
+            _write_lines(fh, kinds, np.full(len(kinds), "BND", dtype=object), columns[bounded],
+                         _format(values))
+        fh.write("ENDATA\n")
+    return path
+
+
+def _read_cbc_solution(path, mm):
+    # Objective and column values of a CBC solution file written with
+    # -printingOptions all (rows first, then columns, in file order). The
+    # objective is taken from the header: the values are printed with 8
+    # significant digits only
+    with open(path) as fh:
+        lines = fh.read().splitlines()
+    objective = float(lines[0].rsplit("objective value", 1)[1])
+    fields = [line.split() for line in lines[1:] if line.strip()]
+    fields = [f[1:] if f[0] == "**" else f for f in fields]
+    return objective, np.array([float(f[2]) for f in fields[mm.num_rows:mm.num_rows + mm.num_cols]])
+
+
+def _run_cbc(cbc, model, solution, config, integer):
+    args = [cbc.path, model]
+    if config.time_limit is not None:
+        args += ["-sec", str(config.time_limit)]
+    if config.gap_rel is not None:
+        args += ["-ratio", str(config.gap_rel)]
+    if config.threads is not None:
+        args += ["-threads", str(config.threads)]
+    if not config.presolve:
+        args += ["-presolve", "off"]
+    args += ["-solve" if integer else "-initialSolve",
+             "-printingOptions", "all", "-solution", solution]
+    run = subprocess.run(args, capture_output=True, text=True, stdin=subprocess.DEVNULL)
+    ok = run.returncode == 0 and os.path.exists(solution) and os.path.getsize(solution) > 0
+    return ok, run.stdout + run.stderr
+
+
+def solve_mps_cbc(mm, config, path=None):
+    """
+    Solve a MatrixModel with CBC through an MPS file: written to `path` and
+    kept there, or to a temporary file. `config` is a resolved SolverConfig
+    (threads, gap_rel, time_limit, presolve and msg are passed to CBC). Fills
+    mm.x, mm.status, mm.objective_value and mm.solve_stats like
+    solve_matrix_model.
+    """
+    cbc = PULP_CBC_CMD()
+    if not cbc.available():
+        raise PulpSolverError(f"CBC executable not found: {cbc.path}")
+    temporary = []
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".mps")
+        os.close(fd)
+        temporary.append(path)
+    fd, solution = tempfile.mkstemp(suffix="-cbc.sol")
+    os.close(fd)
+    temporary.append(solution)
+    try:
+        write_mps(mm, path)
+        start = time.perf_counter()
+        ok, log = _run_cbc(cbc, path, solution, config, mm.integrality.any())
+        if not ok and path.endswith(".gz"):
+            # CBC built without zlib (like the one shipped with pulp) cannot
+            # read compressed files: solve from an uncompressed copy
+            fd, plain = tempfile.mkstemp(suffix=".mps")
+            os.close(fd)
+            temporary.append(plain)
+            with gzip.open(path, "rb") as src, open(plain, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            ok, log = _run_cbc(cbc, plain, solution, config, mm.integrality.any())
+        runtime = time.perf_counter() - start
+        if config.msg:
+            print(log, end="")
+        if not ok:
+            raise PulpSolverError(f"CBC failed on {path}:\n{log}")
+        status, solution_status = cbc.get_status(solution)
+        if status == LpStatusNotSolved and solution_status == LpSolutionIntegerFeasible:
+            # Stopped early with a feasible solution: optimal with a gap, as pulp reports it
+            status = LpStatusOptimal
+        mm.status = status
+        if status == LpStatusOptimal:
+            mm.objective_value, mm.x = _read_cbc_solution(solution, mm)
+        else:
+            mm.x = None
+            mm.objective_value = None
+        mm.solve_stats = cbc_stats(log, runtime, status)
+    finally:
+        for name in temporary:
+            os.remove(name)
+    return mm
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Per-scenario plots of the MaritimeGCH scenario analysis.
+
+Figures are drawn with the object-oriented Figure API (no pyplot state), so
+they can be rendered by worker processes with the Agg backend. Each figure
+is built once per process as a template (axes, titles, labels and grids);
+rendering a scenario only removes the previous data, draws the new data and
+saves the PNG. render_plots is the pipeline stage that renders the plots of
+many scenarios in parallel.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+
+from maritime_profiling import profiler
+
+plot_style = {'font.weight': 'bold', 'axes.labelweight': 'bold', 'axes.titleweight': 'bold'}
+combined_style = dict(plot_style, **{'font.size': 16})
+
+cost_components = ['Investment_Cost', 'Operational_Cost', 'Fuel_Cost', 'ets_penalty',
+                   'Total_Cost_Per_Year', 'Total_Cost']
+
+fuel_colors = {
+    'Oil': '#4A4A4A',
+    'RefPO': '#707070',
+    'LPG': '#989898',
+    'LNG': '#BAC4BA',
+    'H2': '#7FB069',
+    'NH3': '#5C8C4D',
+    'MeOH': '#2E5522',
+}
+
+# "scenario": the single plots of create_plots; "combined": create_combined_figure
+plot_kinds = ("scenario", "combined")
+
+
+class FigureTemplate:
+    """
+    A figure whose axes keep their decorations (titles, labels, grids)
+    between renders; clear() removes only the data artists and legends.
+    """
+
+    def __init__(self, nrows=1, ncols=1, figsize=(12, 6), style=plot_style, dpi=350, pad=1.08):
+        self.style = style
+        self.dpi = dpi
+        self.pad = pad
+        with matplotlib.rc_context(style):
+            self.figure = Figure(figsize=figsize)
+            self.axes = self.figure.subplots(nrows, ncols, squeeze=False)
+        # tight_layout starts from the current positions: reset them before
+        # each save so that a reused template lays out like a fresh figure
+        params = self.figure.subplotpars
+        self._subplotpars = {k: getattr(params, k)
+                             for k in ("left", "right", "bottom", "top", "wspace", "hspace")}
+
+    def decorate(self, ax, title, ylabel):
+        with matplotlib.rc_context(self.style):
+            ax.set_title(title, fontweight='bold')
+            ax.set_xlabel('Year', fontweight='bold')
+            ax.set_ylabel(ylabel, fontweight='bold')
+            ax.grid(True, linestyle='--', alpha=0.7)
+
+    def clear(self):
+        for ax in self.axes.flat:
+            for artist in [*ax.lines, *ax.collections, *ax.patches]:
+                artist.remove()
+            ax.containers.clear()
+            if ax.get_legend() is not None:
+                ax.get_legend().remove()
+            ax.set_prop_cycle(None)  # same colours for every scenario
+
+    def save(self, path):
+        with matplotlib.rc_context(self.style):
+            for ax in self.axes.flat:
+                ax.relim()
+                ax.autoscale_view()
+            self.figure.subplots_adjust(**self._subplotpars)
+            self.figure.tight_layout(pad=self.pad)
+            self.figure.savefig(path, dpi=self.dpi)
+        return path
+
+
+# Templates built so far in this process, by name
+_templates = {}
+
+
+def _template(name, build):
+    if name not in _templates:
+        _templates[name] = build()
+    template = _templates[name]
+    template.clear()
+    return template
+
+
+def _single(title, ylabel):
+    def build():
+        template = FigureTemplate()
+        template.decorate(template.axes[0, 0], title, ylabel)
+        return template
+    return build
+
+
+def _combined():
+    template = FigureTemplate(4, 2, figsize=(20, 20), style=combined_style, dpi=400, pad=4.0)
+    axes = template.axes
+    template.decorate(axes[0, 0], 'Stock Ships [number]', 'Number of Stock Ships')
+    template.decorate(axes[0, 1], 'New Ships [number]', 'Number of New Ships')
+    template.decorate(axes[1, 0], 'Investment Costs [million Euros]', 'Costs [million Euros]')
+    template.decorate(axes[1, 1], 'Operational Costs [million Euros]', 'Costs [million Euros]')
+    template.decorate(axes[2, 0], 'Fuel Demand [tonnes]', 'Fuel Demand')
+    template.decorate(axes[2, 1], 'Fuel Costs [million Euros]', 'Costs [million Euros]')
+    template.decorate(axes[3, 0], 'CO2 Emissions and Cap [million tonnes]', 'CO2 Emissions')
+    template.decorate(axes[3, 1], 'ETS Penalty [million Euros]', 'Penalty Costs [million Euros]')
+    return template
+
+
+def _stacked_bars(ax, years, df, prefix, labels, colors=None, legend_loc='best'):
+    bottom = np.zeros(len(years))
+    for label in labels:
+        values = np.asarray(df[f'{prefix}{label}'], dtype=float)
+        ax.bar(years, values, bottom=bottom, label=label,
+               color=colors.get(label) if colors else None)
+        bottom += values
+    ax.legend(loc=legend_loc)
+
+
+def _co2_with_cap(ax, years, df, params):
+    co2 = np.asarray(df['CO2_Emissions'], dtype=float)
+    cap = np.array([params['co2_cap'].get(y, 0) for y in years], dtype=float)
+    ax.plot(years, co2, label='Total CO2 Emissions', color='blue')
+    ax.plot(years, cap, label='CO2 Cap', color='red', linestyle='--')
+    ax.fill_between(years, cap, co2, where=co2 > cap, color='red', alpha=0.3,
+                    label='Excess Emissions')
+    ax.legend()
+
+
+@profiler.timed("create_plots")
+def create_plots(df, params, scenario, directory='.'):
+    """
+    One PNG per cost component, plus CO2 emissions against the cap, fuel
+    demand, new ships and stock ships. Returns the paths written.
+    """
+    years = np.array(df['Year'])
+    paths = []
+
+    for component in cost_components:
+        template = _template(component, _single(f'{component} over Years', 'Costs [million Euros]'))
+        template.axes[0, 0].plot(years, np.asarray(df[component], dtype=float), marker='o')
+        name = f'{component.lower().replace(" ", "_")}_over_years_{scenario}.png'
+        paths.append(template.save(os.path.join(directory, name)))
+
+    template = _template('co2', _single('CO2 Emissions and Cap [million tonnes]', 'CO2 Emissions'))
+    _co2_with_cap(template.axes[0, 0], years, df, params)
+    paths.append(template.save(os.path.join(directory, f"co2_emissions_over_years_{scenario}.png")))
+
+    template = _template('fuel_demand', _single('Fuel Demand [tonnes]', 'Fuel Demand'))
+    _stacked_bars(template.axes[0, 0], years, df, 'Fuel_Demand_', params['fuel_types'])
+    paths.append(template.save(os.path.join(directory, f"fuel_demand_{scenario}.png")))
+
+    template = _template('new_ships', _single('New Ships [number]', 'Number of New Ships'))
+    _stacked_bars(template.axes[0, 0], years, df, 'New_Ships_', params['ship_types'])
+    paths.append(template.save(os.path.join(directory, f"new_ships_{scenario}.png")))
+
+    template = _template('stock_ships', _single('Stock Ships [number]', 'Number of Stock Ships'))
+    _stacked_bars(template.axes[0, 0], years, df, 'Stock_Ships_', params['ship_types'])
+    paths.append(template.save(os.path.join(directory, f"stock_ships_{scenario}.png")))
+    return paths
+
+
+@profiler.timed("create_combined_figure")
+def create_combined_figure(df, params, scenario, directory='.'):
+    # 4x2 overview of the scenario from 2025 on; returns the path written
+    df = df[df['Year'] >= 2025].reset_index(drop=True)
+    years = np.array(df['Year'])
+    template = _template('combined', _combined)
+    axes = template.axes
+
+    _stacked_bars(axes[0, 0], years, df, 'Stock_Ships_', params['ship_types'], legend_loc='upper left')
+    _stacked_bars(axes[0, 1], years, df, 'New_Ships_', params['ship_types'])
+    axes[1, 0].plot(years, np.asarray(df['Investment_Cost'], dtype=float), marker='o')
+    axes[1, 1].plot(years, np.asarray(df['Operational_Cost'], dtype=float), marker='o')
+    _stacked_bars(axes[2, 0], years, df, 'Fuel_Demand_', params['fuel_types'], colors=fuel_colors)
+    axes[2, 1].plot(years, np.asarray(df['Fuel_Cost'], dtype=float), marker='o')
+    _co2_with_cap(axes[3, 0], years, df, params)
+    axes[3, 1].plot(years, np.asarray(df['ets_penalty'], dtype=float), marker='o')
+    return template.save(os.path.join(directory, f"combined_figure_{scenario}.png"))
+
+
+def plot_scenario(df, params, scenario, directory='.', kinds=plot_kinds):
+    # All plots of one scenario; returns the paths written
+    paths = []
+    with profiler.scenario(scenario):
+        if "scenario" in kinds:
+            paths += create_plots(df, params, scenario, directory)
+        if "combined" in kinds:
+            paths.append(create_combined_figure(df, params, scenario, directory))
+    return paths
+
+
+def _plot_job(*job):
+    # Worker for render_plots: the paths of plot_scenario and the stage records
+    paths = plot_scenario(*job)
+    return paths, profiler.drain()
+
+
+def _init_worker():
+    matplotlib.use("Agg")
+
+
+def _plot_params(params):
+    # The parts of a getParameters() dict the plots use (keeps worker payloads small)
+    return {key: params[key] for key in ('ship_types', 'fuel_types', 'co2_cap')}
+
+
+def _collect(future):
+    paths, records = future.result()
+    profiler.extend(records)
+    return paths
+
+
+def render_plots(scenario_results, scenario_params, scenarios=None, workers=None, directory='.',
+                 kinds=plot_kinds):
+    """
+    Plot stage of the scenario analysis: render the plots of `scenarios`
+    (default: all of scenario_results) into `directory`, in `workers`
+    processes (None = one per CPU, 1 = in this process). Returns the paths
+    written.
+    """
+    unknown = set(kinds) - set(plot_kinds)
+    if unknown:
+        raise ValueError(f"Unknown plot kinds {sorted(unknown)} (expected some of {plot_kinds})")
+    directory = os.path.abspath(directory)
+    scenarios = list(scenario_results) if scenarios is None else list(scenarios)
+    if not scenarios:
+        return []
+    # Jobs are made as they are submitted, so that results read lazily from
+    # disk (LazyScenarioResults) are only loaded a few at a time
+    jobs = ((scenario_results[s], _plot_params(scenario_params[s]), s, directory, tuple(kinds))
+            for s in scenarios)
+    paths = {}
+    if workers == 1 or len(scenarios) == 1:
+        for job in jobs:
+            paths[job[2]] = plot_scenario(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            limit = 2 * (workers or os.cpu_count() or 1)
+            pending = {}
+            for job in jobs:
+                if len(pending) >= limit:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        paths[pending.pop(future)] = _collect(future)
+                pending[pool.submit(_plot_job, *job)] = job[2]
+            for future in pending:
+                paths[pending[future]] = _collect(future)
+    paths = [path for s in scenarios for path in paths[s]]
+    print(f"{len(paths)} plots of {len(scenarios)} scenarios saved in {directory}")
+    return paths
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Stage timings of the MaritimeGCH scenario pipeline.
+
+Every stage of every scenario (getParameters, build, solve, duals,
+extract_results, create_plots, create_combined_figure, excel) is recorded by
+the process-wide `profiler` as a StageRecord with its wall time, CPU time and
+peak resident memory. Worker processes hand their records back with their
+results (see run_scenarios and render_plots), so the main process ends up
+with the records of the whole run:
+
+    profiler.summary()           # one row per stage
+    profiler.write("profile")    # profile.json and profile.csv
+
+cProfile is opt-in and covers one stage at a time:
+
+    profiler.profile("solve", directory="profiles")
+
+writes a profile_solve_<scenario>_<pid>.prof (and a .txt with the top
+functions by cumulative time) for every run of the stage, also in worker
+processes started afterwards.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import pstats
+import contextlib
+import functools
+import threading
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+try:
+    import resource  # not on Windows
+except ImportError:
+    resource = None
+
+try:
+    import psutil  # optional, peak memory on Windows
+except ImportError:
+    psutil = None
+
+# cProfile settings, in the environment so that worker processes inherit them
+_profile_stage_env = "MARITIME_PROFILE_STAGE"
+_profile_dir_env = "MARITIME_PROFILE_DIR"
+
+
+class StageRecord(NamedTuple):
+    """
+    stage, scenario: what ran (scenario None outside a scenario)
+    pid: process that ran it
+    start: wall clock (time.time()) at the start of the stage
+    wall, cpu: wall time and CPU time of this process in seconds (the CPU time
+        of a CBC subprocess is not included)
+    peak_rss_mb: peak resident memory of the process in MB, during the stage
+        where the OS allows resetting the peak (Linux), otherwise since the
+        process started; None when it cannot be read. Not reliable for stages
+        that ran while other threads of the process were running stages
+    """
+    stage: str
+    scenario: Optional[str]
+    pid: int
+    start: float
+    wall: float
+    cpu: float
+    peak_rss_mb: Optional[float]
+
+
+def _reset_peak_rss():
+    # Linux only: writing 5 to clear_refs resets the VmHWM high-water mark
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as fh:
+            return int(re.search(r"VmHWM:\s+(\d+)", fh.read()).group(1)) / 1024
+    except (OSError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return None
+
+
+class StageProfiler:
+    """
+    Records a StageRecord per stage run (see module docstring). Stages may
+    nest; the peak memory is only reset by the outermost one. The current
+    scenario, the nesting depth and paused() are per thread, so analyses run
+    in threads record their own stages under their own scenario. Their wall
+    and CPU times include the other threads' work, though (time.process_time
+    is per process), and the peak memory is that of the whole process, reset
+    by whichever thread starts a stage: with concurrent threads, peak_rss_mb
+    is not the peak of one stage.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        return getattr(self._local, "enabled", True)
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self._local.enabled = enabled
+
+    @property
+    def _scenario(self):
+        return getattr(self._local, "scenario", None)
+
+    @_scenario.setter
+    def _scenario(self, name):
+        self._local.scenario = name
+
+    @property
+    def _depth(self):
+        return getattr(self._local, "depth", 0)
+
+    @_depth.setter
+    def _depth(self, depth):
+        self._local.depth = depth
+
+    @contextlib.contextmanager
+    def scenario(self, name):
+        # Stages run inside this block are recorded for scenario `name`
+        previous, self._scenario = self._scenario, name
+        try:
+            yield
+        finally:
+            self._scenario = previous
+
+    @contextlib.contextmanager
+    def paused(self):
+        # Nothing is recorded inside this block, in this thread (e.g. thousands
+        # of Monte Carlo solves)
+        previous, self.enabled = self.enabled, False
+        try:
+            yield
+        finally:
+            self.enabled = previous
+
+    @contextlib.contextmanager
+    def stage(self, name, scenario=None):
+        if not self.enabled:
+            yield
+            return
+        scenario = self._scenario if scenario is None else scenario
+        if self._depth == 0:
+            _reset_peak_rss()
+        profile = cProfile.Profile() if os.environ.get(_profile_stage_env) == name else None
+        self._depth += 1
+        start, wall, cpu = time.time(), time.perf_counter(), time.process_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._depth -= 1
+            self.records.append(StageRecord(name, scenario, os.getpid(), start, wall, cpu,
+                                            _peak_rss_mb()))
+            if profile is not None:
+                self._dump(profile, name, scenario)
+
+    def timed(self, name):
+        # Decorator form of stage(name)
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def profile(self, stage, directory="."):
+        """
+        Run cProfile around every later run of `stage` (None switches it off),
+        in this process and in worker processes started afterwards.
+        """
+        if stage is None:
+            os.environ.pop(_profile_stage_env, None)
+            os.environ.pop(_profile_dir_env, None)
+            return
+        os.makedirs(directory, exist_ok=True)
+        os.environ[_profile_stage_env] = stage
+        os.environ[_profile_dir_env] = os.path.abspath(directory)
+
+    def _dump(self, profile, stage, scenario):
+        directory = os.environ.get(_profile_dir_env, ".")
+        path = os.path.join(directory, f"profile_{stage}_{scenario}_{os.getpid()}")
+        profile.dump_stats(path + ".prof")
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(30)
+        with open(path + ".txt", "w") as fh:
+            fh.write(text.getvalue())
+
+    def drain(self):
+        """
+        Remove and return the records made by this process (workers send them
+        back this way). Records inherited from a forked parent, or received
+        from other processes, stay where they are.
+        """
+        pid = os.getpid()
+        records = [r for r in self.records if r.pid == pid]
+        self.records = [r for r in self.records if r.pid != pid]
+        return records
+
+    def extend(self, records):
+        self.records.extend(StageRecord(*r) for r in records)
+
+    def clear(self):
+        self.records = []
+
+    def frame(self):
+        return pd.DataFrame(self.records, columns=StageRecord._fields)
+
+    def summary(self):
+        """
+        One row per stage (in the order they first ran): runs, total, mean and
+        max wall time, total CPU time and the largest peak memory.
+        """
+        df = self.frame()
+        if df.empty:
+            return pd.DataFrame(columns=["stage", "runs", "wall_total", "wall_mean", "wall_max",
+                                         "cpu_total", "peak_rss_mb"])
+        summary = df.groupby("stage", sort=False).agg(
+            runs=("wall", "size"), wall_total=("wall", "sum"), wall_mean=("wall", "mean"),
+            wall_max=("wall", "max"), cpu_total=("cpu", "sum"), peak_rss_mb=("peak_rss_mb", "max"))
+        return summary.reset_index()
+
+    def write(self, prefix):
+        """
+        Write the records to `prefix`.csv and the records plus the summary to
+        `prefix`.json. Returns both paths.
+        """
+        df = self.frame()
+        df.to_csv(prefix + ".csv", index=False)
+        report = {key: frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+                  for key, frame in (("records", df), ("summary", self.summary()))}
+        with open(prefix + ".json", "w") as fh:
+            json.dump(report, fh, indent=1, default=float)
+        return prefix + ".csv", prefix + ".json"
+
+
+profiler = StageProfiler()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling-horizon solve of the MaritimeGCH scenario model.
+
+Long horizons are solved as a sequence of overlapping windows (e.g. 10 years
+with a 5-year overlap). Each window is the part of the full MatrixModel whose
+rows and columns fall in its years; the decisions of the years before the
+window are already fixed, and their terms (the previous stock_ship and the
+new_ship purchases that later retire, i.e. the fleet age) move to the
+right-hand sides. After a window is solved the years up to the start of the
+next window are committed, the overlap is re-optimised by the next window.
+"""
+
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+from pulp import LpStatus, LpStatusOptimal
+
+from maritime_matrix import MatrixModel, solve_matrix_model, solve_fast
+from maritime_solvers import SolveStats, relative_gap
+
+
+def year_positions(index_arrays, size):
+    # Year position of every row/column, from the family index arrays (years first)
+    years = np.zeros(size, dtype=int)
+    for idx in index_arrays.values():
+        years[idx] = np.arange(idx.shape[0]).reshape((-1,) + (1,) * (idx.ndim - 1))
+    return years
+
+
+def windows(n_years, window, overlap=0):
+    """
+    (start, end, commit) year positions of the rolling windows: each window
+    covers [start, end) and commits [start, commit); the last one commits
+    everything up to the end of the horizon.
+    """
+    if window <= overlap:
+        raise ValueError("The window must be longer than the overlap")
+    step = window - overlap
+    out = []
+    start = 0
+    while True:
+        end = min(start + window, n_years)
+        if end == n_years:
+            out.append((start, end, end))
+            return out
+        out.append((start, end, start + step))
+        start += step
+
+
+def window_model(mm, start, end, x, row_years=None, col_years=None):
+    """
+    The part of `mm` in the years [start, end), with the columns of earlier
+    years fixed at their values in `x` (moved to the right-hand sides).
+    """
+    if row_years is None:
+        row_years = year_positions(mm.rows, mm.num_rows)
+    if col_years is None:
+        col_years = year_positions(mm.columns, mm.num_cols)
+    rows = np.flatnonzero((row_years >= start) & (row_years < end))
+    cols = np.flatnonzero((col_years >= start) & (col_years < end))
+    fixed = np.flatnonzero(col_years < start)
+
+    sub = MatrixModel(mm.years[start:end], mm.ship_types, mm.fuel_types)
+    sub.names = [mm.names[k] for k in cols]
+    col_map = np.full(mm.num_cols, -1)
+    col_map[cols] = np.arange(len(cols))
+    row_map = np.full(mm.num_rows, -1)
+    row_map[rows] = np.arange(len(rows))
+    sub.columns = {f: col_map[idx[start:end]] for f, idx in mm.columns.items()}
+    sub.rows = {f: row_map[idx[start:end]] for f, idx in mm.rows.items()}
+
+    A = mm.A[rows]
+    shift = A[:, fixed] @ x[fixed] if len(fixed) else np.zeros(len(rows))
+    sub.A = A[:, cols].tocsr()
+    sub.row_lower = mm.row_lower[rows] - shift
+    sub.row_upper = mm.row_upper[rows] - shift
+    sub.c = mm.c[cols]
+    sub.col_lower = mm.col_lower[cols]
+    sub.col_upper = mm.col_upper[cols]
+    sub.integrality = mm.integrality[cols]
+    return sub, cols
+
+
+def solve_rolling(mm, window=10, overlap=5, msg=False, options=None, fast=False, compare=False):
+    """
+    Solve `mm` window by window (see module docstring) and fill in mm.x,
+    mm.status, mm.objective_value (the cost of the assembled plan over the
+    whole horizon) and mm.solve_stats. With compare=True the monolithic model
+    is solved as well; its objective is reported as the bound and the gap is
+    the relative extra cost of the rolling-horizon plan. mm.rolling_windows
+    lists the status, runtime and objective of each window.
+    """
+    start_time = time.perf_counter()
+    solve = solve_fast if fast else solve_matrix_model
+    row_years = year_positions(mm.rows, mm.num_rows)
+    col_years = year_positions(mm.columns, mm.num_cols)
+    x = np.zeros(mm.num_cols)
+    log = []
+    nodes = 0
+    mm.status = LpStatusOptimal
+    for start, end, commit in windows(len(mm.years), window, overlap):
+        sub, cols = window_model(mm, start, end, x, row_years, col_years)
+        solve(sub, msg, options)
+        log.append({"start": mm.years[start], "end": mm.years[end - 1],
+                    "commit_until": mm.years[commit - 1], "status": LpStatus[sub.status],
+                    "runtime": sub.solve_stats.runtime, "objective": sub.objective_value})
+        if sub.status != LpStatusOptimal:
+            print(f"Rolling horizon: window {mm.years[start]}-{mm.years[end - 1]} "
+                  f"is {LpStatus[sub.status]}")
+            mm.status = sub.status
+            break
+        nodes += sub.solve_stats.nodes or 0
+        keep = col_years[cols] < commit
+        x[cols[keep]] = sub.x[keep]
+    mm.rolling_windows = pd.DataFrame(log)
+
+    if mm.status == LpStatusOptimal:
+        mm.x = x
+        mm.objective_value = float(mm.c @ x)
+    else:
+        mm.x = None
+        mm.objective_value = None
+
+    bound = None
+    if compare:
+        monolithic = copy.copy(mm)
+        solve(monolithic, msg, options)
+        if monolithic.status == LpStatusOptimal:
+            bound = monolithic.objective_value
+            print(f"Rolling horizon: {mm.objective_value} vs monolithic {bound}")
+    gap = relative_gap(mm.objective_value, bound) if mm.objective_value is not None else None
+    mm.solve_stats = SolveStats("highs", LpStatus[mm.status], time.perf_counter() - start_time,
+                                nodes, gap, mm.objective_value, bound)
+    return mm
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Marginal analysis of the MaritimeGCH scenario model.
+
+A MIP has no duals, but the LP left after fixing the integer variables (the
+fleet) at their optimal values has: its constraint duals are the marginal
+cost of each right-hand side with the fleet plan held fixed, e.g. the dual of
+ets_cap[2035] is the change in total cost per extra tonne of CO2 allowed in
+2035. Reduced costs give the same for the variable bounds.
+
+Both are returned as one long frame with the columns
+
+    kind ("dual" or "reduced_cost"), family, year, index, value
+
+where family is a constraint family (fleet_capacity, production,
+stock_update, fuel_demand, emissions, ets_cap, cii) or a variable family
+(new_ship, stock_ship, fuel_demand, co2_emissions, excess_emissions), and
+index is the ship type or fuel type (None for yearly families). The sign
+convention is d(total cost) / d(right-hand side), as reported by both CBC
+and HiGHS for a minimisation.
+
+sweep() covers larger changes of one input: it re-solves one persistent
+model over a range of scalings of the input and flags the points where the
+optimal fleet changes.
+"""
+
+import copy
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from pulp import LpStatus, LpStatusOptimal
+
+from maritime_matrix import PersistentMaritimeModel, _highs_lp, highspy
+from maritime_solvers import solve_pulp
+
+constraint_families = ("fleet_capacity", "production", "stock_update", "fuel_demand",
+                       "emissions", "ets_cap", "cii")
+
+# Families indexed by fuel type; the other two-dimensional ones are by ship type
+_fuel_families = ("fuel_demand",)
+
+sensitivity_columns = ["kind", "family", "year", "index", "value"]
+
+
+def _family_frame(kind, family, keys, values):
+    # keys are y or (y, index) tuples, as in the pulp dicts
+    keys = list(keys)
+    if keys and isinstance(keys[0], tuple):
+        years, index = zip(*keys)
+    else:
+        years, index = keys, [None] * len(keys)
+    return pd.DataFrame({"kind": kind, "family": family, "year": list(years),
+                         "index": list(index), "value": np.asarray(values, dtype=float)})
+
+
+def _sensitivity_frame(frames):
+    if not frames:
+        return pd.DataFrame(columns=sensitivity_columns)
+    out = pd.concat(frames, ignore_index=True)
+    out["year"] = out["year"].astype("int32")
+    return out
+
+
+def _matrix_keys(mm, family, idx):
+    # (year, index) keys of a row/column index array of a MatrixModel
+    if idx.ndim == 1:
+        return mm.years
+    labels = mm.fuel_types if family in _fuel_families else mm.ship_types
+    return [(y, label) for y in mm.years for label in labels]
+
+
+def matrix_sensitivities(mm, options=None):
+    """
+    Duals and reduced costs of a solved MatrixModel at its integer solution
+    (see module docstring). Needs highspy. Returns None when mm has no
+    optimal solution.
+    """
+    if highspy is None:
+        raise ImportError("Dual values of the matrix model need highspy (pip install highspy)")
+    if mm.status != LpStatusOptimal or mm.x is None:
+        return None
+    fixed = copy.copy(mm)
+    integer = mm.integrality.astype(bool)
+    fixed.col_lower = mm.col_lower.copy()
+    fixed.col_upper = mm.col_upper.copy()
+    fixed.col_lower[integer] = fixed.col_upper[integer] = np.round(mm.x[integer])
+    fixed.integrality = np.zeros_like(mm.integrality)
+    options = {k: v for k, v in (options or {}).items() if k != "mip_rel_gap"}
+
+    h = highspy.Highs()
+    options.setdefault("output_flag", False)
+    for name, value in options.items():
+        h.setOptionValue(name, value)
+    h.passModel(_highs_lp(fixed))
+    h.run()
+    if h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+        return None
+    solution = h.getSolution()
+    row_dual = np.asarray(solution.row_dual)
+    col_dual = np.asarray(solution.col_dual)
+    frames = [_family_frame("dual", f, _matrix_keys(mm, f, mm.rows[f]), row_dual[mm.rows[f].ravel()])
+              for f in constraint_families if f in mm.rows]
+    frames += [_family_frame("reduced_cost", f, _matrix_keys(mm, f, idx), col_dual[idx.ravel()])
+               for f, idx in mm.columns.items()]
+    return _sensitivity_frame(frames)
+
+
+def pulp_sensitivities(model, handles, constraints, config):
+    """
+    Duals and reduced costs of a solved pulp model at its integer solution
+    (see module docstring). `handles` are the ModelHandles of the variables
+    and `constraints` the {family: {key: LpConstraint}} dict of the
+    constraints; `config` the resolved SolverConfig the model was solved
+    with. The integer variables are fixed, the LP is solved with the same
+    backend, and the model is put back as it was (status, bounds, solve
+    stats). Returns None when the model has no optimal solution.
+    """
+    if LpStatus[model.status] != "Optimal":
+        return None
+    integer = [v for v in model.variables() if v.cat == "Integer"]
+    saved = [(v.cat, v.lowBound, v.upBound) for v in integer]
+    status, stats = model.status, model.solve_stats
+    try:
+        for v in integer:
+            value = round(v.varValue)
+            v.cat, v.lowBound, v.upBound = "Continuous", value, value
+        solve_pulp(model, config._replace(msg=False, gap_rel=None))
+        fixed_status = model.status
+    finally:
+        for v, (cat, low, up) in zip(integer, saved):
+            v.cat, v.lowBound, v.upBound = cat, low, up
+        model.status, model.solve_stats = status, stats
+    if LpStatus[fixed_status] != "Optimal":
+        return None
+    frames = [_family_frame("dual", f, constraints[f], [c.pi for c in constraints[f].values()])
+              for f in constraint_families if f in constraints]
+    frames += [_family_frame("reduced_cost", f, variables, [v.dj for v in variables.values()])
+               for f, variables in handles._asdict().items()]
+    return _sensitivity_frame(frames)
+
+
+def sensitivity_table(scenario_results):
+    """
+    Duals and reduced costs of every scenario in one long frame (scenario
+    first), from the 'sensitivities' attribute that
+    MaritimeScenarioAnalysis.solveAndExtract puts on each results frame when
+    SolverConfig(duals=True).
+    """
+    frames = []
+    for scenario, df in scenario_results.items():
+        sensitivities = df.attrs.get("sensitivities")
+        if sensitivities is not None:
+            frames.append(sensitivities.assign(scenario=scenario))
+    if not frames:
+        return pd.DataFrame(columns=["scenario", *sensitivity_columns])
+    return pd.concat(frames, ignore_index=True)[["scenario", *sensitivity_columns]]
+
+
+class SweepResult(NamedTuple):
+    """
+    points: one row per swept value with its status, objective, runtime,
+        branch-and-bound nodes, total CO2 and whether the fleet mix changed
+        from the previous point (breakpoint)
+    results: the yearly results of every point in long format (value, year,
+        metric, result)
+    """
+    points: pd.DataFrame
+    results: pd.DataFrame
+
+
+def scale_parameter(params, param, factor):
+    # Copy of params with every entry of params[param] multiplied by factor
+    scaled = dict(params)
+    scaled[param] = {k: v * factor for k, v in params[param].items()}
+    return scaled
+
+
+def sweep(analysis, param, values, scenario="base", params=None, tol=0.5):
+    """
+    Solve `scenario` (or the given `params`) with params[param] scaled by each
+    of `values`, e.g. sweep(analysis, "ets_price", np.linspace(0, 3, 13)).
+    One PersistentMaritimeModel is built for the first value; every later
+    point only patches the coefficients fed by `param` (see
+    PersistentMaritimeModel.update). Always solves with HiGHS, using the
+    analysis' HiGHS options. A breakpoint is a point whose fleet (stock_ship
+    of every year and ship type) differs from the previous point by more than
+    `tol` ships somewhere. Returns a SweepResult.
+    """
+    if params is None:
+        params = analysis.getParameters(scenario)
+    if param not in params or not isinstance(params[param], dict):
+        raise ValueError(f"Cannot sweep {param!r}: not a parameter dict of {scenario!r}")
+    model = None
+    points, frames = [], []
+    previous_fleet = None
+    for value in values:
+        point_params = scale_parameter(params, param, value)
+        start = time.perf_counter()
+        if model is None:
+            model = PersistentMaritimeModel(point_params, analysis.solver.msg,
+                                            analysis.solver.highs_options())
+        else:
+            model.update(point_params, [param])
+        mm = model.solve()
+        runtime = time.perf_counter() - start
+        optimal = mm.status == LpStatusOptimal
+        fleet = np.round(mm.x[mm.columns["stock_ship"]]) if optimal else None
+        breakpoint = (fleet is not None and previous_fleet is not None
+                      and bool(np.abs(fleet - previous_fleet).max() > tol))
+        points.append({"value": value, "status": LpStatus[mm.status],
+                       "objective": mm.objective_value, "runtime": runtime,
+                       "nodes": mm.solve_stats.nodes,
+                       "co2": float(mm.x[mm.columns["co2_emissions"]].sum()) if optimal else None,
+                       "breakpoint": breakpoint})
+        if optimal:
+            previous_fleet = fleet
+            long_df = analysis.extract_results(mm, point_params).melt(
+                id_vars="Year", var_name="metric", value_name="result")
+            long_df.insert(0, "value", value)
+            frames.append(long_df.rename(columns={"Year": "year"}))
+    results = (pd.concat(frames, ignore_index=True) if frames
+               else pd.DataFrame(columns=["value", "year", "metric", "result"]))
+    points = pd.DataFrame(points)
+    points.insert(0, "param", param)
+    return SweepResult(points, results)
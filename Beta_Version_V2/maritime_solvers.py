@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Solver configuration for the MaritimeGCH scenario model.
+
+SolverConfig chooses the backend (CBC or HiGHS, both open source and run
+locally) and its options; SolveStats records how a solve went (status,
+runtime, branch-and-bound nodes and the final relative gap). Every solve made
+by MaritimeScenarioAnalysis leaves its SolveStats on the solved model as
+`model.solve_stats`.
+"""
+
+import os
+import re
+import time
+import tempfile
+import warnings
+from typing import NamedTuple, Optional
+
+import pandas as pd
+from pulp import PULP_CBC_CMD, HiGHS, LpStatus
+
+backends = ("cbc", "highs")
+modes = ("exact", "fast")
+
+
+class SolverConfig(NamedTuple):
+    """
+    backend: "cbc" or "highs"; None picks the builder's default (CBC for the
+        pulp builder, HiGHS for the matrix builders, which pass arrays to
+        HiGHS). The matrix builder also solves with CBC, through an MPS file
+        (see maritime_mps)
+    threads: solver threads (None = solver default)
+    gap_rel: relative MIP gap at which the solver stops (None = solver default)
+    time_limit: seconds before the solver stops with its best solution
+    presolve: False switches presolve off
+    msg: solver log on stdout (None = builder default: shown when pulp solves,
+        hidden when the array form is passed to HiGHS)
+    mode: "exact" solves the MIP; "fast" solves the LP relaxation and rounds
+        the fleet (see maritime_matrix.solve_fast), on the array form of the
+        model and with HiGHS, whatever the builder
+    window, overlap: solve in rolling windows of `window` years overlapping by
+        `overlap` years (see maritime_rolling); None solves the whole horizon
+        at once. Like fast mode, this uses the array form and HiGHS
+    compare: with a window, also solve the whole horizon at once and report
+        the rolling-horizon gap against it
+    decomposition: "lagrangian" solves one subproblem per ship type and
+        prices the emissions coupling (see maritime_decomposition), in
+        `subproblem_workers` processes (None = one per ship type). Uses the
+        array form and HiGHS; not combined with rolling windows
+    duals: after the solve, fix the integer variables and solve the remaining
+        LP for the constraint duals and reduced costs (see
+        maritime_sensitivity), left on the solved model as model.sensitivities
+    model_file: matrix builder only: write the model to this MPS file (.mps,
+        or .mps.gz compressed) before each solve; CBC solves from that same file
+    """
+    backend: Optional[str] = None
+    threads: Optional[int] = None
+    gap_rel: Optional[float] = None
+    time_limit: Optional[float] = None
+    presolve: bool = True
+    msg: Optional[bool] = None
+    mode: str = "exact"
+    window: Optional[int] = None
+    overlap: int = 0
+    compare: bool = False
+    decomposition: Optional[str] = None
+    subproblem_workers: Optional[int] = None
+    duals: bool = False
+    model_file: Optional[str] = None
+
+    def resolve(self, builder):
+        # Fill in the builder defaults and check the backend name
+        if self.mode not in modes:
+            raise ValueError(f"Unknown solve mode {self.mode!r} (expected one of {modes})")
+        if self.decomposition not in (None, "lagrangian"):
+            raise ValueError(f"Unknown decomposition {self.decomposition!r} (expected 'lagrangian')")
+        if self.decomposition and self.window is not None:
+            raise ValueError("Rolling windows and decomposition cannot be combined")
+        matrix = (builder != "pulp" or self.mode == "fast" or self.window is not None
+                  or self.decomposition is not None)
+        backend = self.backend or ("highs" if matrix else "cbc")
+        if backend not in backends:
+            raise ValueError(f"Unknown solver backend {backend!r} (expected one of {backends})")
+        if matrix and backend != "highs" and not (builder == "matrix" and self.mode == "exact"
+                                                  and self.window is None
+                                                  and self.decomposition is None):
+            raise ValueError(f"The {builder} builder in {self.mode} mode"
+                             f"{' with rolling windows' if self.window else ''}"
+                             f"{' with decomposition' if self.decomposition else ''} "
+                             f"solves with HiGHS, not {backend}")
+        msg = (not matrix) if self.msg is None else self.msg
+        return self._replace(backend=backend, msg=msg)
+
+    def settings(self):
+        # The options that can change a solved result (for the result cache key)
+        return {k: v for k, v in self._asdict().items()
+                if k not in ("msg", "compare", "subproblem_workers", "model_file")}
+
+    def highs_options(self):
+        # Option dict for highspy.Highs.setOptionValue
+        options = {"output_flag": bool(self.msg)}
+        if self.threads is not None:
+            options["threads"] = int(self.threads)
+        if self.gap_rel is not None:
+            options["mip_rel_gap"] = float(self.gap_rel)
+        if self.time_limit is not None:
+            options["time_limit"] = float(self.time_limit)
+        if not self.presolve:
+            options["presolve"] = "off"
+        return options
+
+
+class SolveStats(NamedTuple):
+    backend: str
+    status: str
+    runtime: float
+    nodes: Optional[int]
+    gap: Optional[float]
+    objective: Optional[float]
+    bound: Optional[float]
+
+
+def reset_highs_scheduler():
+    """
+    HiGHS keeps one thread pool per process, sized by the first solve; a
+    later `threads` option different from that size makes the solve fail.
+    Dropping the pool lets the next solve create one of the requested size.
+    """
+    try:
+        import highspy
+    except ImportError:
+        return
+    highspy.Highs.resetGlobalScheduler(True)
+
+
+def relative_gap(objective, bound):
+    # |objective - bound| / |objective|, the definition used by CBC and HiGHS
+    if objective is None or bound is None:
+        return None
+    return abs(objective - bound) / max(abs(objective), 1e-10)
+
+
+def solve_pulp(model, config):
+    """
+    Solve a pulp LpProblem with a resolved SolverConfig. Returns the
+    SolveStats, which are also stored as model.solve_stats.
+    """
+    if config.threads is not None:
+        reset_highs_scheduler()
+    if config.backend == "highs":
+        options = {k: v for k, v in config.highs_options().items()
+                   if k not in ("output_flag", "threads", "mip_rel_gap", "time_limit")}
+        solver = HiGHS(msg=config.msg, threads=config.threads, gapRel=config.gap_rel,
+                       timeLimit=config.time_limit, **options)
+        start = time.perf_counter()
+        model.solve(solver)
+        stats = highs_stats(model.solverModel, time.perf_counter() - start, model.status)
+    else:
+        # CBC writes its summary (nodes, bound, gap) only to its log
+        fd, log_path = tempfile.mkstemp(suffix="-cbc.log")
+        os.close(fd)
+        try:
+            solver = PULP_CBC_CMD(msg=config.msg, threads=config.threads, gapRel=config.gap_rel,
+                                  timeLimit=config.time_limit,
+                                  presolve=None if config.presolve else False,
+                                  logPath=log_path)
+            with warnings.catch_warnings():
+                # pulp warns that the log replaces msg; it is echoed below
+                warnings.simplefilter("ignore", UserWarning)
+                model.solve(solver)
+            with open(log_path) as fh:
+                log = fh.read()
+        finally:
+            os.remove(log_path)
+        if config.msg:
+            print(log, end="")
+        stats = cbc_stats(log, model.solutionTime, model.status)
+    model.solve_stats = stats
+    return stats
+
+
+def _last_float(pattern, text):
+    found = re.findall(pattern, text)
+    return float(found[-1]) if found else None
+
+
+def cbc_stats(log, runtime, status):
+    objective = _last_float(r"Objective value:\s*(\S+)", log)
+    bound = _last_float(r"Lower bound:\s*(\S+)", log)
+    if bound is None:
+        bound = _last_float(r"best possible (\S+)", log)
+    if bound is None and "Result - Optimal solution found" in log:
+        bound = objective
+    nodes = _last_float(r"Enumerated nodes:\s*(\d+)", log)
+    return SolveStats("cbc", LpStatus[status], float(runtime),
+                      None if nodes is None else int(nodes),
+                      relative_gap(objective, bound), objective, bound)
+
+
+def highs_stats(h, runtime, status):
+    # Stats of a highspy.Highs instance after run(); status is a pulp status code
+    info = h.getInfo()
+    objective = bound = None
+    if info.primal_solution_status:
+        objective = info.objective_function_value
+    if info.mip_node_count >= 0:
+        nodes = int(info.mip_node_count)
+        bound = info.mip_dual_bound
+        gap = info.mip_gap if objective is not None else None
+    else:
+        # Pure LP: the optimal objective is its own bound
+        nodes = 0
+        bound = objective if LpStatus[status] == "Optimal" else None
+        gap = relative_gap(objective, bound)
+    return SolveStats("highs", LpStatus[status], float(runtime), nodes, gap, objective, bound)
+
+
+def milp_stats(res, runtime, status):
+    # Stats of a scipy.optimize.milp result (HiGHS without highspy)
+    return SolveStats("highs", LpStatus[status], float(runtime),
+                      getattr(res, "mip_node_count", None), getattr(res, "mip_gap", None),
+                      res.fun, getattr(res, "mip_dual_bound", None))
+
+
+def solve_stats_table(scenario_results):
+    """
+    One row of SolveStats per scenario, from the 'solve_stats' attribute that
+    MaritimeScenarioAnalysis.solveAndExtract puts on each results frame.
+    """
+    rows = []
+    for scenario, df in scenario_results.items():
+        stats = df.attrs.get("solve_stats")
+        if stats is not None:
+            rows.append({"scenario": scenario, **stats})
+    return pd.DataFrame(rows, columns=["scenario", *SolveStats._fields])
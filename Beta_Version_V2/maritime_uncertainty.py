@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo uncertainty analysis of the MaritimeGCH scenario model.
+
+Each uncertain input (a "factor") is described by the low, base and high
+files that already exist as scenario variants, e.g. fuel_cost_low /
+fuel_cost_base / fuel_cost_high. A sample draws one weight w in [-1, 1] per
+factor from a triangular distribution with mode 0 and sets every entry of
+the input to
+
+    base + w * (high - base)   for w >= 0,      base - w * (low - base)   for w < 0
+
+so w = -1, 0, 1 reproduce the low, base and high files. The weights come from
+a Latin hypercube, Sobol or plain random design, made correlated through a
+Gaussian copula. Samples are solved in chunks by worker processes (each
+keeps a persistent model and only patches the sampled inputs), and every
+chunk is streamed to a ResultDataset as soon as it is solved, so an
+interrupted run resumes where it stopped.
+
+Run with (inputs and outputs next to this script, whatever the current
+directory):
+
+    python maritime_uncertainty.py 1000
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import warnings
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, qmc
+from pulp import LpStatus
+
+from maritime_io import ResultDataset, results_to_long, csv_cache, data_source, params_hash
+from maritime_profiling import profiler
+from maritimeGHC_scenarios import MaritimeScenarioAnalysis, input_columns, scenario_inputs
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:
+    ds = None
+
+# (low, base, high) files of each uncertain input
+default_factors = {
+    'fuel_cost': ("fuel_cost_low.csv", "fuel_cost_base.csv", "fuel_cost_high.csv"),
+    'ets_price': ("ets_price_no.csv", "ets_price_mod.csv", "ets_price_strict.csv"),
+    'demand_shipping': ("demand_shippingSSP1.csv", "demand_shippingSSP2.csv",
+                        "demand_shippingSSP5.csv"),
+}
+
+
+def correlation_matrix(factors, correlation=None):
+    """
+    Correlation matrix of the factor weights (in the order of `factors`) from
+    a {(factor, factor): rho} dict; pairs that are not listed are independent.
+    """
+    names = list(factors)
+    R = np.eye(len(names))
+    for (a, b), rho in (correlation or {}).items():
+        i, j = names.index(a), names.index(b)
+        R[i, j] = R[j, i] = rho
+    np.linalg.cholesky(R)  # raises LinAlgError when R is not positive definite
+    return R
+
+
+def sample_weights(n, factors=default_factors, method="lhs", correlation=None, seed=None):
+    """
+    n x len(factors) DataFrame of factor weights in [-1, 1] (see module
+    docstring). method is "lhs" (Latin hypercube), "sobol" or "random";
+    correlation is a {(factor, factor): rho} dict applied through a
+    Gaussian copula.
+    """
+    d = len(factors)
+    rng = np.random.default_rng(seed)
+    if method == "lhs":
+        u = qmc.LatinHypercube(d=d, seed=rng).random(n)
+    elif method == "sobol":
+        with warnings.catch_warnings():
+            # Balance properties need n = 2**m; other sizes are still usable
+            warnings.simplefilter("ignore", UserWarning)
+            u = qmc.Sobol(d=d, seed=rng).random(n)
+    elif method == "random":
+        u = rng.random((n, d))
+    else:
+        raise ValueError(f"Unknown sampling method {method!r} (expected 'lhs', 'sobol' or 'random')")
+    if correlation:
+        L = np.linalg.cholesky(correlation_matrix(factors, correlation))
+        eps = 1e-12
+        u = norm.cdf(norm.ppf(np.clip(u, eps, 1 - eps)) @ L.T)
+    # Inverse CDF of the triangular distribution on [-1, 1] with mode 0
+    w = np.where(u < 0.5, -1 + np.sqrt(2 * u), 1 - np.sqrt(2 * (1 - u)))
+    weights = pd.DataFrame(w, columns=list(factors))
+    weights.index.name = "sample"
+    return weights
+
+
+def _factor_arrays(analysis, factors):
+    # Aligned keys and low/base/high value arrays of each factor
+    arrays = {}
+    for key, files in factors.items():
+        index, column = input_columns[key]
+        dicts = [csv_cache.to_dict(f, index, column, analysis.source) for f in files]
+        keys = list(dicts[1]) + [k for d in (dicts[0], dicts[2]) for k in d if k not in dicts[1]]
+        low, base, high = (np.array([d.get(k, dicts[1].get(k, 0)) for k in keys], dtype=float)
+                           for d in dicts)
+        arrays[key] = (keys, low, base, high)
+    return arrays
+
+
+def sample_parameters(base_params, factor_arrays, weights):
+    # Parameters of one sample: the base parameters with the factors moved by `weights`
+    params = dict(base_params)
+    for key, w in weights.items():
+        keys, low, base, high = factor_arrays[key]
+        values = base + (w * (high - base) if w >= 0 else -w * (low - base))
+        params[key] = dict(zip(keys, values.tolist()))
+    return params
+
+
+# Analysis, base parameters and factor arrays of each Monte Carlo setup in
+# each worker process
+_worker_state = {}
+
+
+def _solve_samples(setup, part, samples):
+    """
+    Worker for run_monte_carlo: solve the samples of one chunk and append
+    the results of the optimal ones to the dataset as part `part` (samples
+    without an optimal solution have no results to report). Returns one
+    summary row per sample.
+    """
+    (source, base_scenario, factors, builder, solver, years, retirement, directory) = setup
+    factors = dict(factors)
+    if setup not in _worker_state:
+        analysis = MaritimeScenarioAnalysis(source, builder=builder, solver=solver, years=years,
+                                            retirement=retirement)
+        _worker_state[setup] = {
+            "analysis": analysis,
+            "params": analysis.getParameters(base_scenario, {base_scenario: scenario_inputs(
+                base_scenario)}),
+            "factors": _factor_arrays(analysis, factors),
+        }
+    state = _worker_state[setup]
+    analysis = state["analysis"]
+    changed = list(factors)
+    results, summary = {}, []
+    # Not recorded by the stage profiler: thousands of solves
+    with contextlib.redirect_stdout(io.StringIO()), profiler.paused():
+        for sample, weights in samples:
+            start = time.perf_counter()
+            params = sample_parameters(state["params"], state["factors"], weights)
+            model, handles = analysis.createAndSolveModel(params, changed, return_handles=True)
+            if LpStatus[model.status] == "Optimal":
+                results[sample] = analysis.extract_results(model, params, handles)
+            stats = model.solve_stats
+            summary.append({"sample": sample, "status": stats.status,
+                            "objective": stats.objective, "gap": stats.gap,
+                            "runtime": time.perf_counter() - start})
+    if results:
+        long_df = results_to_long(results).rename(columns={"scenario": "sample"})
+        long_df["sample"] = long_df["sample"].astype("int64")
+    else:
+        # The part is still written, so that a resumed run skips the chunk
+        long_df = pd.DataFrame({"sample": pd.Series(dtype="int64"), "year": pd.Series(dtype="int32"),
+                                "metric": pd.Series(dtype=str), "value": pd.Series(dtype="float64")})
+    ResultDataset(directory).append(part, long_df)
+    return summary
+
+
+def _run_metadata(source, n, base_scenario, factors, method, correlation, seed, chunk_size,
+                  builder, solver, years, retirement):
+    # Everything that decides the samples and their results, as stored in the
+    # dataset metadata (JSON types, so that it compares equal once read back)
+    analysis = MaritimeScenarioAnalysis(source, builder=builder, solver=solver, years=years,
+                                        retirement=retirement)
+    with contextlib.redirect_stdout(io.StringIO()), profiler.paused():
+        params = analysis.getParameters(base_scenario, {base_scenario: scenario_inputs(
+            base_scenario)})
+        inputs = params_hash({"params": params, "factors": _factor_arrays(analysis, factors)},
+                             analysis.solver_settings())
+    metadata = {
+        "n": n, "seed": seed, "method": method, "chunk_size": chunk_size,
+        "base_scenario": base_scenario,
+        "factors": [[key, list(files)] for key, files in factors.items()],  # in column order
+        "correlation": sorted([*pair, float(rho)] for pair, rho in (correlation or {}).items()),
+        "inputs": inputs,
+    }
+    return json.loads(json.dumps(metadata))
+
+
+def run_monte_carlo(n, directory="monte_carlo", source=os.path.dirname(os.path.abspath(__file__)),
+                    base_scenario="base", factors=default_factors, method="lhs", correlation=None,
+                    seed=0, workers=None, chunk_size=100, builder="persistent", solver=None,
+                    years=None, retirement="legacy", resume=True):
+    """
+    Draw n samples (see sample_weights) around `base_scenario` and solve them
+    in `workers` processes (None = one per CPU, 1 = in this process), in
+    chunks of chunk_size samples. Inputs are read from `source` (a directory,
+    zip archive, dict or DataSource, see MaritimeScenarioAnalysis; by default
+    the files next to this script). Results are streamed in long format
+    (sample, year, metric, value) to a ResultDataset in `directory` (relative
+    to the directory of the source), next to samples.csv with the factor
+    weights and summary.csv with the status, objective and runtime of each
+    sample. Only the optimal samples have results in the dataset. The
+    settings of the run (n, seed, method, correlation, factors, chunk size
+    and a hash of the inputs and solver settings) are kept in the dataset
+    metadata. With resume=True the chunks already in the dataset (from an
+    interrupted run) are skipped; a dataset made with other settings is an
+    error. resume=False clears the dataset first.
+    Returns the weights, the summary and the dataset.
+    """
+    source = data_source(source)
+    directory = os.path.join(source.directory, directory)
+    dataset = ResultDataset(directory)
+    summary_path = os.path.join(directory, "summary.csv")
+    metadata = _run_metadata(source, n, base_scenario, factors, method, correlation, seed,
+                             chunk_size, builder, solver, years, retirement)
+    if not resume:
+        dataset.clear()
+        if os.path.exists(summary_path):
+            os.remove(summary_path)
+    elif dataset.parts() and dataset.read_metadata() != metadata:
+        raise ValueError(f"{directory} holds samples of a run with other settings or inputs; "
+                         f"use another directory, or resume=False to replace them")
+    dataset.write_metadata(metadata)
+    weights = sample_weights(n, factors, method, correlation, seed)
+    weights.to_csv(os.path.join(directory, "samples.csv"))
+
+    setup = (source, base_scenario, tuple(factors.items()), builder, solver, years,
+             retirement, directory)
+    chunks = []
+    for first in range(0, n, chunk_size):
+        part = f"samples-{first:07d}"
+        if part in dataset:
+            continue
+        rows = weights.iloc[first:first + chunk_size]
+        chunks.append((part, [(int(i), row.to_dict()) for i, row in rows.iterrows()]))
+
+    summary = [pd.read_csv(summary_path)] if os.path.exists(summary_path) else []
+    start = time.perf_counter()
+    done = dropped = 0
+
+    def collect(rows):
+        nonlocal done, dropped
+        summary.append(pd.DataFrame(rows))
+        done += len(rows)
+        dropped += sum(row["status"] != "Optimal" for row in rows)
+        print(f"{done} of {sum(len(c[1]) for c in chunks)} samples solved "
+              f"({time.perf_counter() - start:.1f} s)"
+              + (f", {dropped} without an optimal solution left out" if dropped else ""))
+        # Rewritten after every chunk so that it survives an interruption
+        pd.concat(summary, ignore_index=True).to_csv(summary_path, index=False)
+
+    if workers == 1:
+        for part, samples in chunks:
+            collect(_solve_samples(setup, part, samples))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_solve_samples, setup, part, samples)
+                       for part, samples in chunks]
+            for future in as_completed(futures):
+                collect(future.result())
+
+    summary = (pd.concat(summary, ignore_index=True).drop_duplicates("sample", keep="last")
+               .sort_values("sample").reset_index(drop=True)) if summary else pd.DataFrame()
+    return weights, summary, dataset
+
+
+def percentile_bands(dataset, metrics=None, percentiles=(5, 25, 50, 75, 95)):
+    """
+    Percentiles over the samples of each metric and year. By default: total
+    cost per year, CO2 emissions, excess emissions and the fleet mix
+    (Stock_Ships_* of every ship type). Only the requested metrics are read.
+    The dataset only holds optimal samples (see _solve_samples), so the
+    bands are over those; summary.csv tells how many were left out.
+    """
+    if metrics is None:
+        names = dataset.dataset().to_table(columns=["metric"]).column("metric").unique()
+        metrics = ["Total_Cost", "Total_Cost_Per_Year", "CO2_Emissions", "excess_emissions"]
+        metrics += sorted(m for m in names.to_pylist() if m.startswith("Stock_Ships_"))
+    df = dataset.read(columns=["metric", "year", "value"], filter=ds.field("metric").isin(metrics))
+    bands = (df.groupby(["metric", "year"])["value"]
+             .quantile([p / 100 for p in percentiles]).unstack())
+    bands.columns = [f"p{p:g}" for p in percentiles]
+    return bands.reset_index()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    weights, summary, dataset = run_monte_carlo(n)
+    bands = percentile_bands(dataset)
+    bands.to_csv(os.path.join(dataset.directory, "percentile_bands.csv"), index=False)
+    print(summary["status"].value_counts().to_string())
+    print(bands[bands["metric"] == "Total_Cost"].head(1).to_string(index=False))
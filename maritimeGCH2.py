@@ -6,67 +6,131 @@ Created on July 2024
 """
 
 import os
+import time
+import zipfile
+import tempfile
+import subprocess
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus
+from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus, LpAffineExpression, PULP_CBC_CMD, HiGHS
 
-# Set the working directory
+# Input data: a directory or a zip archive of the CSV files (e.g. 'input example data.zip').
+# Files are read from there by read_input, and results, plots and the model file are
+# written to output_directory (next to a zip archive); the current directory is never changed
 working_directory = 'D:/MaritimeGCH/mymodel4'
-os.chdir(working_directory)
+output_directory = (os.path.dirname(working_directory) if working_directory.endswith('.zip')
+                    else working_directory)
+
+# Solver: CBC (default) or HiGHS, e.g. HiGHS(threads=4, gapRel=0.001, timeLimit=600);
+# threads, gapRel, timeLimit and presolve are left at the solver defaults when None
+solver = PULP_CBC_CMD(threads=None, gapRel=None, timeLimit=None, presolve=None)
+
+
+def read_input(name, source=None, **kwargs):
+    # pd.read_csv of input file `name` from `source` (default: working_directory),
+    # a directory or a zip archive holding the file in any of its folders
+    source = working_directory if source is None else source
+    if os.path.isfile(source) and zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            members = [m for m in archive.namelist() if m.rsplit("/", 1)[-1] == name]
+            if not members:
+                raise FileNotFoundError(f"{name} not found in {source}")
+            with archive.open(members[0]) as fh:
+                return pd.read_csv(fh, **kwargs)
+    return pd.read_csv(os.path.join(source, name), **kwargs)
+
+
+def solve_model_file(model, path=None):
+    # Write the model once as MPS to `path` (default: maritimeLP.mps in output_directory),
+    # with the variable and constraint names of the model, and let CBC solve that same
+    # file (other solvers solve the model through pulp); independent of the current
+    # directory. Returns the path of the model file.
+    path = os.path.join(output_directory, "maritimeLP.mps") if path is None else path
+    variables = model.writeMPS(path)
+    if not isinstance(solver, PULP_CBC_CMD):
+        model.solve(solver)
+        return path
+    fd, solution = tempfile.mkstemp(suffix="-cbc.sol")
+    os.close(fd)
+    try:
+        args = [solver.path, path]
+        if solver.timeLimit is not None:
+            args += ["-sec", str(solver.timeLimit)]
+        if solver.optionsDict.get("presolve") is not None:
+            args += ["-presolve", "on" if solver.optionsDict["presolve"] else "off"]
+        for option in solver.options + solver.getOptions():
+            args += ("-" + option).split()
+        args += ["-solve", "-printingOptions", "all", "-solution", solution]
+        start = time.perf_counter()
+        subprocess.run(args, check=True, stdin=subprocess.DEVNULL,
+                       stdout=None if solver.msg else subprocess.DEVNULL)
+        model.solutionTime = time.perf_counter() - start
+        # The file keeps the model's names, so they map to themselves
+        status, values, reduced_costs, shadow_prices, slacks, solution_status = solver.readsol_MPS(
+            solution, model, variables, {v.name: v.name for v in variables},
+            {c: c for c in model.constraints})
+    finally:
+        os.remove(solution)
+    model.assignVarsVals(values)
+    model.assignVarsDj(reduced_costs)
+    model.assignConsPi(shadow_prices)
+    model.assignConsSlack(slacks, activity=True)
+    model.assignStatus(status, solution_status)
+    return path
 
 # Read input data from CSV files
-def getParameters():
+def getParameters(source=None):
     params = {
         "years": range(2020, 2051),  # Planning horizon
         "ship_types": ["C", "T", "B", "G", "O"],  # container, tanker, bulk, cargo, other
         "engine_types": ["ME-C", "ME-GI", "ME-LGI"],
         "init_capacity_fleet": (
-            pd.read_csv("init_capacity_fleet.csv", index_col="ship_type")["capacity"].to_dict()
+            read_input("init_capacity_fleet.csv", source, index_col="ship_type")["capacity"].to_dict()
         ),
         "fleet_age": (
-            pd.read_csv("init_age.csv", index_col="ship_type")["avr_age"].to_dict()
+            read_input("init_age.csv", source, index_col="ship_type")["avr_age"].to_dict()
         ),
         "demand_shipping": (
-            pd.read_csv("demand_shipping.csv")
+            read_input("demand_shipping.csv", source)
             .set_index(["year", "ship_type"])["demand"]
             .to_dict()
         ),
         "investment_cost": (
-            pd.read_csv("investment_cost.csv", index_col="ship_type")["cost"].to_dict()
+            read_input("investment_cost.csv", source, index_col="ship_type")["cost"].to_dict()
         ),
         "op_cost": (
-            pd.read_csv("op_cost.csv", index_col="ship_type")["cost"].to_dict()
+            read_input("op_cost.csv", source, index_col="ship_type")["cost"].to_dict()
         ),
         "fuel_cost": (
-            pd.read_csv("fuel_cost.csv", index_col="fuel_type")["cost"].to_dict()
+            read_input("fuel_cost.csv", source, index_col="fuel_type")["cost"].to_dict()
         ),
-        "co2_cap": pd.read_csv("co2_cap.csv", index_col="year")["cap"].to_dict(),
-        "ets_price": pd.read_csv("ets_price.csv", index_col="year")["price"].to_dict(),
+        "co2_cap": read_input("co2_cap.csv", source, index_col="year")["cap"].to_dict(),
+        "ets_price": read_input("ets_price.csv", source, index_col="year")["price"].to_dict(),
         "emissions_factor": (
-            pd.read_csv("emissions_factor.csv", index_col="fuel_type")["factor"].to_dict()
+            read_input("emissions_factor.csv", source, index_col="fuel_type")["factor"].to_dict()
         ),
         "prod_capacity": (
-            pd.read_csv("prod_capacity.csv")
+            read_input("prod_capacity.csv", source)
             .set_index(["year", "ship_type"])["capacity"]
             .to_dict()
         ),
         "lifetime": (
-            pd.read_csv("lifetime.csv", index_col="ship_type")["years"].to_dict()
+            read_input("lifetime.csv", source, index_col="ship_type")["years"].to_dict()
         ),
         "fuel_consumption": (
-            pd.read_csv("fuel_consumption.csv")
+            read_input("fuel_consumption.csv", source)
             .set_index(["ship_type", "fuel_type", "engine_type"])["consumption"]
             .to_dict()
         ),
         "fuel_avail": (
-            pd.read_csv("fuel_avail.csv")
+            read_input("fuel_avail.csv", source)
             .set_index(["fuel_type", "year"])["availability"]
             .to_dict()
         ),
-        "cap": pd.read_csv("cap.csv", index_col="ship_type")["capacity"].to_dict(),
+        "cap": read_input("cap.csv", source, index_col="ship_type")["capacity"].to_dict(),
         "CII_desired": (
-            pd.read_csv("CII_desired.csv", index_col="ship_type")["CII"].to_dict()
+            read_input("CII_desired.csv", source, index_col="ship_type")["CII"].to_dict()
         ),
     }
     params["fuel_types"] = list(params["fuel_cost"].keys())
@@ -116,16 +180,18 @@ def createAndSolveModel(params):
 
 
 ##### Objective Function: Minimize total cost
-    model += lpSum(
-        new_ship[y, s] * params["investment_cost"].get(s, 0)
-        + stock_ship[y, s] * params["op_cost"].get(s, 0)
-        + fuel_demand[y, f] * params["fuel_cost"].get(f, 0)
-        for y in params["years"]
-        for s in params["ship_types"]
-        for f in params["fuel_types"]
-    ) + lpSum(
-        excess_emissions[y] * params["ets_price"].get(y, 0)
-        for y in params["years"]
+    # One term per variable; the n_fuels / n_ships factors keep the weights the
+    # terms had when the sum ran over years x ship types x fuel types
+    n_ships = len(params["ship_types"])
+    n_fuels = len(params["fuel_types"])
+    model += LpAffineExpression(
+        [(new_ship[y, s], params["investment_cost"].get(s, 0) * n_fuels)
+         for y in params["years"] for s in params["ship_types"]]
+        + [(stock_ship[y, s], params["op_cost"].get(s, 0) * n_fuels)
+           for y in params["years"] for s in params["ship_types"]]
+        + [(fuel_demand[y, f], params["fuel_cost"].get(f, 0) * n_ships)
+           for y in params["years"] for f in params["fuel_types"]]
+        + [(excess_emissions[y], params["ets_price"].get(y, 0)) for y in params["years"]]
     )
 
 
@@ -146,16 +212,33 @@ def createAndSolveModel(params):
 
 
     # Fleet Stock Update Constraint
+    # Retirements from precomputed (retire year -> build year, multiplicity)
+    # arrays: one term per (year, ship type) instead of an lpSum repeating the
+    # same new_ship term min(y - 2020, lifetime - 1) times. This keeps the
+    # original formulation, which retires those ships k times and never retires
+    # the initial fleet, on purpose: it keeps the min(y - 2020, lifetime - 1)
+    # multiplicity of the baseline model, and retiring by age cohort
+    # (Beta_Version_V2, retirement="cohort") is infeasible with the shipped
+    # scenario inputs - the tanker fleet (average age 14, lifetime 17) cannot be
+    # replaced within the 40 ships/year production capacity. Switch once the
+    # input data allow it.
+    years = np.array(params["years"])
+    retire_from = {}
+    for s in params["ship_types"]:
+        lifetime = params["lifetime"].get(s, 1)
+        build_year = np.maximum(2020, years - lifetime + 1 - params["fleet_age"].get(s, 0))
+        multiplicity = np.minimum(years - 2020, lifetime - 1)
+        for y, b, k in zip(years.tolist(), build_year.tolist(), multiplicity.tolist()):
+            retire_from[y, s] = (b, k)
+
     for y in params["years"]:
         for s in params["ship_types"]:
             if y == 2020:
                 model += stock_ship[y, s] == params["init_capacity_fleet"].get(s, 0)
             else:
-                # Calculate the number of ships that will be retired this year
-                retired_ships = lpSum(
-                    new_ship[max(2020, y - params["lifetime"].get(s, 1) + 1 - params["fleet_age"].get(s, 0)), s]
-                    for y_prev in range(max(2020, y - params["lifetime"].get(s, 1) + 1), y)
-                )
+                # Number of ships that will be retired this year
+                b, k = retire_from[y, s]
+                retired_ships = k * new_ship[b, s]
                 
                 model += stock_ship[y, s] == stock_ship[y-1, s] + new_ship[y, s] - retired_ships
                 
@@ -194,8 +277,9 @@ def createAndSolveModel(params):
 
 
 
-    # Solve the model
-    model.solve()
+    # Solve the model (from the MPS file written for it)
+    solve_model_file(model)
+    print(f"Solve status: {LpStatus[model.status]}, runtime {model.solutionTime:.2f} s")
 
 
     # Check the status of the solution
@@ -269,13 +353,15 @@ def extract_results(model, params):
 
 
 # Save the results in an Excel file
-def save_results_to_excel(df):
-    df.to_excel('maritime_results.xlsx', index=False)
-    print("Results saved to 'maritime_results.xlsx'")
+def save_results_to_excel(df, directory=None):
+    path = os.path.join(output_directory if directory is None else directory, 'maritime_results.xlsx')
+    df.to_excel(path, index=False)
+    print(f"Results saved to '{path}'")
 
 
 # Create and save plots with the results
-def create_plots(df, params):
+def create_plots(df, params, directory=None):
+    directory = output_directory if directory is None else directory
     years = df['Year']
 
     # Set general plot style
@@ -297,7 +383,7 @@ def create_plots(df, params):
        plt.ylabel('Costs [million Euros]', fontweight='bold')
        plt.grid(True, linestyle='--', alpha=0.7)
        plt.tight_layout()
-       plt.savefig(f'{component.lower().replace(" ", "_")}_over_years.png')
+       plt.savefig(os.path.join(directory, f'{component.lower().replace(" ", "_")}_over_years.png'))
        plt.close()
 
 
@@ -324,7 +410,7 @@ def create_plots(df, params):
        plt.legend()
        plt.grid(True, linestyle='--', alpha=0.7)
        plt.tight_layout()
-       plt.savefig('co2_emissions_over_years.png')
+       plt.savefig(os.path.join(directory, 'co2_emissions_over_years.png'))
        plt.close()
 
     
@@ -340,7 +426,7 @@ def create_plots(df, params):
     plt.legend()
     plt.grid(True, linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig('fuel_demand.png')
+    plt.savefig(os.path.join(directory, 'fuel_demand.png'))
     plt.close()
 
     # New Ships
@@ -353,7 +439,7 @@ def create_plots(df, params):
     plt.legend()
     plt.grid(True, linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig('new_ships.png')
+    plt.savefig(os.path.join(directory, 'new_ships.png'))
     plt.close()
 
     # Stock Ships
@@ -366,18 +452,17 @@ def create_plots(df, params):
     plt.legend()
     plt.grid(True, linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig('stock_ships.png')
+    plt.savefig(os.path.join(directory, 'stock_ships.png'))
     plt.close()
 
 
-    print("Plots saved as PNG files in the working directory")
+    print(f"Plots saved as PNG files in {directory}")
 
 if __name__ == "__main__":
     try:
         p = getParameters()
         printInputParams(p)
         m = createAndSolveModel(p)
-        m.writeLP("./maritimeLP.txt")
         
         # Debug: Print some sample variable names
         print("Sample variable names:")
@@ -406,7 +491,8 @@ if __name__ == "__main__":
 
 import matplotlib.pyplot as plt
 
-def create_combined_figure(df, params):
+def create_combined_figure(df, params, directory=None):
+    directory = output_directory if directory is None else directory
     years = df['Year']
 
     fig, axes = plt.subplots(4, 2, figsize=(20, 20))  # Create a 4x2 grid of subplots
@@ -488,17 +574,16 @@ def create_combined_figure(df, params):
 
     # Adjust layout and save the figure
     plt.tight_layout(pad=4.0)
-    plt.savefig('combined_figure.png')
+    plt.savefig(os.path.join(directory, 'combined_figure.png'))
     plt.close()
 
-    print("Combined figure saved as 'combined_figure.png' in the working directory")
+    print(f"Combined figure saved as 'combined_figure.png' in {directory}")
 
 if __name__ == "__main__":
     try:
         p = getParameters()
         printInputParams(p)
         m = createAndSolveModel(p)
-        m.writeLP("./maritimeLP.txt")
         
         # Debug: Print some sample variable names
         print("Sample variable names:")